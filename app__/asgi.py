@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The dashboard's live updates (dashboard/eventos/) are long-lived async
+streams: serve the project with an ASGI server (e.g. uvicorn or daphne) so
+open tabs do not each hold a worker thread. Under WSGI they are disabled and
+the pages poll every 5 seconds (see DASHBOARD_SSE in settings).
 """
 
 import os
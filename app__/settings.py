@@ -135,3 +135,75 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Ingesta de lecturas del ESP32
+
+# Cantidad máxima de lecturas aceptadas en un lote (arreglo JSON)
+ESP32_LOTE_MAX = 1000
+
+# Segundos que se conserva en memoria el registro de dispositivos de cada proceso
+REGISTRO_DISPOSITIVOS_TTL = 300
+
+# Escritura diferida: el endpoint encola las lecturas y un hilo las guarda por lotes
+INGESTA_DIFERIDA = False
+INGESTA_BUFFER_CAPACIDAD = 10000  # Lecturas máximas en memoria antes de responder 503
+INGESTA_LOTE_FLUSH = 500  # Lecturas que disparan un vaciado a la base de datos
+INGESTA_INTERVALO_FLUSH = 1.0  # Segundos máximos entre vaciados
+INGESTA_MAX_SEGMENTOS = 100  # Segmentos pendientes en disco antes de dejar de aceptar lecturas
+INGESTA_DIRECTORIO = BASE_DIR / "ingesta_pendiente"  # Diario y segmentos pendientes
+
+# Cache compartido de las tarjetas del dashboard, usado por todos los usuarios.
+# En un solo proceso basta la memoria local; con varios procesos o nodos, indicar
+# un servidor compatible con Redis (requiere el paquete redis), por ejemplo
+# CACHE_FRAGMENTOS_URL = "redis://127.0.0.1:6379/1"
+CACHE_FRAGMENTOS_URL = None
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "fragmentos": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_FRAGMENTOS_URL,
+    } if CACHE_FRAGMENTOS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragmentos",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Resumen de la flota (/dashboard/summary/)
+RESUMEN_FLOTA_TTL = 300  # Segundos antes de reconstruir los contadores desde la base de datos
+RESUMEN_FLOTA_INACTIVO = 3600  # Segundos sin lecturas para considerar inactivo un dispositivo
+RESUMEN_FLOTA_TOKEN = None  # Token para consultar sin sesión: "Authorization: Bearer <token>"
+
+# Puntos máximos de la serie de tiempo de un contenedor (gráfico de tendencia)
+SERIE_MAX_PUNTOS = 500
+
+# Últimas lecturas por dispositivo en memoria (detalle del contenedor)
+HISTORIAL_RECIENTE_VENTANA = 300  # Lecturas por dispositivo (13 bytes cada una)
+HISTORIAL_RECIENTE_TTL = 60  # Segundos antes de resincronizar un dispositivo con la base de datos (None = nunca)
+
+# Tarjetas por página del dashboard
+DASHBOARD_POR_PAGINA = 48
+
+# Avisos en vivo (SSE) del dashboard
+DASHBOARD_SSE = None  # True/False los activa o desactiva; None = solo si el proyecto se sirve con ASGI
+SSE_KEEPALIVE = 15  # Segundos entre comentarios que mantienen viva la conexión
+SSE_INTERVALO_MINIMO = 1.0  # Segundos mínimos entre eventos a un mismo cliente
+
+# Segundos máximos sin guardar un reporte de un dispositivo con banda muerta,
+# aunque sus lecturas no cambien
+ESP32_PERSISTENCIA_MAXIMA = 3600
+
+# Informes PDF generados en segundo plano
+INFORMES_DIRECTORIO = BASE_DIR / "informes"  # PDF generados, hasta que vencen
+INFORMES_ESPERA = 2  # Segundos entre consultas de procesar_informes cuando la cola está vacía
+INFORMES_EN_CURSO_POR_USUARIO = 3  # Informes pendientes o en proceso por usuario
+INFORMES_VENCIMIENTO = 24 * 3600  # Segundos que se conservan los informes (y sus PDF)
+INFORMES_TIEMPO_MAXIMO = 1800  # Segundos tras los que un informe sin terminar se da por interrumpido
+INFORMES_FILAS_MAX = 10000  # Filas dibujadas como máximo en un PDF (acota la memoria de reportlab)
+
+# Particiones mensuales de Reporte (comando gestionar_particiones)
+REPORTE_MESES_ADELANTE = 3  # Meses futuros con partición creada
+REPORTE_RETENCION_MESES = 24  # Meses de historial que se conservan
@@ -0,0 +1,121 @@
+"""
+Series de tiempo del nivel de un contenedor, agrupadas por intervalos.
+
+Los intervalos de hora y de día se leen de los resúmenes de la ingesta
+(ResumenHorario y ResumenDiario); los de minuto se agrupan en la base de datos
+sobre los reportes, con el índice (dispositivo, -fecha). El resultado se
+reduce con LTTB (Largest-Triangle-Three-Buckets) a un máximo de puntos, que
+conserva la forma de la curva mejor que tomar uno de cada N.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import Trunc
+
+from dashboard.models import Reporte, ResumenDiario, ResumenHorario
+from dashboard.resumenes import inicio_dia, inicio_hora
+
+# Intervalos disponibles (unidades de date_trunc), con la tabla de resumen de
+# cada uno y la función que calcula el inicio de su período
+RESUMENES = {"hour": (ResumenHorario, inicio_hora), "day": (ResumenDiario, inicio_dia)}
+INTERVALOS = ("minute",) + tuple(RESUMENES)
+
+# Rango máximo admitido para intervalos de minuto, que recorren los reportes
+RANGO_MAX_MINUTOS = timedelta(days=7)
+
+# Puntos máximos devueltos por serie
+MAX_PUNTOS = getattr(settings, "SERIE_MAX_PUNTOS", 500)
+
+# Columnas de cada punto, en orden
+CAMPOS = ("fecha", "nivel_promedio", "nivel_min", "nivel_max", "lecturas", "lecturas_puerta_abierta")
+
+
+def intervalo_automatico(desde, hasta):
+    """Elige el intervalo según el largo del rango"""
+    rango = hasta - desde
+    if rango <= timedelta(days=2):
+        return "minute"
+    if rango <= timedelta(days=90):
+        return "hour"
+    return "day"
+
+
+def _desde_resumenes(modelo, id_device, desde, hasta):
+    filas = (
+        modelo.objects.filter(dispositivo_id=id_device, periodo__gte=desde, periodo__lt=hasta)
+        .order_by("periodo")
+        .values_list("periodo", "suma_nivel", "nivel_min", "nivel_max", "lecturas", "lecturas_puerta_abierta")
+    )
+    return [
+        (periodo.timestamp(), suma / lecturas, minimo, maximo, lecturas, abiertas)
+        for periodo, suma, minimo, maximo, lecturas, abiertas in filas
+        if lecturas
+    ]
+
+
+def _desde_reportes(id_device, desde, hasta):
+    filas = (
+        Reporte.objects.filter(dispositivo_id=id_device, fecha__gte=desde, fecha__lt=hasta)
+        .annotate(periodo=Trunc("fecha", "minute"))
+        .values("periodo")
+        .annotate(
+            promedio=Avg("medicion_nivel"),
+            minimo=Min("medicion_nivel"),
+            maximo=Max("medicion_nivel"),
+            lecturas=Count("id"),
+            abiertas=Count("id", filter=Q(estado_puerta=False)),  # estado_puerta False = puerta abierta
+        )
+        .order_by("periodo")
+        .values_list("periodo", "promedio", "minimo", "maximo", "lecturas", "abiertas")
+    )
+    return [(periodo.timestamp(), *valores) for periodo, *valores in filas]
+
+
+def serie(id_device, desde, hasta, intervalo, max_puntos=MAX_PUNTOS):
+    """
+    Devuelve los puntos (ver CAMPOS) del dispositivo en [desde, hasta) con el
+    intervalo indicado, reducidos a ``max_puntos`` como máximo.
+    """
+    if intervalo in RESUMENES:
+        modelo, inicio_periodo = RESUMENES[intervalo]
+        # Incluir completo el período en que empieza el rango
+        puntos = _desde_resumenes(modelo, id_device, inicio_periodo(desde), hasta)
+    else:
+        puntos = _desde_reportes(id_device, desde, hasta)
+    return lttb(puntos, max_puntos)
+
+
+def lttb(puntos, umbral):
+    """
+    Reduce una serie ordenada a ``umbral`` puntos con Largest-Triangle-Three-Buckets.
+    Cada punto es una tupla cuyo primer elemento es x y el segundo y.
+    """
+    total = len(puntos)
+    if umbral >= total or umbral < 3:
+        return list(puntos)
+
+    reducidos = [puntos[0]]
+    ancho = (total - 2) / (umbral - 2)  # Puntos por grupo, sin el primero ni el último
+    anterior = puntos[0]
+    for grupo in range(umbral - 2):
+        inicio = int(grupo * ancho) + 1
+        fin = int((grupo + 1) * ancho) + 1
+
+        # Promedio del grupo siguiente (o el último punto, para el último grupo)
+        siguientes = puntos[fin:min(int((grupo + 2) * ancho) + 1, total - 1)] or [puntos[-1]]
+        x_promedio = sum(punto[0] for punto in siguientes) / len(siguientes)
+        y_promedio = sum(punto[1] for punto in siguientes) / len(siguientes)
+
+        # Punto del grupo que forma el triángulo de mayor área con el anterior y el promedio
+        elegido = max(
+            puntos[inicio:fin],
+            key=lambda punto: abs(
+                (anterior[0] - x_promedio) * (punto[1] - anterior[1])
+                - (anterior[0] - punto[0]) * (y_promedio - anterior[1])
+            ),
+        )
+        reducidos.append(elegido)
+        anterior = elegido
+    reducidos.append(puntos[-1])
+    return reducidos
@@ -1,3 +1,68 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard.models import Dispositivo, Reporte, Alerta
+from .series import lttb
+
+
+class HistorialAlertasVistaTests(TestCase):
+    """Vista del historial de alertas de un contenedor"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("operador"))
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        inicio = timezone.now() - timedelta(days=1)
+        reporte = Reporte.objects.create(dispositivo=self.dispositivo, medicion_nivel=80, estado_puerta=True, fecha=inicio)
+        Alerta.objects.bulk_create([
+            Alerta(
+                reporte=reporte, dispositivo=self.dispositivo, mensaje=f"Alerta {i}", is_activa=False,
+                fecha_alerta=inicio + timedelta(minutes=i), fecha_desactivada=inicio + timedelta(hours=1),
+            )
+            for i in range(15)
+        ])
+
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        url = reverse("alertas", args=[self.dispositivo.id])
+        primera = self.client.get(url)
+        alterada = self.client.get(url, {"cursor": "alterado"})
+        self.assertEqual(alterada.status_code, 200)
+        self.assertEqual(
+            [a.id for a in alterada.context["pagina"].elementos],
+            [a.id for a in primera.context["pagina"].elementos],
+        )
+        self.assertEqual(len(primera.context["pagina"].elementos), 10)
+
+    def test_dispositivo_inexistente(self):
+        self.assertEqual(self.client.get(reverse("alertas", args=[self.dispositivo.id + 1000])).status_code, 404)
+
+
+class LttbTests(SimpleTestCase):
+    """Reducción de series con Largest-Triangle-Three-Buckets"""
+
+    def test_series_cortas_no_se_reducen(self):
+        puntos = [(x, x % 7) for x in range(50)]
+        self.assertEqual(lttb(puntos, 50), puntos)
+        self.assertEqual(lttb(puntos, 100), puntos)
+        self.assertEqual(lttb(puntos, 2), puntos)
+
+    def test_reduce_al_umbral(self):
+        puntos = [(x, (x * 37) % 101, x) for x in range(1000)]
+        reducidos = lttb(puntos, 100)
+        self.assertEqual(len(reducidos), 100)
+        self.assertEqual((reducidos[0], reducidos[-1]), (puntos[0], puntos[-1]))
+        # Puntos originales completos (con sus demás campos), en orden
+        self.assertTrue(all(punto in puntos for punto in reducidos))
+        self.assertEqual(reducidos, sorted(reducidos))
+        self.assertEqual(len({punto[0] for punto in reducidos}), 100)
+
+    def test_conserva_los_picos(self):
+        puntos = [(x, 0) for x in range(1000)]
+        puntos[333] = (333, 100)
+        puntos[777] = (777, -100)
+        reducidos = lttb(puntos, 20)
+        self.assertIn((333, 100), reducidos)
+        self.assertIn((777, -100), reducidos)
@@ -6,9 +6,15 @@ urlpatterns = [
     # URL para ver el detalle de un contenedor específico
     path('<int:id>/', views.detalle_contenedor, name='detalle_contenedor'),
 
+    # URL con la serie de tiempo del nivel del contenedor (gráfico de tendencia)
+    path('<int:device_id>/series/', views.serie_contenedor, name='serie_contenedor'),
+
+    # URL con las últimas lecturas del contenedor, servidas desde memoria
+    path('<int:device_id>/recientes/', views.recientes_contenedor, name='recientes_contenedor'),
+
     # URL para cargar partes del contenedor mediante peticiones AJAX o parciales
     path('partial/<int:device_id>/', views.contenedor_partial, name='contenedor_partial'),
 
-    # URL para ver alertas asociadas a un contenedor específico
+    # URL con el historial paginado de alertas de un contenedor específico
     path('contenedor/alertas/<int:device_id>/', views.alertas, name='alertas'),
 ]
@@ -1,74 +1,161 @@
 from django.shortcuts import render, get_object_or_404  # Funciones para renderizar templates y obtener objetos
-from dashboard.models import Dispositivo, Reporte, Alerta  # Importa modelos del dashboard
+from dashboard.models import Dispositivo, EstadoDispositivo, Alerta  # Importa modelos del dashboard
+from dashboard.paginacion import paginar_keyset  # Paginación por clave para historiales
+from dashboard.views import marca_version  # Misma marca de versión que el dashboard
+from dashboard.eventos import sse_activo  # Si la página recibe avisos en vivo (SSE)
 from django.contrib.auth.decorators import login_required  # Protege vistas con login
+from django.views.decorators.cache import cache_control  # Para controlar el cache de la vista
+from django.views.decorators.http import condition  # Para responder 304 si el cliente ya tiene la versión
+from django.http import JsonResponse, Http404  # Para responder con JSON o 404
+from django.utils import timezone  # Para interpretar fechas en la zona horaria del proyecto
+from django.utils.dateparse import parse_date, parse_datetime  # Para leer fechas de los parámetros
+from datetime import datetime, timedelta  # Para rangos de fechas
+from dashboard.registro import registro  # Registro en memoria de dispositivos
+from dashboard.historial_reciente import historial_reciente  # Últimas lecturas en memoria
+from . import series  # Series de tiempo agrupadas del nivel
 
-# Vista para mostrar detalle de un contenedor específico
-@login_required
-def detalle_contenedor(request, id):
-    # Obtiene el dispositivo o lanza 404 si no existe
-    dispositivo = get_object_or_404(Dispositivo, id=id)
+# Obtiene el dispositivo con los datos de su estado actual y su alerta activa
+def obtener_dispositivo_con_estado(device_id):
+    # Obtiene el dispositivo junto con su estado actual, o lanza 404 si no existe
+    dispositivo = get_object_or_404(
+        Dispositivo.objects.select_related("estado__alerta_activa"), id=device_id
+    )
 
-    # Último reporte asociado al dispositivo
-    reporte = Reporte.objects.filter(dispositivo=dispositivo).order_by("-fecha").first()
+    # Estado actual (último reporte y alerta activa); no existe si aún no reporta
+    estado = getattr(dispositivo, "estado", None)
 
     # Construir datos adicionales para usar en el template
-    dispositivo.ultimo_nivel = reporte.medicion_nivel if reporte else 0
-    dispositivo.ultima_fecha = reporte.fecha if reporte else None
-    dispositivo.estado_actual_puerta = reporte.estado_puerta if reporte else None
+    dispositivo.ultimo_nivel = estado.ultimo_nivel if estado else 0
+    dispositivo.ultima_fecha = estado.ultima_fecha if estado else None
+    dispositivo.estado_actual_puerta = estado.estado_puerta if estado else None
 
     # Última alerta activa del dispositivo
-    ultima_alerta = Alerta.objects.filter(
-        reporte__dispositivo=dispositivo,
-        is_activa=True
-    ).order_by("-fecha_alerta").first()
+    ultima_alerta = estado.alerta_activa if estado else None
+    return dispositivo, ultima_alerta
+
+# Vista para mostrar detalle de un contenedor específico
+@login_required
+def detalle_contenedor(request, id):
+    dispositivo, ultima_alerta = obtener_dispositivo_con_estado(id)
 
     # Renderiza el template con la información del dispositivo y última alerta activa
     return render(request, "contenedor/contenedor.html", {
         "dispositivo": dispositivo,
-        "ultima_alerta": ultima_alerta
+        "ultima_alerta": ultima_alerta,
+        "sse": sse_activo(request),  # Sin servidor ASGI la página consulta cada 5 segundos
     })
 
-# Vista parcial para actualizar información del contenedor (por ejemplo, vía AJAX)
+# Versión del estado de un contenedor, leída por clave primaria sin cargar el dispositivo
+def version_contenedor(request, device_id):
+    actualizado = EstadoDispositivo.objects.filter(dispositivo_id=device_id).values_list("actualizado", flat=True).first()
+    return f"{device_id}-{marca_version(actualizado)}"
+
+# Vista parcial para actualizar información del contenedor (por ejemplo, vía AJAX).
+# Responde 304 si el navegador ya tiene la versión actual.
 @login_required
+@cache_control(private=True, no_cache=True)  # El navegador guarda la respuesta pero la revalida siempre
+@condition(etag_func=version_contenedor)
 def contenedor_partial(request, device_id):
-    dispositivo = get_object_or_404(Dispositivo, id=device_id)
-
-    # Último reporte asociado
-    reporte = Reporte.objects.filter(dispositivo=dispositivo).order_by("-fecha").first()
-
-    # Construir datos adicionales
-    dispositivo.ultimo_nivel = reporte.medicion_nivel if reporte else 0
-    dispositivo.ultima_fecha = reporte.fecha if reporte else None
-    dispositivo.estado_actual_puerta = reporte.estado_puerta if reporte else None
-
-    # Obtener la última alerta activa
-    ultima_alerta = Alerta.objects.filter(
-        reporte__dispositivo=dispositivo,
-        is_activa=True
-    ).order_by("-fecha_alerta").first()
+    dispositivo, ultima_alerta = obtener_dispositivo_con_estado(device_id)
 
     # Renderiza un template parcial con la información actualizada
     return render(request, "contenedor/contenedor_partial.html", {
         "dispositivo": dispositivo,
-        "ultima_alerta": ultima_alerta
+        "ultima_alerta": ultima_alerta,
+        "sse": sse_activo(request),  # Sin servidor ASGI la página consulta cada 5 segundos
     })
 
-# Vista para manejar alertas de un dispositivo específico
+# Alertas por página en el historial del contenedor
+ALERTAS_POR_PAGINA = 10
+
+# Historial de alertas de un contenedor (activas y desactivadas), de la más
+# reciente a la más antigua. Se pagina por clave sobre (fecha_alerta, id) con
+# el índice (dispositivo, -fecha_alerta, -id): cualquier página cuesta lo mismo.
 @login_required
 def alertas(request, device_id):
-    dispositivo = get_object_or_404(Dispositivo, id=device_id)
+    if not registro.existe(device_id):
+        raise Http404("El dispositivo no existe")
 
-    # Obtener todos los reportes de ese dispositivo
-    reportes_dispositivo = Reporte.objects.filter(dispositivo=dispositivo)
+    consulta = Alerta.objects.filter(dispositivo_id=device_id)
+    try:
+        pagina = paginar_keyset(consulta, ("fecha_alerta", "id"), request.GET.get("cursor"), ALERTAS_POR_PAGINA)
+    except ValueError:
+        # Cursor alterado o de otra versión: volver a la primera página
+        pagina = paginar_keyset(consulta, ("fecha_alerta", "id"), None, ALERTAS_POR_PAGINA)
 
-    # Buscar la última alerta activa asociada a cualquiera de esos reportes
-    ultima_alerta = Alerta.objects.filter(
-        reporte__in=reportes_dispositivo,
-        is_activa=True
-    ).order_by("-fecha_alerta").first()
-
-    # Renderiza el template parcial con la información de la alerta
-    return render(request, "contenedor/contenedor_partial.html", {
-        "dispositivo": dispositivo,
-        "ultima_alerta": ultima_alerta
+    # Renderiza el template parcial con la página del historial
+    return render(request, "contenedor/historial_alertas.html", {
+        "device_id": device_id,
+        "pagina": pagina,
     })
+
+# Interpreta un parámetro de fecha ("YYYY-MM-DD" o fecha y hora ISO) en la
+# zona horaria del proyecto. Una fecha sola en "hasta" incluye todo ese día.
+def leer_fecha(valor, fin_de_dia=False):
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        if dia is None:
+            raise ValueError(f"Fecha no válida: {valor}")
+        fecha = datetime.combine(dia + timedelta(days=1) if fin_de_dia else dia, datetime.min.time())
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+# Serie de tiempo del nivel de un contenedor en JSON:
+# ?from=&to= (por defecto los últimos 7 días) y &bucket=minute|hour|day|auto.
+# Cada punto es [fecha (segundos Unix), nivel promedio, mínimo, máximo,
+# lecturas, lecturas con la puerta abierta], con un máximo de SERIE_MAX_PUNTOS.
+@login_required
+def serie_contenedor(request, device_id):
+    if not registro.existe(device_id):
+        raise Http404("El dispositivo no existe")
+
+    try:
+        hasta = leer_fecha(request.GET["to"], fin_de_dia=True) if request.GET.get("to") else timezone.now()
+        desde = leer_fecha(request.GET["from"]) if request.GET.get("from") else hasta - timedelta(days=7)
+    except ValueError as ve:
+        return JsonResponse({"status": "error", "message": str(ve)}, status=400)
+    if desde >= hasta:
+        return JsonResponse({"status": "error", "message": "'from' debe ser anterior a 'to'"}, status=400)
+
+    intervalo = request.GET.get("bucket", "auto")
+    if intervalo == "auto":
+        intervalo = series.intervalo_automatico(desde, hasta)
+    if intervalo not in series.INTERVALOS:
+        return JsonResponse({"status": "error", "message": f"'bucket' debe ser uno de: {', '.join(series.INTERVALOS)}, auto"}, status=400)
+    if intervalo == "minute" and hasta - desde > series.RANGO_MAX_MINUTOS:
+        return JsonResponse({"status": "error", "message": "El intervalo por minuto admite como máximo 7 días"}, status=400)
+
+    puntos = series.serie(device_id, desde, hasta, intervalo)
+    return JsonResponse(
+        {
+            "dispositivo": device_id,
+            "bucket": intervalo,
+            "from": desde.isoformat(),
+            "to": hasta.isoformat(),
+            "campos": series.CAMPOS,
+            "puntos": [
+                [int(fecha), round(promedio, 1), minimo, maximo, lecturas, abiertas]
+                for fecha, promedio, minimo, maximo, lecturas, abiertas in puntos
+            ],
+        },
+        json_dumps_params={"separators": (",", ":")},  # Sin espacios, para reducir el tamaño
+    )
+
+# Últimas lecturas de un contenedor en JSON, servidas desde la memoria del
+# proceso (sin consultar la base de datos salvo para resincronizar).
+# ?n= limita la cantidad (máximo HISTORIAL_RECIENTE_VENTANA). Cada lectura es
+# [fecha (segundos Unix), nivel, puerta (true = cerrada)].
+@login_required
+def recientes_contenedor(request, device_id):
+    if not registro.existe(device_id):
+        raise Http404("El dispositivo no existe")
+    limite = request.GET.get("n", "")
+    lecturas = historial_reciente.obtener(device_id, int(limite) if limite.isdigit() else None)
+    return JsonResponse(
+        {
+            "dispositivo": device_id,
+            "campos": ("fecha", "nivel", "puerta"),
+            "lecturas": [[int(fecha), nivel, puerta] for fecha, nivel, puerta in lecturas],
+        },
+        json_dumps_params={"separators": (",", ":")},  # Sin espacios, para reducir el tamaño
+    )
@@ -13,6 +13,7 @@ class AlertaInline(admin.TabularInline):  # Muestra alertas en forma de tabla de
     model = Alerta  # Modelo relacionado
     extra = 1       # Cantidad de formularios vacíos para agregar nuevas alertas
     readonly_fields = ("fecha_alerta",)  # Campos de solo lectura
+    exclude = ("dispositivo",)  # Se toma del reporte al guardar
 
 # Inline para mostrar reportes dentro de un dispositivo
 class ReporteInline(admin.TabularInline):
@@ -23,7 +24,7 @@ class ReporteInline(admin.TabularInline):
 # Admin personalizado para Dispositivo
 @admin.register(Dispositivo)
 class DispositivoAdmin(admin.ModelAdmin):
-    list_display = ("id", "device_name")  # Campos que se muestran en la lista de dispositivos
+    list_display = ("id", "device_name", "banda_muerta")  # Campos que se muestran en la lista de dispositivos
     search_fields = ("device_name",)      # Campos por los que se puede buscar
     inlines = [ReporteInline]             # Muestra los reportes relacionados dentro del dispositivo
 
@@ -38,6 +39,14 @@ class ReporteAdmin(admin.ModelAdmin):
 # Admin personalizado para Alerta
 @admin.register(Alerta)
 class AlertaAdmin(admin.ModelAdmin):
-    list_display = ("id", "reporte", "mensaje", "is_activa", "fecha_alerta", "fecha_desactivada")  # Columnas visibles
+    list_display = ("id", "dispositivo", "columna_reporte", "mensaje", "is_activa", "fecha_alerta", "fecha_desactivada")  # Columnas visibles
     list_filter = ("fecha_alerta",)  # Filtro por fecha de alerta
-    search_fields = ("mensaje", "reporte__dispositivo__device_name")  # Búsqueda por mensaje o nombre de dispositivo del reporte
+    search_fields = ("mensaje", "dispositivo__device_name")  # Búsqueda por mensaje o nombre de dispositivo
+    readonly_fields = ("dispositivo",)  # Se toma del reporte al guardar
+    raw_id_fields = ("reporte",)  # Solo el id: no lista todos los reportes y admite reportes retirados
+
+    # Columna del reporte que tolera reportes de particiones ya retiradas
+    @admin.display(description="Reporte")
+    def columna_reporte(self, obj):
+        reporte = obj.reporte_o_none()
+        return reporte if reporte else f"{obj.reporte_id} (retirado)"
@@ -0,0 +1,274 @@
+"""
+Buffer de escritura diferida para la ingesta del ESP32 (INGESTA_DIFERIDA).
+
+El endpoint valida cada lectura, la agrega a una cola acotada en memoria y
+responde de inmediato. Un hilo en segundo plano guarda la cola en la base de
+datos por lotes, cuando junta INGESTA_LOTE_FLUSH lecturas o cada
+INGESTA_INTERVALO_FLUSH segundos.
+
+Cada lectura aceptada se escribe antes en un diario del proceso
+(``actual-<pid>.jsonl``). En cada vaciado el diario se rota a un segmento
+pendiente (``lote-<pid>-<n>.jsonl``) que solo se borra después de guardarse en
+la base de datos. Si la base de datos falla, los segmentos se acumulan en
+disco hasta INGESTA_MAX_SEGMENTOS; a partir de ahí la cola se llena y el
+endpoint responde 503 (contrapresión). Al arrancar, cada proceso recupera los
+diarios y segmentos de procesos que ya no existen.
+
+Solo los errores de conexión detienen el vaciado. Si un segmento falla por
+otro motivo (por ejemplo un valor que la base de datos rechaza), se guarda por
+partes y las lecturas que fallan solas se apartan en ``rechazadas/``, para que
+un segmento malo no bloquee la ingesta.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+from .ingesta import Lectura, guardar_lecturas, validar_lectura, validar_lote
+from .registro import registro
+
+logger = logging.getLogger(__name__)
+
+
+def proceso_activo(pid):
+    """Indica si el proceso con ese pid sigue en ejecución"""
+    if os.name != "posix":
+        # Sin una forma portable de comprobarlo, no se tocan archivos ajenos
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _serializar(lectura):
+    """Convierte una lectura en una línea JSON del diario"""
+    return json.dumps([lectura.id_device, lectura.nivel, lectura.puerta, lectura.fecha.isoformat()]) + "\n"
+
+
+def _escribir_segmento(ruta, lecturas):
+    """Reemplaza de forma atómica el contenido de un segmento"""
+    temporal = ruta.with_suffix(".tmp")
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write("".join(_serializar(lectura) for lectura in lecturas))
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+# Errores pasajeros de la base de datos: el segmento se reintenta completo más tarde
+ERRORES_TRANSITORIOS = (OperationalError, InterfaceError)
+
+
+def _leer_segmento(ruta):
+    """Lee las lecturas de un segmento; ignora una última línea incompleta"""
+    lecturas = []
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            try:
+                id_device, nivel, puerta, fecha = json.loads(linea)
+                lecturas.append(Lectura(id_device, nivel, puerta, datetime.fromisoformat(fecha)))
+            except (ValueError, TypeError):
+                logger.warning("Línea inválida en %s", ruta)
+    return lecturas
+
+
+class BufferIngesta:
+    """Cola acotada de lecturas con un hilo que las guarda por lotes"""
+
+    def __init__(self, directorio, capacidad, tamano_lote, intervalo, max_segmentos):
+        self._directorio = Path(directorio)
+        self._capacidad = capacidad
+        self._tamano_lote = tamano_lote
+        self._intervalo = intervalo
+        self._max_segmentos = max_segmentos
+        self._cond = threading.Condition()
+        self._cola = []
+        self._diario = None  # Archivo del diario actual, abierto en modo append
+        self._pid = None
+        self._secuencia = 0
+        self._hilo = None
+
+    # ---------------------------------------------------------
+    # Archivos del diario y segmentos
+    # ---------------------------------------------------------
+    def _ruta_diario(self):
+        return self._directorio / f"actual-{self._pid}.jsonl"
+
+    def _nuevo_segmento(self):
+        self._secuencia += 1
+        return self._directorio / f"lote-{self._pid}-{self._secuencia:08d}.jsonl"
+
+    def _segmentos_pendientes(self):
+        return sorted(self._directorio.glob(f"lote-{self._pid}-*.jsonl"))
+
+    def _recuperar_huerfanos(self):
+        """Adopta los diarios y segmentos de procesos que ya terminaron"""
+        huerfanos = []
+        for ruta in self._directorio.glob("*.jsonl"):
+            partes = ruta.stem.split("-")
+            try:
+                pid = int(partes[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != self._pid and not proceso_activo(pid):
+                # Segmentos antes que el diario: el diario tiene las lecturas más recientes
+                huerfanos.append((pid, partes[0] != "lote", ruta.name, ruta))
+        for _, _, _, ruta in sorted(huerfanos):
+            try:
+                os.replace(ruta, self._nuevo_segmento())
+            except FileNotFoundError:
+                pass  # Otro proceso lo adoptó primero
+
+    def _iniciar(self):
+        """Prepara el directorio y arranca el hilo (con el lock tomado)"""
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        # Primer uso en este proceso (o proceso hijo creado con fork)
+        self._pid = os.getpid()
+        self._secuencia = 0
+        self._cola = []
+        self._directorio.mkdir(parents=True, exist_ok=True)
+        self._recuperar_huerfanos()
+        self._diario = open(self._ruta_diario(), "a", encoding="utf-8")
+        self._hilo = threading.Thread(target=self._ejecutar, name="buffer-ingesta", daemon=True)
+        self._hilo.start()
+
+    # ---------------------------------------------------------
+    # API usada por el endpoint
+    # ---------------------------------------------------------
+    def agregar(self, lecturas):
+        """Encola lecturas validadas y con fecha. Devuelve False si no hay espacio."""
+        with self._cond:
+            self._iniciar()
+            if len(self._cola) + len(lecturas) > self._capacidad:
+                return False
+            # Primero al diario (y al disco), para no perder lecturas ya confirmadas
+            # si el proceso o el equipo cae
+            self._diario.write("".join(_serializar(lectura) for lectura in lecturas))
+            self._diario.flush()
+            os.fsync(self._diario.fileno())
+            self._cola.extend(lecturas)
+            if len(self._cola) >= self._tamano_lote:
+                self._cond.notify()
+        return True
+
+    # ---------------------------------------------------------
+    # Hilo de vaciado
+    # ---------------------------------------------------------
+    def _rotar(self):
+        """Convierte el diario actual en un segmento pendiente (con el lock tomado)"""
+        self._diario.close()
+        os.replace(self._ruta_diario(), self._nuevo_segmento())
+        self._diario = open(self._ruta_diario(), "a", encoding="utf-8")
+        self._cola = []
+
+    def _ejecutar(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._cola) >= self._tamano_lote, timeout=self._intervalo)
+                # Con la base de datos caída no se rota más: la cola se llena y aplica contrapresión
+                if self._cola and len(self._segmentos_pendientes()) < self._max_segmentos:
+                    self._rotar()
+            try:
+                self._vaciar_segmentos()
+            finally:
+                close_old_connections()
+
+    def _vaciar_segmentos(self):
+        """Guarda los segmentos pendientes en orden; se detiene en el primer error de conexión"""
+        for ruta in self._segmentos_pendientes():
+            lecturas = _leer_segmento(ruta)
+            try:
+                try:
+                    self._guardar(lecturas)
+                except ERRORES_TRANSITORIOS:
+                    raise
+                except Exception:
+                    logger.exception("El segmento %s no se pudo guardar completo; se guarda por partes", ruta)
+                    self._guardar_por_partes(ruta, lecturas)
+            except ERRORES_TRANSITORIOS:
+                logger.exception("No se pudo guardar el segmento %s; se reintentará", ruta)
+                return
+            ruta.unlink()
+
+    def _guardar_por_partes(self, ruta, lecturas):
+        """
+        Guarda un segmento dividiéndolo en mitades hasta aislar las lecturas que
+        fallan, que se apartan en rechazadas/. Tras cada parte guardada o
+        apartada, el segmento se reescribe con lo que falta, para no repetirla
+        si un error de conexión corta el proceso.
+        """
+        partes = [lecturas]
+        while partes:
+            parte = partes.pop(0)
+            try:
+                self._guardar(parte)
+            except ERRORES_TRANSITORIOS:
+                raise
+            except Exception as error:
+                if len(parte) > 1:
+                    mitad = len(parte) // 2
+                    partes[0:0] = [parte[:mitad], parte[mitad:]]
+                    continue
+                self._rechazar(parte[0], error)
+            _escribir_segmento(ruta, [lectura for pendiente in partes for lectura in pendiente])
+
+    def _rechazar(self, lectura, error):
+        """Aparta una lectura que no se puede guardar, con el motivo"""
+        logger.error("Lectura rechazada por la base de datos: %s (%s)", lectura, error)
+        directorio = self._directorio / "rechazadas"
+        directorio.mkdir(exist_ok=True)
+        with open(directorio / f"rechazadas-{self._pid}.jsonl", "a", encoding="utf-8") as archivo:
+            archivo.write(json.dumps([
+                lectura.id_device, lectura.nivel, lectura.puerta, lectura.fecha.isoformat(), str(error),
+            ]) + "\n")
+
+    def _guardar(self, lecturas, reintentar=True):
+        """Guarda un segmento completo en una sola transacción"""
+        # Descartar lecturas de dispositivos borrados después de encolarlas
+        lecturas = [lectura for lectura in lecturas if registro.existe(lectura.id_device)]
+        try:
+            with transaction.atomic():
+                for inicio in range(0, len(lecturas), self._tamano_lote):
+                    guardar_lecturas(lecturas[inicio:inicio + self._tamano_lote])
+        except IntegrityError:
+            if not reintentar:
+                raise
+            registro.invalidar()
+            self._guardar(lecturas, reintentar=False)
+
+
+# Instancia única usada por el endpoint cuando INGESTA_DIFERIDA está activa
+buffer_ingesta = BufferIngesta(
+    directorio=getattr(settings, "INGESTA_DIRECTORIO", settings.BASE_DIR / "ingesta_pendiente"),
+    capacidad=getattr(settings, "INGESTA_BUFFER_CAPACIDAD", 10000),
+    tamano_lote=getattr(settings, "INGESTA_LOTE_FLUSH", 500),
+    intervalo=getattr(settings, "INGESTA_INTERVALO_FLUSH", 1.0),
+    max_segmentos=getattr(settings, "INGESTA_MAX_SEGMENTOS", 100),
+)
+
+
+def encolar_lote(items, validar=validar_lectura):
+    """
+    Valida una lista de lecturas y encola las válidas; las que no traen fecha
+    se encolan con la hora de recepción.
+    Devuelve un resultado por elemento, o None si el buffer está lleno.
+    """
+    resultados, aceptadas = validar_lote(items, validar)
+    ahora = timezone.now()
+    lecturas = [lectura if lectura.fecha else lectura._replace(fecha=ahora) for _, lectura in aceptadas]
+    if not buffer_ingesta.agregar(lecturas):
+        return None
+    for indice, _ in aceptadas:
+        resultados[indice] = {"status": "ok", "encolado": True}
+    return resultados
@@ -0,0 +1,205 @@
+"""
+Avisos en vivo de lecturas nuevas para el dashboard (Server-Sent Events).
+
+Los flujos son conexiones largas y solo se sirven con un servidor ASGI
+(uvicorn, daphne): con WSGI o runserver ocuparían un hilo por pestaña abierta.
+DASHBOARD_SSE los activa o desactiva para todo el proyecto; sin definir, se
+activan si la petición llegó por ASGI. Sin ellos las páginas consultan cada
+5 segundos.
+
+La ingesta publica los ids de los dispositivos con lecturas nuevas y el aviso
+se entrega al confirmarse la transacción, primero a las conexiones del mismo
+proceso. En PostgreSQL además viaja con NOTIFY, así que llega a los demás
+procesos del servidor: cada proceso con conexiones SSE abiertas mantiene un
+hilo con LISTEN (psycopg 3 o psycopg2) que reparte los avisos a sus conexiones
+e ignora los que publicó él mismo.
+
+Cada conexión acumula los avisos mientras espera, así que un cliente recibe
+como máximo un evento cada SSE_INTERVALO_MINIMO segundos, sin importar
+cuántas lecturas lleguen.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Canal de NOTIFY usado por la ingesta
+CANAL = "dashboard_lecturas"
+
+# Largo máximo del aviso; NOTIFY admite menos de 8000 bytes
+LARGO_MAXIMO_AVISO = 7000
+
+# Segundos entre comentarios que mantienen viva la conexión a través de proxies
+KEEPALIVE = getattr(settings, "SSE_KEEPALIVE", 15)
+
+# Segundos mínimos entre dos eventos enviados a un mismo cliente
+INTERVALO_MINIMO = getattr(settings, "SSE_INTERVALO_MINIMO", 1.0)
+
+# True/False activa o desactiva los flujos SSE; None = solo con un servidor ASGI
+ACTIVO = getattr(settings, "DASHBOARD_SSE", None)
+
+# Identifica los avisos publicados por este proceso. Los procesos creados con
+# fork comparten el valor de la importación, por eso se combina con el pid.
+_INSTANCIA = uuid.uuid4().hex[:8]
+
+
+def sse_activo(request):
+    """Indica si se sirven avisos en vivo a esta petición"""
+    if ACTIVO is not None:
+        return ACTIVO
+    return isinstance(request, ASGIRequest)
+
+
+def _origen():
+    return f"{_INSTANCIA}-{os.getpid()}"
+
+
+class Suscripcion:
+    """Avisos pendientes de una conexión SSE; vive en el event loop de la conexión"""
+
+    def __init__(self, loop, dispositivo=None):
+        self.loop = loop
+        self.dispositivo = dispositivo  # Solo avisos de este dispositivo (None = todos)
+        self.pendientes = set()
+        self.todos = False  # Aviso sin ids: cambiaron dispositivos no detallados
+        self.evento = asyncio.Event()
+
+    def agregar(self, ids):
+        """Acumula un aviso (se llama dentro del event loop)"""
+        if ids is None:
+            self.todos = True
+        elif self.dispositivo is None or self.dispositivo in ids:
+            self.pendientes.update(ids)
+        else:
+            return
+        self.evento.set()
+
+    async def esperar(self, timeout):
+        """Espera avisos y devuelve los ids acumulados (None = todos)"""
+        await asyncio.wait_for(self.evento.wait(), timeout)
+        ids = None if self.todos else sorted(self.pendientes)
+        self.pendientes = set()
+        self.todos = False
+        self.evento.clear()
+        return ids
+
+
+class Difusor:
+    """Reparte los avisos de lecturas a las suscripciones del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._hilo = None
+
+    def suscribir(self, dispositivo=None):
+        """Crea una suscripción en el event loop actual"""
+        suscripcion = Suscripcion(asyncio.get_running_loop(), dispositivo)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if self._hilo is None and connection.vendor == "postgresql":
+                self._hilo = threading.Thread(target=self._escuchar, name="dashboard-eventos", daemon=True)
+                self._hilo.start()
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def repartir(self, ids):
+        """Entrega un aviso a todas las suscripciones; se puede llamar desde cualquier hilo"""
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion.agregar, ids)
+            except RuntimeError:
+                pass  # El event loop de la conexión ya terminó
+
+    def _escuchar(self):
+        """Hilo que recibe los NOTIFY de los demás procesos"""
+        base = connections["default"]
+        while True:
+            conexion = None
+            try:
+                conexion = base.get_new_connection(base.get_connection_params())
+                conexion.autocommit = True
+                for aviso in _notificaciones(conexion):
+                    origen, ids = _decodificar(aviso)
+                    if origen != _origen():  # Los propios ya se repartieron al confirmar
+                        self.repartir(ids)
+            except Exception:
+                logger.exception("Se perdió la conexión LISTEN; se reintentará")
+                time.sleep(5)
+            finally:
+                if conexion is not None:
+                    conexion.close()
+
+
+def _notificaciones(conexion):
+    """Escucha el canal y genera el texto de cada NOTIFY recibido"""
+    if hasattr(conexion, "notifies") and callable(conexion.notifies):
+        # psycopg 3
+        conexion.execute(f"LISTEN {CANAL}")
+        for notificacion in conexion.notifies():
+            yield notificacion.payload
+        return
+    # psycopg2: la lista conexion.notifies se llena con poll()
+    with conexion.cursor() as cursor:
+        cursor.execute(f"LISTEN {CANAL}")
+    while True:
+        select.select([conexion], [], [])  # Espera a que lleguen datos del servidor
+        conexion.poll()
+        while conexion.notifies:
+            yield conexion.notifies.pop(0).payload
+
+
+def _decodificar(aviso):
+    """Devuelve (origen, ids) de un aviso "origen:id,id,..." (ids None = todos)"""
+    origen, _, ids = aviso.partition(":")
+    return origen, ({int(id_device) for id_device in ids.split(",")} if ids else None)
+
+
+# Instancia única por proceso
+difusor = Difusor()
+
+
+def publicar(ids):
+    """Avisa de lecturas nuevas de los dispositivos al confirmarse la transacción actual"""
+    ids = set(ids)
+    transaction.on_commit(lambda: difusor.repartir(ids))
+    if connection.vendor == "postgresql":
+        aviso = ",".join(str(id_device) for id_device in sorted(ids))
+        if len(aviso) > LARGO_MAXIMO_AVISO:
+            aviso = ""  # Demasiados dispositivos: avisar sin detalle
+        with connection.cursor() as cursor:
+            # NOTIFY dentro de la transacción se entrega solo si se confirma
+            cursor.execute("SELECT pg_notify(%s, %s)", [CANAL, f"{_origen()}:{aviso}"])
+
+
+async def flujo_eventos(dispositivo=None):
+    """Genera el flujo SSE: un evento "lecturas" con los ids de los dispositivos con cambios"""
+    suscripcion = difusor.suscribir(dispositivo)
+    try:
+        yield "retry: 5000\n\n"  # Espera del navegador antes de reconectar
+        while True:
+            try:
+                ids = await suscripcion.esperar(KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield f"event: lecturas\ndata: {json.dumps(ids)}\n\n"
+            # Los avisos que lleguen mientras tanto se envían juntos en el siguiente evento
+            await asyncio.sleep(INTERVALO_MINIMO)
+    finally:
+        difusor.desuscribir(suscripcion)
@@ -0,0 +1,209 @@
+"""
+Últimas lecturas de cada dispositivo en memoria, para el detalle del contenedor
+y gráficos pequeños sin consultar la base de datos.
+
+Cada dispositivo tiene un anillo de tamaño fijo (HISTORIAL_RECIENTE_VENTANA
+lecturas) sobre arreglos compactos: 13 bytes por lectura (fecha como float de
+8 bytes, nivel de 4 y puerta de 1), así que la memoria es predecible:
+dispositivos × ventana × 13 bytes. Guarda los reportes guardados, no las
+lecturas que la banda muerta descartó.
+
+El almacén se carga en el primer uso de cada proceso con una sola consulta
+(LATERAL sobre el índice (dispositivo, -fecha)) y la ingesta le agrega los
+reportes al confirmar cada lote; los que se confirman mientras corre la carga
+se guardan aparte y se agregan al terminarla. Las lecturas atrasadas se
+insertan en su lugar según la fecha. Como otros procesos no ven esos
+reportes, un anillo con más de HISTORIAL_RECIENTE_TTL segundos se recarga desde
+la base de datos al leerlo (None = nunca, para despliegues de un solo proceso).
+"""
+import bisect
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+class Anillo:
+    """Últimas lecturas de un dispositivo, ordenadas por fecha"""
+
+    __slots__ = ("fechas", "niveles", "puertas", "inicio", "cantidad", "sincronizado")
+
+    def __init__(self, ventana):
+        self.fechas = array("d", bytes(8 * ventana))  # Segundos Unix
+        self.niveles = array("i", bytes(4 * ventana))
+        self.puertas = array("b", bytes(ventana))
+        self.inicio = 0  # Posición de la lectura más antigua
+        self.cantidad = 0
+        self.sincronizado = time.monotonic()
+
+    def _ultima_fecha(self):
+        return self.fechas[(self.inicio + self.cantidad - 1) % len(self.fechas)]
+
+    def agregar(self, fecha, nivel, puerta):
+        if self.cantidad and fecha < self._ultima_fecha():
+            self._insertar(fecha, nivel, puerta)
+        else:
+            self._anexar(fecha, nivel, puerta)
+
+    def _anexar(self, fecha, nivel, puerta):
+        ventana = len(self.fechas)
+        posicion = (self.inicio + self.cantidad) % ventana
+        self.fechas[posicion] = fecha
+        self.niveles[posicion] = nivel
+        self.puertas[posicion] = puerta
+        if self.cantidad < ventana:
+            self.cantidad += 1
+        else:
+            self.inicio = (self.inicio + 1) % ventana  # Se pisó la más antigua
+
+    def _insertar(self, fecha, nivel, puerta):
+        """Inserta una lectura atrasada en su lugar; recorre la ventana, pero es poco frecuente"""
+        lecturas = self.lecturas(self.cantidad)
+        if self.cantidad == len(self.fechas) and fecha < lecturas[0][0]:
+            return  # Más antigua que toda la ventana
+        bisect.insort(lecturas, (fecha, nivel, puerta), key=lambda lectura: lectura[0])
+        self.inicio = self.cantidad = 0
+        for lectura in lecturas[-len(self.fechas):]:
+            self._anexar(*lectura)
+
+    def contiene(self, fecha, nivel, puerta):
+        """Indica si la lectura ya está en el anillo"""
+        return (fecha, nivel, bool(puerta)) in self.lecturas(self.cantidad)
+
+    def lecturas(self, limite):
+        """Las ``limite`` lecturas más recientes, de la más antigua a la más nueva"""
+        ventana = len(self.fechas)
+        cantidad = min(limite, self.cantidad)
+        primera = self.inicio + self.cantidad - cantidad
+        return [
+            (self.fechas[posicion], self.niveles[posicion], bool(self.puertas[posicion]))
+            for posicion in ((primera + indice) % ventana for indice in range(cantidad))
+        ]
+
+
+class HistorialReciente:
+    """Anillos de todos los dispositivos, compartidos por los hilos del proceso"""
+
+    def __init__(self, ventana, ttl):
+        self.ventana = ventana
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._anillos = None  # dict id -> Anillo, None si no está cargado
+        self._pendientes = None  # Reportes confirmados durante la carga inicial
+
+    def _nuevo_anillo(self, filas):
+        anillo = Anillo(self.ventana)
+        for fecha, nivel, puerta in filas:
+            anillo.agregar(fecha.timestamp(), nivel, puerta)
+        return anillo
+
+    def _calentar(self):
+        """Carga las últimas lecturas de todos los dispositivos en una consulta"""
+        from .models import Dispositivo, Reporte  # Import diferido: el almacén se crea antes que los modelos
+
+        por_dispositivo = {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT d.id, r.fecha, r.medicion_nivel, r.estado_puerta
+                FROM {Dispositivo._meta.db_table} AS d
+                CROSS JOIN LATERAL (
+                    SELECT fecha, medicion_nivel, estado_puerta
+                    FROM {Reporte._meta.db_table}
+                    WHERE dispositivo_id = d.id
+                    ORDER BY fecha DESC
+                    LIMIT %s
+                ) AS r
+                ORDER BY d.id, r.fecha
+                """,
+                [self.ventana],
+            )
+            for id_device, fecha, nivel, puerta in cursor.fetchall():
+                por_dispositivo.setdefault(id_device, []).append((fecha, nivel, puerta))
+        return {id_device: self._nuevo_anillo(filas) for id_device, filas in por_dispositivo.items()}
+
+    def _cargar_todos(self):
+        """
+        Carga inicial. Los reportes confirmados desde que empieza se juntan en
+        _pendientes: la consulta puede haberlos leído o no, así que se agregan
+        al terminar los que falten.
+        """
+        with self._lock:
+            if self._anillos is not None:
+                return
+            if self._pendientes is None:
+                self._pendientes = []
+        anillos = self._calentar()
+        with self._lock:
+            if self._anillos is not None:
+                return  # Otro hilo terminó primero
+            for id_device, fecha, nivel, puerta in self._pendientes:
+                anillo = anillos.get(id_device)
+                if anillo is None:
+                    anillo = anillos[id_device] = Anillo(self.ventana)
+                if not anillo.contiene(fecha, nivel, puerta):
+                    anillo.agregar(fecha, nivel, puerta)
+            self._anillos = anillos
+            self._pendientes = None
+
+    def _cargar(self, id_device):
+        """Lee de la base de datos las últimas lecturas de un dispositivo"""
+        from .models import Reporte
+
+        filas = (
+            Reporte.objects.filter(dispositivo_id=id_device)
+            .order_by("-fecha")
+            .values_list("fecha", "medicion_nivel", "estado_puerta")[:self.ventana]
+        )
+        return self._nuevo_anillo(reversed(list(filas)))
+
+    def obtener(self, id_device, limite=None):
+        """
+        Últimas lecturas (fecha en segundos Unix, nivel, puerta) del dispositivo,
+        de la más antigua a la más nueva.
+        """
+        if self._anillos is None:
+            self._cargar_todos()
+
+        anillo = self._anillos.get(id_device)
+        if anillo is None or (self._ttl is not None and time.monotonic() - anillo.sincronizado > self._ttl):
+            anillo = self._cargar(id_device)
+            with self._lock:
+                self._anillos[id_device] = anillo
+
+        with self._lock:
+            return anillo.lecturas(limite or self.ventana)
+
+    def agregar(self, reportes):
+        """Agrega reportes guardados cuando se confirme la transacción actual"""
+        filas = [(r.dispositivo_id, r.fecha.timestamp(), r.medicion_nivel, r.estado_puerta) for r in reportes]
+        if filas:
+            transaction.on_commit(lambda: self._agregar(filas))
+
+    def _agregar(self, filas):
+        with self._lock:
+            if self._anillos is None:
+                if self._pendientes is not None:
+                    self._pendientes.extend(filas)  # Carga en curso: se agregan al terminarla
+                # Sin cargar: la carga inicial ya los leerá de la base de datos
+                return
+            for id_device, fecha, nivel, puerta in filas:
+                anillo = self._anillos.get(id_device)
+                if anillo is None:
+                    anillo = self._anillos[id_device] = Anillo(self.ventana)
+                anillo.agregar(fecha, nivel, puerta)
+
+    def descartar(self, id_device):
+        """Olvida el anillo de un dispositivo (por ejemplo, al borrarlo)"""
+        with self._lock:
+            if self._anillos is not None:
+                self._anillos.pop(id_device, None)
+
+
+# Instancia única usada por toda la aplicación
+historial_reciente = HistorialReciente(
+    ventana=getattr(settings, "HISTORIAL_RECIENTE_VENTANA", 300),
+    ttl=getattr(settings, "HISTORIAL_RECIENTE_TTL", 60),
+)
@@ -0,0 +1,346 @@
+"""
+Lógica de ingesta de las lecturas enviadas por los módulos ESP32.
+
+Valida cada lectura y la guarda junto con sus alertas. Las lecturas se
+procesan por lotes: los reportes se insertan en bloque dentro de una sola
+transacción y las alertas se evalúan por dispositivo en una sola pasada.
+
+Los dispositivos con banda muerta solo guardan un reporte cuando la lectura
+cambia respecto del último reporte guardado; el historial queda como una
+función escalonada (cada reporte vale hasta el siguiente). Todas las lecturas,
+guardadas o no, actualizan el estado actual y los resúmenes.
+"""
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Reporte, Alerta, EstadoDispositivo
+from .registro import registro
+from .historial_reciente import historial_reciente
+from . import eventos, resumen_flota, resumenes
+
+# Nivel (%) a partir del cual se genera una alerta
+UMBRAL_ALERTA = 75
+
+# Rango válido del nivel medido (%)
+NIVEL_MIN = 0
+NIVEL_MAX = 100
+
+# Cantidad máxima de lecturas aceptadas en una sola petición
+LOTE_MAX = getattr(settings, "ESP32_LOTE_MAX", 1000)
+
+# Largo máximo en bytes de una línea del protocolo compacto
+LINEA_MAX = 256
+
+# Adelanto máximo aceptado en la fecha enviada por un dispositivo
+TOLERANCIA_RELOJ = timedelta(minutes=5)
+
+# Tiempo máximo sin guardar un reporte de un dispositivo con banda muerta
+PERSISTENCIA_MAXIMA = timedelta(seconds=getattr(settings, "ESP32_PERSISTENCIA_MAXIMA", 3600))
+
+# Lectura ya validada, lista para guardarse. Sin fecha se usa la hora de guardado.
+Lectura = namedtuple("Lectura", ["id_device", "nivel", "puerta", "fecha"], defaults=(None,))
+
+
+def validar_nivel(medida_nivel):
+    """
+    Convierte el nivel a entero. Rechaza Infinity/NaN (que json.loads acepta) y
+    los valores fuera de rango, que de otro modo fallarían al guardar el lote.
+    """
+    if not math.isfinite(medida_nivel) or not NIVEL_MIN <= medida_nivel <= NIVEL_MAX:
+        raise ValueError(f"El campo 'nivel' debe estar entre {NIVEL_MIN} y {NIVEL_MAX}")
+    return int(medida_nivel)
+
+
+def validar_lectura(info):
+    """Valida una lectura decodificada del JSON y devuelve una Lectura"""
+    if not isinstance(info, dict):
+        raise ValueError("Cada lectura debe ser un objeto JSON")
+
+    id_device = info.get('id_device')  # Id del dispositivo
+    medida_nivel = info.get('nivel')  # Nivel medido
+    estado_puerta = info.get('puerta')  # Estado de puerta
+
+    if isinstance(id_device, bool) or not isinstance(id_device, int):
+        raise ValueError("El campo 'id_device' debe ser un entero")
+    if isinstance(medida_nivel, bool) or not isinstance(medida_nivel, (int, float)):
+        raise ValueError("El campo 'nivel' debe ser numérico")
+    if estado_puerta not in (True, False, 0, 1):
+        raise ValueError("El campo 'puerta' debe ser booleano")
+
+    return Lectura(id_device, validar_nivel(medida_nivel), bool(estado_puerta))
+
+
+def parsear_linea(linea):
+    """
+    Convierte una línea del protocolo compacto ``id,nivel,puerta[,ts]`` en una
+    Lectura. ``puerta`` es 0 o 1 y ``ts`` son segundos Unix (UTC) opcionales.
+    """
+    campos = linea.split(b",")
+    if len(campos) not in (3, 4):
+        raise ValueError("La línea debe tener el formato id,nivel,puerta[,ts]")
+    try:
+        id_device = int(campos[0])
+        medida_nivel = float(campos[1])
+        estado_puerta = int(campos[2])
+        fecha = datetime.fromtimestamp(int(campos[3]), tz=dt_timezone.utc) if len(campos) == 4 else None
+    except (ValueError, OverflowError, OSError):
+        raise ValueError("La línea contiene valores no numéricos")
+
+    medida_nivel = validar_nivel(medida_nivel)
+    if estado_puerta not in (0, 1):
+        raise ValueError("El campo 'puerta' debe ser 0 o 1")
+    if fecha and fecha > timezone.now() + TOLERANCIA_RELOJ:
+        raise ValueError("La fecha de la lectura está en el futuro")
+    return Lectura(id_device, medida_nivel, bool(estado_puerta), fecha)
+
+
+def leer_lineas(flujo, limite, largo_max=LINEA_MAX):
+    """
+    Lee las líneas no vacías de un flujo de bytes sin cargarlo completo.
+    Lanza OverflowError si hay más de ``limite`` lecturas y ValueError si una
+    línea supera ``largo_max`` bytes.
+    """
+    lineas = []
+    while True:
+        # Leer con tope: una línea sin fin de línea no se acumula entera en memoria
+        linea = flujo.readline(largo_max + 1)
+        if not linea:
+            break
+        if len(linea) > largo_max and not linea.endswith(b"\n"):
+            raise ValueError(f"Una línea supera el máximo de {largo_max} bytes")
+        linea = linea.strip()
+        if not linea or linea.startswith(b"#"):
+            continue  # Líneas vacías y comentarios
+        if len(lineas) == limite:
+            raise OverflowError(limite)
+        lineas.append(linea)
+    return lineas
+
+
+def validar_lote(items, validar=validar_lectura):
+    """
+    Valida una lista de lecturas (objetos JSON o, con ``validar=parsear_linea``,
+    líneas del protocolo compacto).
+    Devuelve los resultados (None para las lecturas válidas) y la lista de
+    pares (índice, Lectura) aceptados, en el mismo orden recibido.
+    """
+    resultados = [None] * len(items)
+
+    # Validar el formato de cada lectura
+    validas = []
+    for indice, info in enumerate(items):
+        try:
+            validas.append((indice, validar(info)))
+        except ValueError as ve:
+            resultados[indice] = {"status": "error", "message": str(ve)}
+
+    # Validar que los dispositivos existan, usando el registro en memoria
+    aceptadas = []
+    for indice, lectura in validas:
+        if registro.existe(lectura.id_device):
+            aceptadas.append((indice, lectura))
+        else:
+            resultados[indice] = {
+                "status": "error",
+                "message": f"El dispositivo con id {lectura.id_device} no existe",
+            }
+    return resultados, aceptadas
+
+
+def procesar_lote(items, validar=validar_lectura, reintentar=True):
+    """
+    Valida y guarda una lista de lecturas.
+    Devuelve un resultado por cada elemento, en el mismo orden recibido.
+    """
+    resultados, aceptadas = validar_lote(items, validar)
+
+    try:
+        reportes = guardar_lecturas([lectura for _, lectura in aceptadas])
+    except IntegrityError:
+        if not reintentar:
+            raise
+        # Algún dispositivo se borró en otro proceso: recargar el registro y reintentar
+        registro.invalidar()
+        return procesar_lote(items, validar, reintentar=False)
+
+    for (indice, _), reporte in zip(aceptadas, reportes):
+        # reporte_id es None si la lectura no generó un reporte (banda muerta)
+        resultados[indice] = {"status": "ok", "reporte_id": reporte.id}
+
+    return resultados
+
+
+def debe_guardarse(reporte, persistido):
+    """
+    Indica si una lectura se guarda como reporte según la banda muerta de su
+    dispositivo. ``persistido`` es (nivel, puerta, fecha) del último reporte
+    guardado, o None si no hay ninguno.
+    """
+    info = registro.obtener(reporte.dispositivo_id)
+    if info is None or info.banda_muerta is None or persistido is None or persistido[0] is None:
+        return True
+    nivel, puerta, fecha = persistido
+    return (
+        abs(reporte.medicion_nivel - nivel) > info.banda_muerta
+        or reporte.estado_puerta != puerta
+        # Los cruces del umbral siempre se guardan: las alertas apuntan a su reporte
+        or (reporte.medicion_nivel >= UMBRAL_ALERTA) != (nivel >= UMBRAL_ALERTA)
+        or reporte.fecha - fecha >= PERSISTENCIA_MAXIMA
+    )
+
+
+def guardar_lecturas(lecturas):
+    """
+    Inserta en bloque los reportes de lecturas ya validadas y actualiza sus
+    alertas. Los dispositivos deben existir. Devuelve un reporte por lectura;
+    los de lecturas descartadas por la banda muerta quedan sin guardar (id None).
+    """
+    if not lecturas:
+        return []
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        # Bloquear el estado de los dispositivos del lote para que dos lotes
+        # del mismo dispositivo no evalúen sus alertas a la vez, y leer el
+        # último reporte guardado y el estado anterior de cada uno
+        ids = sorted({lectura.id_device for lectura in lecturas})
+        persistidos = {}
+        anteriores = {}
+        actuales = {}  # Última lectura conocida de cada dispositivo: (nivel, puerta, fecha)
+        for fila in (
+            EstadoDispositivo.objects.select_for_update()
+            .filter(dispositivo_id__in=ids)
+            .order_by("dispositivo_id")
+            .values_list(
+                "dispositivo_id", "nivel_persistido", "puerta_persistida", "fecha_persistida",
+                "ultimo_nivel", "estado_puerta", "alerta_activa_id", "ultima_fecha",
+            )
+        ):
+            persistidos[fila[0]] = fila[1:4]
+            anteriores[fila[0]] = (fila[4], fila[5], fila[6] is not None)
+            actuales[fila[0]] = (fila[4], fila[5], fila[7])
+
+        reportes = [
+            Reporte(
+                dispositivo_id=lectura.id_device,
+                medicion_nivel=lectura.nivel,
+                estado_puerta=lectura.puerta,
+                fecha=lectura.fecha or ahora,
+            )
+            for lectura in lecturas
+        ]
+
+        # Aplicar la banda muerta y crear los reportes con una sola inserción
+        guardados = []
+        for reporte in reportes:
+            persistido = persistidos.get(reporte.dispositivo_id)
+            if debe_guardarse(reporte, persistido):
+                guardados.append(reporte)
+                # Una lectura atrasada no reemplaza al último reporte guardado
+                if persistido is None or persistido[2] is None or reporte.fecha >= persistido[2]:
+                    persistidos[reporte.dispositivo_id] = (reporte.medicion_nivel, reporte.estado_puerta, reporte.fecha)
+        Reporte.objects.bulk_create(guardados)
+        historial_reciente.agregar(guardados)  # Últimas lecturas en memoria, al confirmar
+
+        # Alertas activas de los dispositivos del lote, en una sola consulta
+        # sobre el índice parcial de alertas activas
+        alertas_activas = {}
+        consulta = (
+            Alerta.objects.select_for_update()
+            .filter(dispositivo_id__in=ids, is_activa=True)
+            .order_by("fecha_alerta")
+        )
+        for alerta in consulta:
+            alertas_activas[alerta.dispositivo_id] = alerta
+
+        # Evaluar los reportes guardados en orden de fecha, por dispositivo. Las
+        # lecturas descartadas no cruzan el umbral, así que no cambian las
+        # alertas. Las atrasadas (anteriores a la última lectura ya evaluada)
+        # se guardan como historial pero no abren ni cierran alertas: cerrarían
+        # una alerta más nueva con una fecha anterior a su inicio, o abrirían
+        # una mientras el estado muestra un nivel bajo.
+        evaluadas = {id_device: actual[2] for id_device, actual in actuales.items()}
+        nuevas = []
+        desactivadas = []
+        for reporte in sorted(guardados, key=lambda reporte: reporte.fecha):
+            ultima = evaluadas.get(reporte.dispositivo_id)
+            if ultima is not None and reporte.fecha < ultima:
+                continue
+            evaluadas[reporte.dispositivo_id] = reporte.fecha
+            alerta_activa = alertas_activas.get(reporte.dispositivo_id)
+            if reporte.medicion_nivel >= UMBRAL_ALERTA:
+                # Crear alerta si el nivel supera el umbral y no hay alerta activa
+                if not alerta_activa:
+                    alerta = Alerta(
+                        reporte=reporte,
+                        dispositivo_id=reporte.dispositivo_id,
+                        mensaje=f"VACIAR CONTENEDOR - Nivel medido: {reporte.medicion_nivel}%",
+                        fecha_alerta=reporte.fecha,
+                        is_activa=True,
+                    )
+                    nuevas.append(alerta)
+                    alertas_activas[reporte.dispositivo_id] = alerta
+            elif alerta_activa:
+                # Si hay alerta activa y el nivel bajó, desactivarla
+                alerta_activa.is_activa = False
+                alerta_activa.fecha_desactivada = reporte.fecha
+                if alerta_activa.pk:
+                    desactivadas.append(alerta_activa)
+                alertas_activas[reporte.dispositivo_id] = None
+
+        # Primero las desactivaciones, para respetar una sola alerta activa por dispositivo
+        if desactivadas:
+            Alerta.objects.bulk_update(desactivadas, ["is_activa", "fecha_desactivada"])
+        if nuevas:
+            Alerta.objects.bulk_create(nuevas)
+
+        # Sumar el lote a los resúmenes por hora y por día
+        cerradas = desactivadas + [alerta for alerta in nuevas if not alerta.is_activa]
+        resumenes.acumular(reportes, nuevas, cerradas)
+
+        # Actualizar el estado actual con la lectura más reciente de cada
+        # dispositivo. Las lecturas llegan desordenadas (fechas del protocolo
+        # compacto, vaciados atrasados del buffer): si el estado guardado es
+        # más nuevo que todo el lote, se conserva.
+        for reporte in reportes:
+            actual = actuales.get(reporte.dispositivo_id)
+            if actual is None or reporte.fecha >= actual[2]:
+                actuales[reporte.dispositivo_id] = (reporte.medicion_nivel, reporte.estado_puerta, reporte.fecha)
+        ultimos = {id_device: actuales[id_device] for id_device in ids}
+        EstadoDispositivo.objects.bulk_create(
+            [
+                EstadoDispositivo(
+                    dispositivo_id=id_device,
+                    ultimo_nivel=nivel,
+                    estado_puerta=puerta,
+                    ultima_fecha=fecha,
+                    alerta_activa=alertas_activas.get(id_device),
+                    nivel_persistido=persistidos[id_device][0],
+                    puerta_persistida=persistidos[id_device][1],
+                    fecha_persistida=persistidos[id_device][2],
+                    actualizado=timezone.now(),
+                )
+                for id_device, (nivel, puerta, fecha) in ultimos.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["dispositivo"],
+            update_fields=[
+                "ultimo_nivel", "estado_puerta", "ultima_fecha", "alerta_activa",
+                "nivel_persistido", "puerta_persistida", "fecha_persistida", "actualizado",
+            ],
+        )
+
+        # Ajustar el resumen de la flota y avisar a los dashboards conectados
+        # cuando se confirme la transacción
+        resumen_flota.registrar_cambios(anteriores, {
+            id_device: (nivel, puerta, alertas_activas.get(id_device) is not None)
+            for id_device, (nivel, puerta, _) in ultimos.items()
+        })
+        eventos.publicar(ultimos.keys())
+
+    return reportes
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from dashboard.particiones import (
+    TABLA, crear_particion, inicio_mes, listar_particiones, nombre_particion, sumar_meses,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea las particiones mensuales futuras de Reporte y elimina (o desacopla) "
+        "las que superan el período de retención, junto con sus alertas inactivas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses-adelante", type=int, default=settings.REPORTE_MESES_ADELANTE,
+            help="Meses futuros que deben tener partición creada.",
+        )
+        parser.add_argument(
+            "--retencion-meses", type=int, default=settings.REPORTE_RETENCION_MESES,
+            help="Meses completos de historial que se conservan, además del mes actual.",
+        )
+        parser.add_argument(
+            "--desacoplar", action="store_true",
+            help="Desacopla las particiones vencidas en lugar de borrarlas (para archivarlas). "
+                 "Sus alertas se copian a una tabla <particion>_alertas.",
+        )
+        parser.add_argument(
+            "--simular", action="store_true",
+            help="Muestra lo que se haría sin modificar la base de datos.",
+        )
+
+    def handle(self, *args, **opciones):
+        if connection.vendor != "postgresql":
+            raise CommandError("Las particiones de Reporte solo existen en PostgreSQL.")
+        if opciones["retencion_meses"] < 1:
+            raise CommandError("--retencion-meses debe ser al menos 1.")
+
+        mes_actual = inicio_mes(timezone.now())
+        simular = opciones["simular"]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            existentes = {mes for mes, _ in listar_particiones(cursor)}
+
+            # Crear las particiones que falten hasta los meses adelante pedidos
+            for desplazamiento in range(opciones["meses_adelante"] + 1):
+                mes = sumar_meses(mes_actual, desplazamiento)
+                if mes not in existentes:
+                    self.stdout.write(f"Creando {nombre_particion(mes)}")
+                    if not simular:
+                        crear_particion(cursor, mes)
+
+            # Eliminar o desacoplar las particiones anteriores al límite de retención
+            limite = sumar_meses(mes_actual, -opciones["retencion_meses"])
+            for mes, nombre in listar_particiones(cursor):
+                if mes >= limite:
+                    break
+                accion = "Desacoplando" if opciones["desacoplar"] else "Eliminando"
+                self.stdout.write(f"{accion} {nombre}")
+                if not simular:
+                    self.retirar_particion(cursor, nombre, opciones["desacoplar"])
+
+            if simular:
+                transaction.set_rollback(True)
+
+    def retirar_particion(self, cursor, nombre, desacoplar):
+        """Retira una partición vencida y las alertas inactivas de sus reportes"""
+        if desacoplar:
+            # Archivar las alertas junto a la partición desacoplada
+            cursor.execute(
+                f"CREATE TABLE {nombre}_alertas AS "
+                f"SELECT a.* FROM dashboard_alerta a JOIN {nombre} r ON r.id = a.reporte_id "
+                f"WHERE NOT a.is_activa"
+            )
+        # Las alertas activas se conservan: siguen vigentes para su dispositivo
+        cursor.execute(
+            f"DELETE FROM dashboard_alerta a USING {nombre} r "
+            f"WHERE r.id = a.reporte_id AND NOT a.is_activa"
+        )
+        if desacoplar:
+            cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}")
+        else:
+            cursor.execute(f"DROP TABLE {nombre}")
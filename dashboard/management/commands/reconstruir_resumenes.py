@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from dashboard import resumenes
+from dashboard.models import Dispositivo, Reporte
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes por hora y por día a partir de los reportes y alertas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde", type=date.fromisoformat,
+            help="Primer día a recalcular (AAAA-MM-DD). Por defecto, el del reporte más antiguo.",
+        )
+        parser.add_argument(
+            "--hasta", type=date.fromisoformat,
+            help="Último día a recalcular (AAAA-MM-DD). Por defecto, hoy.",
+        )
+        parser.add_argument(
+            "--dias-por-lote", type=int, default=7,
+            help="Días recalculados en cada transacción.",
+        )
+        parser.add_argument(
+            "--incluir-banda-muerta", action="store_true",
+            help="Recalcula también los dispositivos con banda muerta. Sus resúmenes cuentan "
+                 "lecturas que no se guardaron como reporte y que se perderían al recalcular.",
+        )
+
+    def handle(self, *args, **opciones):
+        desde = opciones["desde"]
+        if desde is None:
+            primero = Reporte.objects.aggregate(primero=Min("fecha"))["primero"]
+            if primero is None:
+                self.stdout.write("No hay reportes.")
+                return
+            desde = timezone.localdate(primero)
+        hasta = opciones["hasta"] or timezone.localdate()
+        if hasta < desde:
+            raise CommandError("--hasta debe ser posterior a --desde.")
+        if opciones["dias_por_lote"] < 1:
+            raise CommandError("--dias-por-lote debe ser al menos 1.")
+
+        # Los resúmenes de los dispositivos con banda muerta incluyen lecturas que no
+        # están en Reporte: recalcularlos desde los reportes perdería esos conteos
+        dispositivos = None
+        if not opciones["incluir_banda_muerta"]:
+            con_banda = Dispositivo.objects.filter(banda_muerta__isnull=False)
+            if con_banda.exists():
+                dispositivos = list(Dispositivo.objects.filter(banda_muerta__isnull=True).values_list("id", flat=True))
+                nombres = ", ".join(con_banda.order_by("id").values_list("device_name", flat=True))
+                self.stdout.write(self.style.WARNING(
+                    f"Se omiten los dispositivos con banda muerta ({nombres}); use --incluir-banda-muerta para recalcularlos."
+                ))
+
+        # Por tramos de días, para no bloquear las tablas en una sola transacción larga
+        dia = desde
+        while dia <= hasta:
+            fin = min(dia + timedelta(days=opciones["dias_por_lote"]), hasta + timedelta(days=1))
+            with transaction.atomic():
+                resumenes.reconstruir(resumenes.inicio_fecha(dia), resumenes.inicio_fecha(fin), dispositivos)
+            self.stdout.write(f"Resúmenes recalculados del {dia} al {fin - timedelta(days=1)}")
+            dia = fin
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_estados(apps, schema_editor):
+    """Crea el estado actual de cada dispositivo a partir de su historial"""
+    Reporte = apps.get_model("dashboard", "Reporte")
+    Alerta = apps.get_model("dashboard", "Alerta")
+    EstadoDispositivo = apps.get_model("dashboard", "EstadoDispositivo")
+
+    # Última alerta activa de cada dispositivo
+    alertas = {
+        a.reporte.dispositivo_id: a.id
+        for a in Alerta.objects.filter(is_activa=True)
+        .select_related("reporte")
+        .order_by("reporte__dispositivo_id", "-fecha_alerta")
+        .distinct("reporte__dispositivo_id")
+    }
+
+    # Último reporte de cada dispositivo
+    ultimos = (
+        Reporte.objects.order_by("dispositivo_id", "-fecha")
+        .distinct("dispositivo_id")
+    )
+    EstadoDispositivo.objects.bulk_create([
+        EstadoDispositivo(
+            dispositivo_id=r.dispositivo_id,
+            ultimo_nivel=r.medicion_nivel,
+            estado_puerta=r.estado_puerta,
+            ultima_fecha=r.fecha,
+            alerta_activa_id=alertas.get(r.dispositivo_id),
+        )
+        for r in ultimos
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoDispositivo',
+            fields=[
+                ('dispositivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado', serialize=False, to='dashboard.dispositivo')),
+                ('ultimo_nivel', models.IntegerField()),
+                ('estado_puerta', models.BooleanField()),
+                ('ultima_fecha', models.DateTimeField()),
+                ('alerta_activa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.alerta')),
+            ],
+        ),
+        migrations.RunPython(poblar_estados, migrations.RunPython.noop),
+    ]
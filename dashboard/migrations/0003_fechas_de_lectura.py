@@ -0,0 +1,22 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_estadodispositivo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reporte',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='alerta',
+            name='fecha_alerta',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,46 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def poblar_dispositivo(apps, schema_editor):
+    """Copia el dispositivo del reporte en cada alerta y deja una sola activa por dispositivo"""
+    Reporte = apps.get_model("dashboard", "Reporte")
+    Alerta = apps.get_model("dashboard", "Alerta")
+
+    # Un solo UPDATE para todas las alertas existentes
+    Alerta.objects.update(dispositivo_id=Subquery(
+        Reporte.objects.filter(pk=OuterRef("reporte_id")).values("dispositivo_id")[:1]
+    ))
+
+    # Desactivar las alertas activas duplicadas, conservando la más reciente
+    duplicadas = []
+    vistos = set()
+    activas = (
+        Alerta.objects.filter(is_activa=True)
+        .order_by("dispositivo_id", "-fecha_alerta", "-id")
+        .values_list("id", "dispositivo_id")
+    )
+    for id_alerta, id_dispositivo in activas:
+        if id_dispositivo in vistos:
+            duplicadas.append(id_alerta)
+        vistos.add(id_dispositivo)
+    if duplicadas:
+        Alerta.objects.filter(id__in=duplicadas).update(is_activa=False, fecha_desactivada=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_fechas_de_lectura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alerta',
+            name='dispositivo',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='dashboard.dispositivo'),
+        ),
+        migrations.RunPython(poblar_dispositivo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Separada de 0004: PostgreSQL no permite alterar la tabla en la misma
+# transacción en que se actualizaron filas con claves foráneas diferidas.
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_alerta_dispositivo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alerta',
+            name='dispositivo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='dashboard.dispositivo'),
+        ),
+        migrations.AddConstraint(
+            model_name='alerta',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_activa', True)), fields=('dispositivo',), name='alerta_activa_unica_por_dispositivo'),
+        ),
+    ]
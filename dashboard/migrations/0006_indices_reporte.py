@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_alerta_activa_unica'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reporte',
+            index=models.Index(fields=['dispositivo', '-fecha'], name='reporte_disp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reporte',
+            index=models.Index(fields=['fecha'], name='reporte_fecha_idx'),
+        ),
+        migrations.AlterField(
+            model_name='reporte',
+            name='dispositivo',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reportes', to='dashboard.dispositivo'),
+        ),
+    ]
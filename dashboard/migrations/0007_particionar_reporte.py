@@ -0,0 +1,83 @@
+# Convierte dashboard_reporte en una tabla particionada por mes (PostgreSQL).
+# La clave primaria pasa a ser (id, fecha), por lo que la FK de Alerta.reporte
+# deja de existir en la base de datos (db_constraint=False).
+from datetime import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+MESES_ADELANTE = 3
+
+
+def particionar(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # Apartar la tabla actual y liberar los nombres de su secuencia e índices
+        cursor.execute("ALTER TABLE dashboard_reporte RENAME TO dashboard_reporte_old")
+        cursor.execute("ALTER TABLE dashboard_reporte_old RENAME CONSTRAINT dashboard_reporte_pkey TO dashboard_reporte_old_pkey")
+        cursor.execute("DROP INDEX IF EXISTS reporte_disp_fecha_idx")
+        cursor.execute("DROP INDEX IF EXISTS reporte_fecha_idx")
+        cursor.execute("ALTER TABLE dashboard_reporte_old ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute("ALTER TABLE dashboard_reporte_old ALTER COLUMN id DROP DEFAULT")
+        cursor.execute("DROP SEQUENCE IF EXISTS dashboard_reporte_id_seq")
+
+        # Tabla particionada con los mismos campos e índices
+        cursor.execute("""
+            CREATE TABLE dashboard_reporte (
+                id bigint GENERATED BY DEFAULT AS IDENTITY,
+                medicion_nivel integer NOT NULL,
+                estado_puerta boolean NOT NULL,
+                fecha timestamp with time zone NOT NULL,
+                dispositivo_id bigint NOT NULL
+                    REFERENCES dashboard_dispositivo (id) DEFERRABLE INITIALLY DEFERRED,
+                PRIMARY KEY (id, fecha)
+            ) PARTITION BY RANGE (fecha)
+        """)
+        cursor.execute("CREATE INDEX reporte_disp_fecha_idx ON dashboard_reporte (dispositivo_id, fecha DESC)")
+        cursor.execute("CREATE INDEX reporte_fecha_idx ON dashboard_reporte (fecha)")
+        cursor.execute("CREATE TABLE dashboard_reporte_default PARTITION OF dashboard_reporte DEFAULT")
+
+        # Una partición por mes, desde el reporte más antiguo hasta unos meses adelante
+        cursor.execute("SELECT min(fecha) FROM dashboard_reporte_old")
+        primera = timezone.localtime(cursor.fetchone()[0] or timezone.now())
+        ultima = timezone.localtime(timezone.now())
+        indice = primera.year * 12 + primera.month - 1
+        fin = ultima.year * 12 + ultima.month - 1 + MESES_ADELANTE
+        while indice <= fin:
+            desde = timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+            hasta = timezone.make_aware(datetime((indice + 1) // 12, (indice + 1) % 12 + 1, 1))
+            cursor.execute(
+                f"CREATE TABLE dashboard_reporte_p{desde.year:04d}_{desde.month:02d} PARTITION OF dashboard_reporte "
+                f"FOR VALUES FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}')"
+            )
+            indice += 1
+
+        # Copiar los datos y continuar la numeración de ids
+        cursor.execute("""
+            INSERT INTO dashboard_reporte (id, medicion_nivel, estado_puerta, fecha, dispositivo_id)
+            SELECT id, medicion_nivel, estado_puerta, fecha, dispositivo_id FROM dashboard_reporte_old
+        """)
+        cursor.execute("""
+            SELECT setval(pg_get_serial_sequence('dashboard_reporte', 'id'), COALESCE(max(id), 1), max(id) IS NOT NULL)
+            FROM dashboard_reporte
+        """)
+        cursor.execute("DROP TABLE dashboard_reporte_old")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_indices_reporte'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alerta',
+            name='reporte',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='dashboard.reporte'),
+        ),
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+    ]
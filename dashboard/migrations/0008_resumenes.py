@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def campos():
+    return [
+        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+        ('periodo', models.DateTimeField()),
+        ('lecturas', models.PositiveIntegerField(default=0)),
+        ('suma_nivel', models.BigIntegerField(default=0)),
+        ('nivel_min', models.IntegerField(null=True)),
+        ('nivel_max', models.IntegerField(null=True)),
+        ('lecturas_puerta_abierta', models.PositiveIntegerField(default=0)),
+        ('alertas_iniciadas', models.PositiveIntegerField(default=0)),
+        ('alertas_cerradas', models.PositiveIntegerField(default=0)),
+        ('segundos_alerta', models.FloatField(default=0)),
+        ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dashboard.dispositivo')),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_particionar_reporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenHorario',
+            fields=campos(),
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=campos(),
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumenhorario',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'periodo'), name='resumenhorario_dispositivo_periodo'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiario',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'periodo'), name='resumendiario_dispositivo_periodo'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copiar_ultimo_reporte(apps, schema_editor):
+    # Hasta ahora se guardaban todas las lecturas: la última lectura es el último reporte guardado
+    EstadoDispositivo = apps.get_model('dashboard', 'EstadoDispositivo')
+    EstadoDispositivo.objects.update(
+        nivel_persistido=F('ultimo_nivel'),
+        puerta_persistida=F('estado_puerta'),
+        fecha_persistida=F('ultima_fecha'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_resumenes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispositivo',
+            name='banda_muerta',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='estadodispositivo',
+            name='nivel_persistido',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='estadodispositivo',
+            name='puerta_persistida',
+            field=models.BooleanField(null=True),
+        ),
+        migrations.AddField(
+            model_name='estadodispositivo',
+            name='fecha_persistida',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copiar_ultimo_reporte, migrations.RunPython.noop),
+    ]
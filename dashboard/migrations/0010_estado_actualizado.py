@@ -0,0 +1,17 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_banda_muerta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadodispositivo',
+            name='actualizado',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
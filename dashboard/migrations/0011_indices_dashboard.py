@@ -0,0 +1,30 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_estado_actualizado'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['device_name'], name='dispositivo_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='estadodispositivo',
+            index=models.Index(models.OrderBy(models.F('ultimo_nivel'), descending=True, nulls_last=True), models.F('dispositivo'), name='estado_nivel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estadodispositivo',
+            index=models.Index(condition=models.Q(('alerta_activa__isnull', False)), fields=['dispositivo'], name='estado_con_alerta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estadodispositivo',
+            index=models.Index(condition=models.Q(('estado_puerta', False)), fields=['dispositivo'], name='estado_puerta_abierta_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_indices_dashboard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='estadodispositivo',
+            name='ultima_fecha',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_estado_ultima_fecha'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(fields=['dispositivo', '-fecha_alerta', '-id'], name='alerta_disp_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_indice_historial_alertas'),
+    ]
+
+    operations = [
+        # icontains usa UPPER(device_name): el índice sobre la columna sola no servía
+        migrations.RemoveIndex(
+            model_name='dispositivo',
+            name='dispositivo_nombre_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('device_name'), name='gin_trgm_ops'), name='dispositivo_nombre_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=models.Index(fields=['device_name', 'id'], name='dispositivo_nombre_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Rellena los resúmenes por hora y por día con el historial anterior a 0008:
+# la ingesta solo los mantiene desde entonces, y sin esto los PDF y las series
+# por hora o por día muestran ceros para los datos antiguos.
+from datetime import timedelta
+
+from django.db import migrations, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+# Días recalculados en cada transacción
+DIAS_POR_LOTE = 7
+
+
+def rellenar(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    # Usa el mismo cálculo que el comando reconstruir_resumenes
+    from dashboard import resumenes
+
+    Reporte = apps.get_model('dashboard', 'Reporte')
+    ResumenDiario = apps.get_model('dashboard', 'ResumenDiario')
+    Dispositivo = apps.get_model('dashboard', 'Dispositivo')
+
+    primero = Reporte.objects.aggregate(primero=Min('fecha'))['primero']
+    if primero is None:
+        return
+    desde = timezone.localdate(primero)
+    mantenido = ResumenDiario.objects.aggregate(primero=Min('periodo'))['primero']
+    if mantenido is None:
+        hasta = timezone.localdate() + timedelta(days=1)
+    else:
+        # Los días anteriores al primer resumen no tienen ninguna lectura
+        # sumada: se recalculan completos desde los reportes
+        hasta = timezone.localdate(mantenido)
+
+    dia = desde
+    while dia < hasta:
+        fin = min(dia + timedelta(days=DIAS_POR_LOTE), hasta)
+        with transaction.atomic():
+            resumenes.reconstruir(resumenes.inicio_fecha(dia), resumenes.inicio_fecha(fin))
+        dia = fin
+
+    if mantenido is not None:
+        # El día del despliegue ya tiene las lecturas sumadas por la ingesta;
+        # se recalcula salvo para los dispositivos con banda muerta, cuyas
+        # lecturas no guardadas no están en Reporte
+        dispositivos = list(Dispositivo.objects.filter(banda_muerta__isnull=True).values_list('id', flat=True))
+        with transaction.atomic():
+            resumenes.reconstruir(resumenes.inicio_fecha(hasta), resumenes.inicio_fecha(hasta + timedelta(days=1)), dispositivos)
+
+
+class Migration(migrations.Migration):
+
+    # Cada tramo de días se confirma por separado, sin bloquear las tablas durante toda la migración
+    atomic = False
+
+    dependencies = [
+        ('dashboard', '0014_indices_orden_dashboard'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
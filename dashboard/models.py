@@ -1,22 +1,47 @@
 from django.db import models  # Importa herramientas para definir modelos en Django
+from django.contrib.postgres.indexes import GinIndex, OpClass  # Índice de trigramas para buscar por nombre
+from django.db.models.functions import Upper  # Misma expresión que icontains en PostgreSQL
+from django.utils import timezone  # Para la fecha y hora actual por defecto
 
 # Modelo que representa un dispositivo físico o virtual
 class Dispositivo(models.Model):
     device_name = models.CharField(max_length=100)  # Nombre del dispositivo
+    # Variación mínima de nivel (%) para guardar un reporte nuevo; vacío guarda todas las lecturas
+    banda_muerta = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Búsqueda por nombre con icontains desde el dashboard (extensión pg_trgm).
+            # En PostgreSQL icontains compara UPPER(device_name) LIKE UPPER(...):
+            # el índice debe ser sobre esa misma expresión
+            GinIndex(OpClass(Upper("device_name"), name="gin_trgm_ops"), name="dispositivo_nombre_trgm"),
+            # Orden del dashboard por nombre
+            models.Index(fields=["device_name", "id"], name="dispositivo_nombre_idx"),
+        ]
 
     def __str__(self):
         return self.device_name  # Representación legible del dispositivo en el admin y otros lugares
 
-# Modelo que representa un reporte generado por un dispositivo
+# Modelo que representa un reporte generado por un dispositivo.
+# En PostgreSQL la tabla está particionada por mes según la fecha (ver particiones.py).
 class Reporte(models.Model):
     dispositivo = models.ForeignKey(
         Dispositivo,  # Relación con el dispositivo que genera el reporte
         on_delete=models.CASCADE,  # Si se borra el dispositivo, se borran sus reportes
-        related_name="reportes"  # Permite acceder a los reportes de un dispositivo con dispositivo.reportes
+        related_name="reportes",  # Permite acceder a los reportes de un dispositivo con dispositivo.reportes
+        db_index=False  # Lo cubre el índice compuesto (dispositivo, -fecha)
     )
     medicion_nivel = models.IntegerField()  # Nivel medido por el dispositivo (ej. nivel de líquido)
     estado_puerta = models.BooleanField()   # Estado de la puerta: True=Abierta, False=Cerrada
-    fecha = models.DateTimeField(auto_now_add=True)  # Fecha y hora de creación del reporte, automático
+    fecha = models.DateTimeField(default=timezone.now)  # Fecha y hora de la lectura (por defecto, la de creación)
+
+    class Meta:
+        indexes = [
+            # Reportes de un dispositivo del más reciente al más antiguo
+            models.Index(fields=["dispositivo", "-fecha"], name="reporte_disp_fecha_idx"),
+            # Rangos de fechas sobre todos los dispositivos
+            models.Index(fields=["fecha"], name="reporte_fecha_idx"),
+        ]
 
     def __str__(self):
         # Representación legible del reporte
@@ -27,13 +52,125 @@ class Alerta(models.Model):
     reporte = models.ForeignKey(
         Reporte,  # Relación con el reporte que genera la alerta
         on_delete=models.CASCADE,  # Si se borra el reporte, se borran sus alertas
-        related_name="alertas"  # Permite acceder a las alertas de un reporte con reporte.alertas
+        related_name="alertas",  # Permite acceder a las alertas de un reporte con reporte.alertas
+        db_constraint=False  # Reporte está particionado: su id no es único por sí solo en la base de datos
+    )
+    dispositivo = models.ForeignKey(
+        Dispositivo,  # Dispositivo de la alerta, copiado del reporte para no hacer joins
+        on_delete=models.CASCADE,  # Si se borra el dispositivo, se borran sus alertas
+        related_name="alertas"  # Permite acceder a las alertas de un dispositivo con dispositivo.alertas
     )
     mensaje = models.CharField(max_length=200)  # Mensaje descriptivo de la alerta
     is_activa = models.BooleanField()  # Indica si la alerta está activa o no
-    fecha_alerta = models.DateTimeField(auto_now_add=True)  # Fecha y hora de creación de la alerta
+    fecha_alerta = models.DateTimeField(default=timezone.now)  # Fecha y hora de la lectura que generó la alerta
     fecha_desactivada = models.DateTimeField(null=True, blank=True)  # Fecha en que se desactivó la alerta (opcional)
 
+    class Meta:
+        indexes = [
+            # Historial de alertas de un dispositivo, paginado por clave sobre (fecha_alerta, id)
+            models.Index(fields=["dispositivo", "-fecha_alerta", "-id"], name="alerta_disp_fecha_idx"),
+        ]
+        constraints = [
+            # Cada dispositivo tiene como máximo una alerta activa. El índice parcial
+            # también resuelve la búsqueda de la alerta activa de un dispositivo.
+            models.UniqueConstraint(
+                fields=["dispositivo"],
+                condition=models.Q(is_activa=True),
+                name="alerta_activa_unica_por_dispositivo",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Las alertas creadas desde el admin toman el dispositivo de su reporte
+        if self.dispositivo_id is None and self.reporte_id is not None:
+            self.dispositivo_id = self.reporte.dispositivo_id
+        super().save(*args, **kwargs)
+
+    def reporte_o_none(self):
+        """
+        Reporte de la alerta, o None si su partición ya se retiró: las alertas
+        activas se conservan al eliminar particiones vencidas (sin FK en la base de datos).
+        """
+        try:
+            return self.reporte
+        except Reporte.DoesNotExist:
+            return None
+
     def __str__(self):
         # Representación legible de la alerta
-        return f"Alerta: {self.mensaje} ({self.reporte})"
+        reporte = self.reporte_o_none()
+        return f"Alerta: {self.mensaje} ({reporte if reporte else f'reporte {self.reporte_id} retirado'})"
+
+# Modelo con el estado actual de cada dispositivo (último reporte y alerta activa).
+# Se actualiza en la ingesta para que el dashboard no recorra el historial de reportes.
+class EstadoDispositivo(models.Model):
+    dispositivo = models.OneToOneField(
+        Dispositivo,  # Dispositivo al que pertenece el estado
+        on_delete=models.CASCADE,  # Si se borra el dispositivo, se borra su estado
+        primary_key=True,  # Un único estado por dispositivo
+        related_name="estado"  # Permite acceder al estado con dispositivo.estado
+    )
+    ultimo_nivel = models.IntegerField()  # Nivel de la última lectura recibida
+    estado_puerta = models.BooleanField()  # Estado de puerta de la última lectura recibida
+    ultima_fecha = models.DateTimeField(db_index=True)  # Fecha de la última lectura recibida (guardada o no); índice para contar inactivos
+    # Última lectura guardada como reporte, para aplicar la banda muerta del dispositivo
+    nivel_persistido = models.IntegerField(null=True)
+    puerta_persistida = models.BooleanField(null=True)
+    fecha_persistida = models.DateTimeField(null=True)
+    # Momento del último cambio visible en el dashboard; versión para las respuestas condicionales (ETag)
+    actualizado = models.DateTimeField(default=timezone.now, db_index=True)
+    alerta_activa = models.ForeignKey(
+        Alerta,  # Alerta activa del dispositivo, si existe
+        on_delete=models.SET_NULL,  # Si se borra la alerta, el estado queda sin alerta
+        null=True, blank=True,
+        related_name="+"  # No se necesita la relación inversa
+    )
+
+    class Meta:
+        indexes = [
+            # Orden del dashboard por nivel de llenado
+            models.Index(models.F("ultimo_nivel").desc(nulls_last=True), "dispositivo", name="estado_nivel_idx"),
+            # Filtros del dashboard: con alerta activa y con la puerta abierta
+            models.Index(fields=["dispositivo"], condition=models.Q(alerta_activa__isnull=False), name="estado_con_alerta_idx"),
+            models.Index(fields=["dispositivo"], condition=models.Q(estado_puerta=False), name="estado_puerta_abierta_idx"),
+        ]
+
+    def __str__(self):
+        # Representación legible del estado
+        return f"Estado de {self.dispositivo} - Nivel: {self.ultimo_nivel}"
+
+# Campos comunes de los resúmenes por dispositivo y período (hora o día).
+# Se actualizan en la ingesta y se reconstruyen con el comando reconstruir_resumenes.
+class ResumenBase(models.Model):
+    dispositivo = models.ForeignKey(
+        Dispositivo,  # Dispositivo resumido
+        on_delete=models.CASCADE,  # Si se borra el dispositivo, se borran sus resúmenes
+        related_name="+"  # No se necesita la relación inversa
+    )
+    periodo = models.DateTimeField()  # Inicio del período, en la zona horaria del proyecto
+    lecturas = models.PositiveIntegerField(default=0)  # Cantidad de lecturas del período
+    suma_nivel = models.BigIntegerField(default=0)  # Suma de los niveles, para calcular el promedio
+    nivel_min = models.IntegerField(null=True)  # Nivel mínimo (vacío si no hubo lecturas)
+    nivel_max = models.IntegerField(null=True)  # Nivel máximo (vacío si no hubo lecturas)
+    lecturas_puerta_abierta = models.PositiveIntegerField(default=0)  # Lecturas con la puerta abierta
+    alertas_iniciadas = models.PositiveIntegerField(default=0)  # Alertas que empezaron en el período
+    alertas_cerradas = models.PositiveIntegerField(default=0)  # De esas alertas, las ya desactivadas
+    segundos_alerta = models.FloatField(default=0)  # Duración total de las alertas cerradas
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=["dispositivo", "periodo"], name="%(class)s_dispositivo_periodo"),
+        ]
+
+    @property
+    def nivel_promedio(self):
+        return self.suma_nivel / self.lecturas if self.lecturas else None
+
+# Resumen por dispositivo y hora
+class ResumenHorario(ResumenBase):
+    pass
+
+# Resumen por dispositivo y día
+class ResumenDiario(ResumenBase):
+    pass
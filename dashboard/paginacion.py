@@ -0,0 +1,122 @@
+"""
+Paginación por clave (keyset o seek) para historiales largos.
+
+En lugar de OFFSET, cada página continúa desde los valores de orden del
+último (o primer) elemento de la anterior, así que la página N cuesta lo mismo
+que la primera si hay un índice con las columnas de orden. Los elementos se
+ordenan de forma descendente por las columnas indicadas; la última debe ser
+única (por ejemplo el id) para que el orden sea total.
+
+Los cursores son opacos para el cliente: base64 de un JSON con la dirección
+("s" siguiente, "a" anterior) y los valores de orden.
+
+Como contar todas las filas cuesta lo mismo que recorrerlas, ``contar`` usa la
+estimación del planificador de PostgreSQL y solo cuenta exacto los resultados
+pequeños.
+"""
+import base64
+import json
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models import Q
+
+# Página de resultados y cursores para la siguiente y la anterior (None si no hay)
+Pagina = namedtuple("Pagina", ["elementos", "siguiente", "anterior"])
+
+
+def codificar_cursor(direccion, valores):
+    """Convierte la dirección y los valores de orden en un cursor opaco"""
+    datos = [direccion, [valor.isoformat() if hasattr(valor, "isoformat") else valor for valor in valores]]
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, modelo, campos):
+    """
+    Devuelve (dirección, valores) de un cursor, con los valores convertidos al
+    tipo de cada campo. Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        direccion, valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if direccion not in ("s", "a") or len(valores) != len(campos):
+            raise ValueError
+        return direccion, [modelo._meta.get_field(campo).to_python(valor) for campo, valor in zip(campos, valores)]
+    except Exception:
+        raise ValueError("Cursor de paginación no válido")
+
+
+def _condicion(campos, valores, operador):
+    """
+    (campo1, campo2, ...) <operador> (valor1, valor2, ...) en orden lexicográfico.
+    El primer campo se acota también por sí solo para que el índice limite el recorrido.
+    """
+    campo, valor = campos[0], valores[0]
+    if len(campos) == 1:
+        return Q(**{f"{campo}__{operador}": valor})
+    return Q(**{f"{campo}__{operador}e": valor}) & (
+        Q(**{f"{campo}__{operador}": valor}) | _condicion(campos[1:], valores[1:], operador)
+    )
+
+
+def paginar_keyset(consulta, campos, cursor=None, tamano=10):
+    """
+    Devuelve la Pagina de ``consulta`` ordenada de forma descendente por
+    ``campos``, a partir del cursor (None = primera página).
+    Lanza ValueError si el cursor no es válido.
+    """
+    direccion, valores = decodificar_cursor(cursor, consulta.model, campos) if cursor else ("s", None)
+    hacia_atras = direccion == "a"
+
+    if valores is not None:
+        consulta = consulta.filter(_condicion(campos, valores, "gt" if hacia_atras else "lt"))
+    orden = list(campos) if hacia_atras else [f"-{campo}" for campo in campos]
+
+    # Un elemento de más indica si hay otra página en la misma dirección
+    elementos = list(consulta.order_by(*orden)[:tamano + 1])
+    hay_mas = len(elementos) > tamano
+    elementos = elementos[:tamano]
+    if hacia_atras:
+        elementos.reverse()
+    if not elementos:
+        return Pagina(elementos, None, None)
+
+    def cursor_de(direccion, elemento):
+        return codificar_cursor(direccion, [
+            consulta.model._meta.get_field(campo).value_from_object(elemento) for campo in campos
+        ])
+
+    if hacia_atras:
+        siguiente = cursor_de("s", elementos[-1])
+        anterior = cursor_de("a", elementos[0]) if hay_mas else None
+    else:
+        siguiente = cursor_de("s", elementos[-1]) if hay_mas else None
+        anterior = cursor_de("a", elementos[0]) if valores is not None else None
+    return Pagina(elementos, siguiente, anterior)
+
+
+def conteo_estimado(consulta):
+    """
+    Filas que el planificador de PostgreSQL estima para ``consulta`` (EXPLAIN),
+    sin ejecutarla. None en otras bases de datos.
+    """
+    connection = connections[consulta.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, parametros = consulta.select_related(None).order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, parametros)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+def contar(consulta, limite_exacto=10000):
+    """
+    Devuelve (total, exacto). Si la estimación supera ``limite_exacto`` se
+    devuelve la estimación; si no, se cuenta con COUNT.
+    """
+    estimado = conteo_estimado(consulta)
+    if estimado is not None and estimado > limite_exacto:
+        return estimado, False
+    return consulta.count(), True
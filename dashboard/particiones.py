@@ -0,0 +1,78 @@
+"""
+Particiones mensuales de la tabla de reportes (PostgreSQL).
+
+La tabla dashboard_reporte está particionada por rango de ``fecha`` en
+particiones mensuales llamadas dashboard_reporte_pAAAA_MM, más una partición
+por defecto para lecturas fuera de rango. Los límites de cada mes se toman en
+la zona horaria del proyecto, igual que los filtros por fecha de los reportes.
+"""
+import re
+from datetime import datetime
+
+from django.utils import timezone
+
+TABLA = "dashboard_reporte"
+PARTICION_DEFECTO = f"{TABLA}_default"
+PATRON_PARTICION = re.compile(rf"^{TABLA}_p(\d{{4}})_(\d{{2}})$")
+
+
+def inicio_mes(fecha):
+    """Primer instante del mes de la fecha, en la zona horaria del proyecto"""
+    local = timezone.localtime(fecha)
+    return timezone.make_aware(datetime(local.year, local.month, 1))
+
+
+def sumar_meses(mes, cantidad):
+    """Primer instante del mes desplazado ``cantidad`` meses"""
+    indice = mes.year * 12 + mes.month - 1 + cantidad
+    return timezone.make_aware(datetime(indice // 12, indice % 12 + 1, 1))
+
+
+def nombre_particion(mes):
+    return f"{TABLA}_p{mes.year:04d}_{mes.month:02d}"
+
+
+def listar_particiones(cursor):
+    """Devuelve [(mes, nombre)] de las particiones mensuales, ordenadas"""
+    cursor.execute(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+        """,
+        [TABLA],
+    )
+    particiones = []
+    for (nombre,) in cursor.fetchall():
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            mes = timezone.make_aware(datetime(int(coincidencia[1]), int(coincidencia[2]), 1))
+            particiones.append((mes, nombre))
+    return sorted(particiones)
+
+
+def crear_particion(cursor, mes):
+    """
+    Crea la partición del mes. Si la partición por defecto ya tiene lecturas
+    de ese mes, se mueven a la nueva partición antes de adjuntarla.
+    """
+    nombre = nombre_particion(mes)
+    desde, hasta = mes.isoformat(), sumar_meses(mes, 1).isoformat()
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFECTO} WHERE fecha >= %s AND fecha < %s)",
+        [desde, hasta],
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(
+            f"CREATE TABLE {nombre} PARTITION OF {TABLA} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+        )
+        return
+
+    cursor.execute(f"CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH movidas AS (DELETE FROM {PARTICION_DEFECTO} WHERE fecha >= %s AND fecha < %s RETURNING *) "
+        f"INSERT INTO {nombre} SELECT * FROM movidas",
+        [desde, hasta],
+    )
+    cursor.execute(f"ALTER TABLE {TABLA} ATTACH PARTITION {nombre} FOR VALUES FROM ('{desde}') TO ('{hasta}')")
@@ -0,0 +1,85 @@
+"""
+Registro en memoria de los dispositivos (id -> nombre y configuración).
+
+Evita consultar la tabla Dispositivo en cada petición de ingesta o de
+reportes. Se carga completo en el primer uso de cada proceso y se invalida
+con las señales de guardado y borrado de Dispositivo (ver signals.py),
+incluidos los cambios hechos desde el admin. Como otros procesos no reciben
+esas señales, el registro se recarga además cada REGISTRO_DISPOSITIVOS_TTL
+segundos.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+# Datos de un dispositivo guardados en el registro
+InfoDispositivo = namedtuple("InfoDispositivo", ["id", "device_name", "banda_muerta"])
+
+# Segundos mínimos entre recargas provocadas por ids desconocidos
+ESPERA_RECARGA_FALLO = 5
+
+
+class RegistroDispositivos:
+    """Registro de dispositivos compartido por todos los hilos del proceso"""
+
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._dispositivos = None  # dict id -> InfoDispositivo, None si no está cargado
+        self._cargado_en = 0.0
+
+    def _cargar(self):
+        """Lee todos los dispositivos de la base de datos"""
+        from .models import Dispositivo  # Import diferido: el registro se crea antes que los modelos
+
+        dispositivos = {
+            id_device: InfoDispositivo(id_device, nombre, banda_muerta)
+            for id_device, nombre, banda_muerta in Dispositivo.objects.order_by("id").values_list(
+                "id", "device_name", "banda_muerta"
+            )
+        }
+        self._dispositivos = dispositivos
+        self._cargado_en = time.monotonic()
+        return dispositivos
+
+    def _datos(self):
+        """Devuelve el registro vigente, recargándolo si no existe o expiró"""
+        dispositivos = self._dispositivos
+        if dispositivos is None or time.monotonic() - self._cargado_en > self._ttl:
+            with self._lock:
+                dispositivos = self._dispositivos
+                if dispositivos is None or time.monotonic() - self._cargado_en > self._ttl:
+                    dispositivos = self._cargar()
+        return dispositivos
+
+    def calentar(self):
+        """Carga el registro si aún no está cargado"""
+        self._datos()
+
+    def invalidar(self):
+        """Descarta el registro; la siguiente consulta lo recarga"""
+        with self._lock:
+            self._dispositivos = None
+
+    def obtener(self, id_device):
+        """Devuelve el InfoDispositivo del id o None si no existe"""
+        info = self._datos().get(id_device)
+        if info is None and time.monotonic() - self._cargado_en > ESPERA_RECARGA_FALLO:
+            # Puede ser un dispositivo creado en otro proceso: recargar una vez
+            with self._lock:
+                info = self._cargar().get(id_device)
+        return info
+
+    def existe(self, id_device):
+        """Indica si el dispositivo existe"""
+        return self.obtener(id_device) is not None
+
+    def todos(self):
+        """Lista de todos los dispositivos ordenados por id"""
+        return list(self._datos().values())
+
+
+# Instancia única usada por toda la aplicación
+registro = RegistroDispositivos(getattr(settings, "REGISTRO_DISPOSITIVOS_TTL", 300))
@@ -0,0 +1,152 @@
+"""
+Resumen de toda la flota para /dashboard/summary/ (wallboards y monitores).
+
+Los contadores viven en el cache "fragmentos" y la ingesta los ajusta con
+incrementos al confirmar cada lote, a partir del estado anterior y nuevo de
+cada dispositivo. Si falta algún contador, o al vencer RESUMEN_FLOTA_TTL, se
+reconstruyen desde EstadoDispositivo; nunca se recorre Reporte. Con el cache
+en memoria local cada proceso tiene sus propios contadores y los cambios de
+otros procesos se ven al reconstruirse; con Redis son compartidos.
+
+Los dispositivos inactivos dependen de la hora, así que se cuentan en cada
+consulta con el índice de EstadoDispositivo.ultima_fecha.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Dispositivo, EstadoDispositivo
+
+# Prefijo de las claves de los contadores en el cache
+PREFIJO = "flota:"
+
+# Rangos de nivel de la distribución: 0-9, 10-19, ..., 90 o más
+RANGOS_NIVEL = 10
+
+# Contadores mantenidos de forma incremental
+CONTADORES = (
+    "dispositivos", "sin_lecturas", "sobre_umbral", "puertas_abiertas", "alertas_activas",
+) + tuple(f"nivel_{rango}" for rango in range(RANGOS_NIVEL))
+
+# Segundos tras los que los contadores se reconstruyen desde la base de datos
+TTL = getattr(settings, "RESUMEN_FLOTA_TTL", 300)
+
+# Segundos sin lecturas a partir de los que un dispositivo se considera inactivo
+INACTIVO = timedelta(seconds=getattr(settings, "RESUMEN_FLOTA_INACTIVO", 3600))
+
+
+def _cache():
+    return caches["fragmentos"]
+
+
+def _rango(nivel):
+    return min(max(nivel // 10, 0), RANGOS_NIVEL - 1)
+
+
+def _aporte(estado):
+    """Contadores a los que suma un dispositivo con estado (nivel, puerta, alerta) o None"""
+    from .ingesta import UMBRAL_ALERTA  # Import diferido: ingesta importa este módulo
+
+    if estado is None:
+        return {"sin_lecturas": 1}
+    nivel, puerta, alerta = estado
+    return {
+        "sobre_umbral": int(nivel >= UMBRAL_ALERTA),
+        "puertas_abiertas": int(not puerta),  # estado_puerta False = puerta abierta
+        "alertas_activas": int(alerta),
+        f"nivel_{_rango(nivel)}": 1,
+    }
+
+
+def registrar_cambios(anteriores, nuevos):
+    """
+    Ajusta los contadores cuando se confirme la transacción actual.
+    ``anteriores`` y ``nuevos`` van de id de dispositivo a (nivel, puerta,
+    alerta activa) o None si el dispositivo no tenía lecturas.
+    """
+    cambios = {}
+    for id_device, estado in nuevos.items():
+        for clave, valor in _aporte(estado).items():
+            cambios[clave] = cambios.get(clave, 0) + valor
+        for clave, valor in _aporte(anteriores.get(id_device)).items():
+            cambios[clave] = cambios.get(clave, 0) - valor
+    cambios = {clave: valor for clave, valor in cambios.items() if valor}
+    if cambios:
+        transaction.on_commit(lambda: _aplicar(cambios))
+
+
+def _aplicar(cambios):
+    cache = _cache()
+    try:
+        for clave, valor in cambios.items():
+            cache.incr(PREFIJO + clave, valor)
+    except ValueError:
+        # Contadores vencidos o incompletos: se reconstruyen en la siguiente consulta
+        invalidar()
+
+
+def invalidar():
+    """Descarta los contadores (por ejemplo tras editar dispositivos o alertas)"""
+    _cache().delete_many([PREFIJO + clave for clave in CONTADORES])
+
+
+def _reconstruir():
+    """Calcula los contadores desde Dispositivo y EstadoDispositivo y los guarda"""
+    from .ingesta import UMBRAL_ALERTA
+
+    contadores = Dispositivo.objects.aggregate(
+        dispositivos=Count("id"),
+        sin_lecturas=Count("id", filter=Q(estado__isnull=True)),
+    )
+    rangos = {
+        f"nivel_{rango}": Count("pk", filter=Q(
+            **({"ultimo_nivel__gte": rango * 10} if rango else {}),
+            **({"ultimo_nivel__lt": (rango + 1) * 10} if rango < RANGOS_NIVEL - 1 else {}),
+        ))
+        for rango in range(RANGOS_NIVEL)
+    }
+    contadores.update(EstadoDispositivo.objects.aggregate(
+        sobre_umbral=Count("pk", filter=Q(ultimo_nivel__gte=UMBRAL_ALERTA)),
+        puertas_abiertas=Count("pk", filter=Q(estado_puerta=False)),
+        alertas_activas=Count("pk", filter=Q(alerta_activa__isnull=False)),
+        **rangos,
+    ))
+    _cache().set_many({PREFIJO + clave: valor for clave, valor in contadores.items()}, TTL)
+    return contadores
+
+
+def obtener():
+    """Devuelve el resumen de la flota como diccionario listo para JSON"""
+    from .ingesta import UMBRAL_ALERTA
+
+    guardados = _cache().get_many([PREFIJO + clave for clave in CONTADORES])
+    if len(guardados) == len(CONTADORES):
+        contadores = {clave: guardados[PREFIJO + clave] for clave in CONTADORES}
+    else:
+        contadores = _reconstruir()
+
+    ahora = timezone.now()
+    inactivos = EstadoDispositivo.objects.filter(ultima_fecha__lt=ahora - INACTIVO).count()
+    return {
+        "dispositivos": contadores["dispositivos"],
+        "umbral": UMBRAL_ALERTA,
+        "sobre_umbral": contadores["sobre_umbral"],
+        "puertas_abiertas": contadores["puertas_abiertas"],
+        "alertas_activas": contadores["alertas_activas"],
+        "sin_lecturas": contadores["sin_lecturas"],
+        # Sin lecturas en RESUMEN_FLOTA_INACTIVO segundos, o sin ninguna lectura
+        "inactivos": inactivos + contadores["sin_lecturas"],
+        "distribucion_nivel": [
+            {
+                "desde": rango * 10,
+                "hasta": rango * 10 + 9 if rango < RANGOS_NIVEL - 1 else None,
+                "dispositivos": contadores[f"nivel_{rango}"],
+            }
+            for rango in range(RANGOS_NIVEL)
+        ],
+        "generado": ahora.isoformat(),
+    }
@@ -0,0 +1,174 @@
+"""
+Resúmenes por hora y por día de las lecturas de cada dispositivo.
+
+La ingesta los mantiene de forma incremental con un solo INSERT ... ON
+CONFLICT por tabla y lote; el comando reconstruir_resumenes los recalcula
+desde los reportes y alertas. Los períodos se cortan en la zona horaria del
+proyecto, igual que los filtros por fecha de los reportes. Las alertas se
+cuentan en el período en que empezaron, también al cerrarse.
+
+La ingesta suma todas las lecturas recibidas, también las que la banda muerta
+no guarda como reporte; al reconstruir solo se cuentan los reportes guardados,
+por eso reconstruir_resumenes omite por defecto los dispositivos con banda
+muerta.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Alerta, Reporte, ResumenDiario, ResumenHorario
+
+# Columnas acumulables, en el orden usado por las consultas
+COLUMNAS = (
+    "lecturas", "suma_nivel", "nivel_min", "nivel_max", "lecturas_puerta_abierta",
+    "alertas_iniciadas", "alertas_cerradas", "segundos_alerta",
+)
+
+# Cómo se combina cada columna con el valor ya guardado
+COMBINAR = {
+    "nivel_min": "LEAST(t.nivel_min, EXCLUDED.nivel_min)",
+    "nivel_max": "GREATEST(t.nivel_max, EXCLUDED.nivel_max)",
+}
+
+
+def inicio_hora(fecha):
+    local = timezone.localtime(fecha)
+    return timezone.make_aware(datetime(local.year, local.month, local.day, local.hour))
+
+
+def inicio_dia(fecha):
+    local = timezone.localtime(fecha)
+    return inicio_fecha(local.date())
+
+
+def inicio_fecha(dia):
+    """Primer instante de un día (date) en la zona horaria del proyecto"""
+    return timezone.make_aware(datetime(dia.year, dia.month, dia.day))
+
+
+# Tabla de resumen y función que calcula el período de una fecha
+GRANULARIDADES = (
+    (ResumenHorario, inicio_hora, "hour"),
+    (ResumenDiario, inicio_dia, "day"),
+)
+
+
+def _vacio():
+    return [0, 0, None, None, 0, 0, 0, 0.0]
+
+
+def acumular(reportes, alertas_iniciadas, alertas_cerradas):
+    """Suma a los resúmenes un lote de reportes y de alertas iniciadas o cerradas"""
+    for modelo, periodo_de, _ in GRANULARIDADES:
+        filas = defaultdict(_vacio)
+        for reporte in reportes:
+            fila = filas[(reporte.dispositivo_id, periodo_de(reporte.fecha))]
+            fila[0] += 1
+            fila[1] += reporte.medicion_nivel
+            fila[2] = reporte.medicion_nivel if fila[2] is None else min(fila[2], reporte.medicion_nivel)
+            fila[3] = reporte.medicion_nivel if fila[3] is None else max(fila[3], reporte.medicion_nivel)
+            fila[4] += not reporte.estado_puerta  # estado_puerta False = puerta abierta
+        for alerta in alertas_iniciadas:
+            filas[(alerta.dispositivo_id, periodo_de(alerta.fecha_alerta))][5] += 1
+        for alerta in alertas_cerradas:
+            fila = filas[(alerta.dispositivo_id, periodo_de(alerta.fecha_alerta))]
+            fila[6] += 1
+            fila[7] += (alerta.fecha_desactivada - alerta.fecha_alerta).total_seconds()
+        if filas:
+            _guardar(modelo, filas)
+
+
+def _guardar(modelo, filas):
+    """Inserta o suma las filas de resumen con un solo INSERT ... ON CONFLICT"""
+    columnas = ("dispositivo_id", "periodo") + COLUMNAS
+    valores = ", ".join(["(" + ", ".join(["%s"] * len(columnas)) + ")"] * len(filas))
+    actualizar = ", ".join(
+        f"{c} = {COMBINAR.get(c, f't.{c} + EXCLUDED.{c}')}" for c in COLUMNAS
+    )
+    parametros = []
+    for (id_dispositivo, periodo), fila in sorted(filas.items()):
+        parametros.extend([id_dispositivo, periodo, *fila])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {modelo._meta.db_table} AS t ({', '.join(columnas)}) VALUES {valores} "
+            f"ON CONFLICT (dispositivo_id, periodo) DO UPDATE SET {actualizar}",
+            parametros,
+        )
+
+
+def reconstruir(desde, hasta, dispositivos=None):
+    """
+    Recalcula los resúmenes de los días [desde, hasta) a partir de los
+    reportes y alertas. ``desde`` y ``hasta`` son inicios de día;
+    ``dispositivos`` limita el cálculo a esos ids (None = todos).
+
+    Una ingesta concurrente puede volver a crear una fila después del DELETE:
+    el INSERT la reemplaza con el valor recalculado, que ya incluye los
+    reportes confirmados antes de la consulta, y los lotes posteriores esperan
+    a esta transacción y se suman encima.
+    """
+    zona = settings.TIME_ZONE
+    reemplazar = ", ".join(f"{c} = EXCLUDED.{c}" for c in COLUMNAS)
+    parametros = {"zona": zona, "desde": desde, "hasta": hasta, "dispositivos": list(dispositivos or [])}
+    de_dispositivos = "" if dispositivos is None else "AND dispositivo_id = ANY(%(dispositivos)s)"
+    for modelo, _, unidad in GRANULARIDADES:
+        borrar = modelo.objects.filter(periodo__gte=desde, periodo__lt=hasta)
+        if dispositivos is not None:
+            borrar = borrar.filter(dispositivo__in=dispositivos)
+        borrar.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {modelo._meta.db_table} (dispositivo_id, periodo, {', '.join(COLUMNAS)})
+                SELECT dispositivo_id, periodo, sum(lecturas), sum(suma_nivel), min(nivel_min), max(nivel_max),
+                       sum(lecturas_puerta_abierta), sum(alertas_iniciadas), sum(alertas_cerradas), sum(segundos_alerta)
+                FROM (
+                    SELECT dispositivo_id,
+                           date_trunc('{unidad}', fecha AT TIME ZONE %(zona)s) AT TIME ZONE %(zona)s AS periodo,
+                           count(*) AS lecturas, sum(medicion_nivel) AS suma_nivel,
+                           min(medicion_nivel) AS nivel_min, max(medicion_nivel) AS nivel_max,
+                           count(*) FILTER (WHERE NOT estado_puerta) AS lecturas_puerta_abierta,
+                           0 AS alertas_iniciadas, 0 AS alertas_cerradas, 0 AS segundos_alerta
+                    FROM {Reporte._meta.db_table}
+                    WHERE fecha >= %(desde)s AND fecha < %(hasta)s {de_dispositivos}
+                    GROUP BY 1, 2
+                    UNION ALL
+                    SELECT dispositivo_id,
+                           date_trunc('{unidad}', fecha_alerta AT TIME ZONE %(zona)s) AT TIME ZONE %(zona)s,
+                           0, 0, NULL, NULL, 0,
+                           count(*), count(fecha_desactivada),
+                           coalesce(sum(extract(epoch FROM fecha_desactivada - fecha_alerta)), 0)
+                    FROM {Alerta._meta.db_table}
+                    WHERE fecha_alerta >= %(desde)s AND fecha_alerta < %(hasta)s {de_dispositivos}
+                    GROUP BY 1, 2
+                ) AS parciales
+                GROUP BY dispositivo_id, periodo
+                ON CONFLICT (dispositivo_id, periodo) DO UPDATE SET {reemplazar}
+                """,
+                parametros,
+            )
+
+
+def totales(dispositivos=None, desde=None, hasta=None):
+    """
+    Totales de los resúmenes diarios para los dispositivos (None = todos) entre
+    los inicios de día ``desde`` y ``hasta`` (None = sin límite).
+    """
+    consulta = ResumenDiario.objects.all()
+    if dispositivos is not None:
+        consulta = consulta.filter(dispositivo__in=dispositivos)
+    if desde is not None:
+        consulta = consulta.filter(periodo__gte=desde)
+    if hasta is not None:
+        consulta = consulta.filter(periodo__lt=hasta)
+    suma = consulta.aggregate(
+        lecturas=Sum("lecturas"), suma_nivel=Sum("suma_nivel"),
+        lecturas_puerta_abierta=Sum("lecturas_puerta_abierta"),
+        alertas_iniciadas=Sum("alertas_iniciadas"), alertas_cerradas=Sum("alertas_cerradas"),
+        segundos_alerta=Sum("segundos_alerta"),
+    )
+    return {clave: valor or 0 for clave, valor in suma.items()}
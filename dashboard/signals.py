@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete  # Señales de guardado y borrado de modelos
+from django.db.models import Subquery  # Para recalcular la alerta activa en el mismo UPDATE
+from django.dispatch import receiver  # Decorador para conectar funciones a señales
+from django.utils import timezone  # Para marcar la hora del cambio
+
+from .models import Dispositivo, Alerta, EstadoDispositivo
+from .registro import registro
+from .historial_reciente import historial_reciente
+from . import resumen_flota
+
+# Invalida el registro de dispositivos cuando se crea, edita o borra uno (incluye el admin)
+@receiver(post_save, sender=Dispositivo)
+@receiver(post_delete, sender=Dispositivo)
+def invalidar_registro(sender, **kwargs):
+    registro.invalidar()
+    resumen_flota.invalidar()  # El resumen de la flota se reconstruye con la siguiente consulta
+
+# Olvida las últimas lecturas en memoria de un dispositivo borrado
+@receiver(post_delete, sender=Dispositivo)
+def descartar_historial(sender, instance, **kwargs):
+    historial_reciente.descartar(instance.pk)
+
+# Cambia la versión del estado cuando se edita un dispositivo o una alerta fuera
+# de la ingesta (por ejemplo desde el admin), para que los parciales no respondan 304
+@receiver(post_save, sender=Dispositivo)
+def marcar_dispositivo(sender, instance, **kwargs):
+    EstadoDispositivo.objects.filter(dispositivo_id=instance.pk).update(actualizado=timezone.now())
+
+# Al editar o borrar una alerta también se recalcula la alerta activa del
+# estado, que usan los filtros del dashboard, la API y el resumen de la flota
+@receiver(post_save, sender=Alerta)
+@receiver(post_delete, sender=Alerta)
+def marcar_alerta(sender, instance, **kwargs):
+    activa = Alerta.objects.filter(dispositivo_id=instance.dispositivo_id, is_activa=True).values("pk")[:1]
+    EstadoDispositivo.objects.filter(dispositivo_id=instance.dispositivo_id).update(
+        alerta_activa=Subquery(activa),
+        actualizado=timezone.now(),
+    )
+    resumen_flota.invalidar()
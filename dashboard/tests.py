@@ -1,3 +1,585 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from contenedor.views import ALERTAS_POR_PAGINA, obtener_dispositivo_con_estado
+from reporte.views import REPORTES_POR_PAGINA, consulta_reportes, obtener_alerta
+from .buffer_ingesta import BufferIngesta, _serializar
+from .eventos import _decodificar
+from .historial_reciente import Anillo, HistorialReciente
+from .ingesta import (
+    Lectura, PERSISTENCIA_MAXIMA, guardar_lecturas, leer_lineas, parsear_linea, procesar_lote,
+)
+from .models import Dispositivo, EstadoDispositivo, Reporte, Alerta, ResumenDiario
+from .paginacion import codificar_cursor, decodificar_cursor, paginar_keyset
+from . import resumen_flota
+from .registro import registro
+from .views import DISPOSITIVOS_POR_PAGINA, filtrar_dispositivos
+
+# Tablas que crecen con el historial y nunca deben recorrerse completas.
+# Los prefijos incluyen las particiones mensuales de dashboard_reporte.
+TABLAS_HISTORIAL = ("dashboard_reporte", "dashboard_alerta")
+
+
+def nodos(plan):
+    """Recorre todos los nodos de un plan de EXPLAIN en formato JSON"""
+    yield plan
+    for hijo in plan.get("Plans", []):
+        yield from nodos(hijo)
+
+
+@skipUnless(connection.vendor == "postgresql", "Los planes se verifican con EXPLAIN de PostgreSQL")
+class PlanesDeConsultaTests(TestCase):
+    """
+    Verifica que las consultas que ejecutan el dashboard, el detalle de
+    contenedor y los reportes usen índices: ninguna debe recorrer
+    secuencialmente las tablas de historial ni ordenar en memoria. Se explican
+    las consultas que ejecutan las funciones de las vistas, no copias de ellas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        inicio = timezone.now() - timedelta(days=30)
+        cls.dia = timezone.localdate(inicio) + timedelta(days=1)  # Un día completo con lecturas
+        cls.dispositivos = Dispositivo.objects.bulk_create(
+            [Dispositivo(device_name=f"Contenedor {i}") for i in range(20)]
+        )
+        # Dispositivos que nunca reportaron, para que el planificador prefiera
+        # los índices de búsqueda y orden por nombre a recorrer la tabla
+        Dispositivo.objects.bulk_create([Dispositivo(device_name=f"Equipo {i:04d}") for i in range(2000)])
+        registro.invalidar()  # bulk_create no envía señales
+        for dispositivo in cls.dispositivos:
+            guardar_lecturas([
+                Lectura(dispositivo.id, (i * 7) % 100, i % 3 == 0, inicio + timedelta(minutes=10 * i))
+                for i in range(500)
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "ANALYZE dashboard_dispositivo, dashboard_reporte, dashboard_alerta, dashboard_estadodispositivo"
+            )
+
+    def setUp(self):
+        registro.invalidar()
+        # Penaliza los recorridos secuenciales y los ordenamientos: si aun así
+        # aparecen en el plan es porque no hay un índice que los evite
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+
+    def assertUsaIndices(self, funcion, indice=None, ordenar=False):
+        """
+        Ejecuta ``funcion`` y verifica el plan de cada SELECT que hizo. Con
+        ``indice``, además, que alguno lo use; con ``ordenar`` se permite
+        ordenar en memoria (por ejemplo, los pocos resultados de una búsqueda).
+        """
+        with CaptureQueriesContext(connection) as capturadas:
+            funcion()
+        consultas = [c["sql"] for c in capturadas.captured_queries if c["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertTrue(consultas, "La función no ejecutó consultas")
+        indices = set()
+        for sql in consultas:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            for nodo in nodos(plan[0]["Plan"]):
+                indices.add(nodo.get("Index Name"))
+                self.assertFalse(
+                    nodo["Node Type"] == "Seq Scan" and nodo.get("Relation Name", "").startswith(TABLAS_HISTORIAL),
+                    f"Recorrido secuencial de {nodo.get('Relation Name')} en:\n{sql}",
+                )
+                # Un "Incremental Sort" sobre un índice solo ordena los empates (por id)
+                if not ordenar:
+                    self.assertNotEqual(nodo["Node Type"], "Sort", f"Ordenamiento en memoria en:\n{sql}")
+        if indice:
+            self.assertIn(indice, indices, f"No se usó {indice} en:\n" + "\n".join(consultas))
+
+    def assertPaginasUsanIndices(self, consulta, campos, tamano):
+        """Verifica la primera página y la siguiente de una paginación por clave"""
+        pagina = paginar_keyset(consulta, campos, None, tamano)
+        self.assertIsNotNone(pagina.siguiente)
+        self.assertUsaIndices(lambda: paginar_keyset(consulta, campos, None, tamano))
+        self.assertUsaIndices(lambda: paginar_keyset(consulta, campos, pagina.siguiente, tamano))
+
+    def test_dashboard(self):
+        for parametros, indice in (
+            ({}, None),
+            ({"alerta": "1"}, None),
+            ({"puerta_abierta": "1"}, None),
+            ({"orden": "nombre"}, "dispositivo_nombre_idx"),
+            ({"orden": "nivel"}, "estado_nivel_idx"),
+        ):
+            with self.subTest(parametros=parametros):
+                self.assertUsaIndices(
+                    lambda: list(filtrar_dispositivos(parametros)[:DISPOSITIVOS_POR_PAGINA]), indice
+                )
+
+    def test_busqueda_por_nombre(self):
+        # Los pocos resultados de la búsqueda se ordenan en memoria: permitir el Sort
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_sort = on")
+        for orden in ("id", "nombre"):
+            with self.subTest(orden=orden):
+                self.assertUsaIndices(
+                    lambda: list(filtrar_dispositivos({"q": "quipo 123", "orden": orden})[:DISPOSITIVOS_POR_PAGINA]),
+                    "dispositivo_nombre_trgm",
+                    ordenar=True,
+                )
+
+    def test_detalle_contenedor(self):
+        dispositivo = self.dispositivos[0]
+        self.assertUsaIndices(lambda: obtener_dispositivo_con_estado(dispositivo.id))
+        self.assertPaginasUsanIndices(
+            Alerta.objects.filter(dispositivo_id=dispositivo.id), ("fecha_alerta", "id"), ALERTAS_POR_PAGINA
+        )
+
+    def test_reportes_de_un_dispositivo(self):
+        dispositivo = self.dispositivos[0]
+        self.assertPaginasUsanIndices(consulta_reportes(dispositivo.id), ("fecha", "id"), REPORTES_POR_PAGINA)
+        self.assertPaginasUsanIndices(
+            consulta_reportes(dispositivo.id, "en", self.dia), ("fecha", "id"), REPORTES_POR_PAGINA
+        )
+        self.assertPaginasUsanIndices(
+            obtener_alerta(consulta_reportes(dispositivo.id), "all", "todas"), ("fecha", "id"), REPORTES_POR_PAGINA
+        )
+
+    def test_reportes_de_todos_los_dispositivos(self):
+        self.assertPaginasUsanIndices(consulta_reportes(), ("fecha", "id"), REPORTES_POR_PAGINA)
+        self.assertPaginasUsanIndices(consulta_reportes(None, "en", self.dia), ("fecha", "id"), REPORTES_POR_PAGINA)
+        self.assertPaginasUsanIndices(
+            obtener_alerta(consulta_reportes(), "all", "activas"), ("fecha", "id"), REPORTES_POR_PAGINA
+        )
+
+
+class IngestaLoteTests(TestCase):
+    """Errores por lectura en un lote: las válidas se guardan igual"""
+
+    def setUp(self):
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+
+    def test_errores_por_lectura(self):
+        resultados = procesar_lote([
+            {"id_device": self.dispositivo.id, "nivel": 40, "puerta": True},
+            "no es un objeto",
+            {"id_device": self.dispositivo.id, "nivel": float("nan"), "puerta": True},
+            {"id_device": self.dispositivo.id, "nivel": 150, "puerta": 0},
+            {"id_device": self.dispositivo.id, "nivel": 10, "puerta": "abierta"},
+            {"id_device": True, "nivel": 10, "puerta": 1},
+            {"id_device": self.dispositivo.id + 1000, "nivel": 10, "puerta": 1},
+            {"id_device": self.dispositivo.id, "nivel": 55.5, "puerta": 0},
+        ])
+        self.assertEqual(
+            [resultado["status"] for resultado in resultados],
+            ["ok", "error", "error", "error", "error", "error", "error", "ok"],
+        )
+        self.assertIn("no existe", resultados[6]["message"])
+        guardados = Reporte.objects.filter(dispositivo=self.dispositivo).order_by("id")
+        self.assertEqual([r.id for r in guardados], [resultados[0]["reporte_id"], resultados[7]["reporte_id"]])
+        self.assertEqual(guardados[1].medicion_nivel, 55)
+
+
+class BandaMuertaTests(TestCase):
+    """Reportes guardados por la banda muerta y estado actual del dispositivo"""
+
+    def setUp(self):
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor", banda_muerta=5)
+        self.inicio = timezone.now() - timedelta(days=1)
+
+    def lectura(self, nivel, minutos, puerta=True):
+        return Lectura(self.dispositivo.id, nivel, puerta, self.inicio + timedelta(minutes=minutos))
+
+    def estado(self):
+        return EstadoDispositivo.objects.get(dispositivo=self.dispositivo)
+
+    def test_solo_guarda_los_cambios(self):
+        reportes = guardar_lecturas([
+            self.lectura(50, 0),
+            self.lectura(53, 1),  # Dentro de la banda
+            self.lectura(56, 2),  # Fuera de la banda respecto del último guardado (50)
+            self.lectura(56, 3, puerta=False),  # Cambio de puerta
+            self.lectura(58, 4),  # Dentro de la banda, pero la puerta vuelve a cambiar
+            self.lectura(60, 5),  # Dentro de la banda
+        ])
+        self.assertEqual([r.id is not None for r in reportes], [True, False, True, True, True, False])
+        self.assertEqual(Reporte.objects.filter(dispositivo=self.dispositivo).count(), 4)
+        # El estado refleja la última lectura, aunque no se haya guardado
+        self.assertEqual(self.estado().ultimo_nivel, 60)
+        self.assertEqual(self.estado().nivel_persistido, 58)
+
+    def test_cruce_del_umbral_y_persistencia_maxima(self):
+        reportes = guardar_lecturas([
+            self.lectura(72, 0),
+            self.lectura(76, 1),  # Dentro de la banda, pero cruza el umbral de alerta
+            self.lectura(77, 2),
+            self.lectura(77, 1 + PERSISTENCIA_MAXIMA // timedelta(minutes=1)),  # Sin guardar hace demasiado
+        ])
+        self.assertEqual([r.id is not None for r in reportes], [True, True, False, True])
+        alerta = Alerta.objects.get(dispositivo=self.dispositivo)
+        self.assertEqual(alerta.reporte_id, reportes[1].id)
+        self.assertEqual(self.estado().alerta_activa_id, alerta.pk)
+
+    def test_lecturas_atrasadas_no_retroceden_el_estado(self):
+        guardar_lecturas([self.lectura(60, 10)])
+        guardar_lecturas([self.lectura(20, 0)])
+        estado = self.estado()
+        self.assertEqual((estado.ultimo_nivel, estado.nivel_persistido), (60, 60))
+        self.assertEqual(Reporte.objects.filter(dispositivo=self.dispositivo).count(), 2)
+
+    def test_reconstruir_omite_los_dispositivos_con_banda_muerta(self):
+        sin_banda = Dispositivo.objects.create(device_name="Sin banda")
+        guardar_lecturas([self.lectura(50, 0), self.lectura(51, 1), self.lectura(52, 2)])
+        guardar_lecturas([Lectura(sin_banda.id, 30, True, self.inicio)])
+        # Un resumen desactualizado del dispositivo sin banda muerta se corrige
+        ResumenDiario.objects.filter(dispositivo=sin_banda).update(lecturas=99)
+
+        salida = io.StringIO()
+        call_command("reconstruir_resumenes", stdout=salida)
+        self.assertIn("Contenedor", salida.getvalue())
+        lecturas = dict(ResumenDiario.objects.values_list("dispositivo").annotate(total=Sum("lecturas")))
+        # Conserva las lecturas que la banda muerta no guardó
+        self.assertEqual(lecturas, {self.dispositivo.id: 3, sin_banda.id: 1})
+
+        call_command("reconstruir_resumenes", incluir_banda_muerta=True, stdout=salida)
+        lecturas = dict(ResumenDiario.objects.values_list("dispositivo").annotate(total=Sum("lecturas")))
+        self.assertEqual(lecturas, {self.dispositivo.id: 1, sin_banda.id: 1})
+
+
+class AlertasAtrasadasTests(TestCase):
+    """Las lecturas atrasadas se guardan pero no abren ni cierran alertas"""
+
+    def setUp(self):
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        self.inicio = timezone.now() - timedelta(days=1)
+
+    def lectura(self, nivel, minutos):
+        return Lectura(self.dispositivo.id, nivel, True, self.inicio + timedelta(minutes=minutos))
+
+    def test_lectura_baja_atrasada_no_cierra_la_alerta(self):
+        guardar_lecturas([self.lectura(80, 10)])
+        guardar_lecturas([self.lectura(20, 0)])
+        alerta = Alerta.objects.get(dispositivo=self.dispositivo)
+        self.assertTrue(alerta.is_activa)
+        self.assertIsNone(alerta.fecha_desactivada)
+        self.assertEqual(EstadoDispositivo.objects.get(dispositivo=self.dispositivo).alerta_activa_id, alerta.pk)
+        self.assertEqual(Reporte.objects.filter(dispositivo=self.dispositivo).count(), 2)
+
+    def test_lectura_alta_atrasada_no_abre_alerta(self):
+        guardar_lecturas([self.lectura(20, 10)])
+        guardar_lecturas([self.lectura(80, 0)])
+        self.assertFalse(Alerta.objects.filter(dispositivo=self.dispositivo).exists())
+        estado = EstadoDispositivo.objects.get(dispositivo=self.dispositivo)
+        self.assertEqual((estado.ultimo_nivel, estado.alerta_activa_id), (20, None))
+
+    def test_lote_desordenado_se_evalua_por_fecha(self):
+        guardar_lecturas([self.lectura(80, 10), self.lectura(20, 5), self.lectura(90, 0)])
+        alertas = list(Alerta.objects.filter(dispositivo=self.dispositivo).order_by("fecha_alerta"))
+        # 90 (abre) → 20 (cierra) → 80 (abre): cada cierre es posterior a su inicio
+        self.assertEqual([a.is_activa for a in alertas], [False, True])
+        self.assertEqual(alertas[0].fecha_desactivada, self.inicio + timedelta(minutes=5))
+        self.assertEqual(alertas[1].fecha_alerta, self.inicio + timedelta(minutes=10))
+
+
+class DeltaDashboardTests(TestCase):
+    """Actualización del dashboard con solo las tarjetas que cambiaron"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("operador"))
+        self.dispositivos = [Dispositivo.objects.create(device_name=f"Contenedor {i}") for i in range(3)]
+        guardar_lecturas([Lectura(d.id, 10, True, timezone.now()) for d in self.dispositivos])
+        # Cambios viejos: fuera del margen con que se reenvían las tarjetas recientes
+        EstadoDispositivo.objects.update(actualizado=timezone.now() - timedelta(hours=1))
+        self.url = reverse("dashboard_partial")
+
+    def test_solo_las_tarjetas_que_cambiaron(self):
+        version = self.client.get(self.url).context["version"]
+        # Sin cambios: 304
+        self.assertEqual(self.client.get(self.url, {"desde": version}, HTTP_IF_NONE_MATCH=f'"{version}"').status_code, 304)
+
+        guardar_lecturas([Lectura(self.dispositivos[1].id, 50, True, timezone.now())])
+        respuesta = self.client.get(self.url, {"desde": version})
+        self.assertEqual(respuesta["HX-Reswap"], "none")
+        self.assertEqual([d.id for d in respuesta.context["dispositivos"]], [self.dispositivos[1].id])
+        self.assertNotEqual(respuesta.context["version"], version)
+
+    def test_pagina_completa_si_cambia_el_conjunto(self):
+        version = self.client.get(self.url).context["version"]
+        Dispositivo.objects.create(device_name="Contenedor nuevo")
+        respuesta = self.client.get(self.url, {"desde": version})
+        self.assertFalse(respuesta.has_header("HX-Reswap"))
+        self.assertEqual(len(respuesta.context["pagina"].object_list), 4)
+
+
+class ResumenFlotaTests(TestCase):
+    """Contadores de la flota mantenidos con incrementos"""
+
+    def setUp(self):
+        resumen_flota.invalidar()
+        self.addCleanup(resumen_flota.invalidar)
+        self.dispositivos = [Dispositivo.objects.create(device_name=f"Contenedor {i}") for i in range(3)]
+        self.inicio = timezone.now() - timedelta(hours=1)
+
+    def guardar(self, *lecturas):
+        # Los contadores se ajustan al confirmar la transacción de la ingesta
+        with self.captureOnCommitCallbacks(execute=True):
+            guardar_lecturas(list(lecturas))
+
+    def test_incrementos_coinciden_con_la_reconstruccion(self):
+        a, b, _ = self.dispositivos
+        resumen_flota.obtener()
+        self.guardar(Lectura(a.id, 80, True, self.inicio), Lectura(b.id, 20, False, self.inicio))
+        self.guardar(Lectura(a.id, 35, True, self.inicio + timedelta(minutes=1)))
+
+        # Con los contadores en cache no se vuelve a consultar la flota
+        with mock.patch.object(resumen_flota, "_reconstruir", side_effect=AssertionError):
+            incremental = resumen_flota.obtener()
+        resumen_flota.invalidar()
+        reconstruido = resumen_flota.obtener()
+
+        del incremental["generado"], reconstruido["generado"]
+        self.assertEqual(incremental, reconstruido)
+        self.assertEqual(
+            (incremental["sobre_umbral"], incremental["alertas_activas"], incremental["puertas_abiertas"], incremental["sin_lecturas"]),
+            (0, 0, 1, 1),
+        )
+        self.assertEqual(incremental["distribucion_nivel"][2]["dispositivos"], 1)
+        self.assertEqual(incremental["distribucion_nivel"][3]["dispositivos"], 1)
+
+
+class ProtocoloLineasTests(SimpleTestCase):
+    """Lectura y validación del protocolo compacto id,nivel,puerta[,ts]"""
+
+    def test_linea_valida(self):
+        self.assertEqual(parsear_linea(b"7,42,1"), Lectura(7, 42, True, None))
+        self.assertEqual(
+            parsear_linea(b"7,42.9,0,1700000000"),
+            Lectura(7, 42, False, datetime.fromtimestamp(1700000000, tz=dt_timezone.utc)),
+        )
+
+    def test_lineas_invalidas(self):
+        futuro = int((timezone.now() + timedelta(hours=1)).timestamp())
+        for linea in (
+            b"7,42", b"7,42,1,2,3", b"x,42,1", b"7,nan,1", b"7,inf,1", b"7,101,1",
+            b"7,-1,1", b"7,42,2", f"7,42,1,{futuro}".encode(), b"7,42,1,99999999999999999999",
+        ):
+            with self.subTest(linea=linea):
+                with self.assertRaises(ValueError):
+                    parsear_linea(linea)
+
+    def test_leer_lineas(self):
+        flujo = io.BytesIO(b"# comentario\n1,10,1\n\n2,20,0\r\n3,30,1")
+        self.assertEqual(leer_lineas(flujo, 3), [b"1,10,1", b"2,20,0", b"3,30,1"])
+
+    def test_leer_lineas_limite(self):
+        with self.assertRaises(OverflowError):
+            leer_lineas(io.BytesIO(b"1,10,1\n2,20,0\n3,30,1\n"), 2)
+
+    def test_leer_lineas_largo_maximo(self):
+        self.assertEqual(leer_lineas(io.BytesIO(b"1,10,1\n"), 10, largo_max=7), [b"1,10,1"])
+        with self.assertRaises(ValueError):
+            leer_lineas(io.BytesIO(b"1,10,1" + b" " * 20 + b"\n"), 10, largo_max=16)
+        with self.assertRaises(ValueError):
+            leer_lineas(io.BytesIO(b"1" * 100), 10, largo_max=16)
+
+
+class CursoresTests(SimpleTestCase):
+    """Cursores opacos de la paginación por clave"""
+
+    def test_ida_y_vuelta(self):
+        fecha = datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        cursor = codificar_cursor("a", [fecha, 42])
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decodificar_cursor(cursor, Reporte, ("fecha", "id")), ("a", [fecha, 42]))
+
+    def test_cursores_invalidos(self):
+        for cursor in (
+            "basura", codificar_cursor("x", [1, 2]), codificar_cursor("s", [1]),
+            codificar_cursor("s", ["no es fecha", 2]),
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decodificar_cursor(cursor, Reporte, ("fecha", "id"))
+                with self.assertRaises(ValueError):
+                    paginar_keyset(Reporte.objects.all(), ("fecha", "id"), cursor)
+class HistorialAlertasTests(TestCase):
+    """Recorrido completo del historial de alertas paginado por clave, en ambas direcciones"""
+
+    def setUp(self):
+        dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        inicio = timezone.now() - timedelta(days=1)
+        reporte = Reporte.objects.create(dispositivo=dispositivo, medicion_nivel=80, estado_puerta=True, fecha=inicio)
+        # Fechas repetidas de a pares: el id desempata
+        Alerta.objects.bulk_create([
+            Alerta(
+                reporte=reporte, dispositivo=dispositivo, mensaje=f"Alerta {i}", is_activa=False,
+                fecha_alerta=inicio + timedelta(minutes=i // 2), fecha_desactivada=inicio + timedelta(hours=1),
+            )
+            for i in range(25)
+        ])
+        self.consulta = Alerta.objects.filter(dispositivo=dispositivo)
+        self.esperados = list(self.consulta.order_by("-fecha_alerta", "-id").values_list("id", flat=True))
+
+    def test_recorre_todas_las_paginas(self):
+        campos = ("fecha_alerta", "id")
+        paginas = []
+        cursor = None
+        while True:
+            pagina = paginar_keyset(self.consulta, campos, cursor, 10)
+            paginas.append(pagina)
+            if pagina.siguiente is None:
+                break
+            cursor = pagina.siguiente
+        self.assertEqual([len(p.elementos) for p in paginas], [10, 10, 5])
+        self.assertEqual([a.id for p in paginas for a in p.elementos], self.esperados)
+        self.assertIsNone(paginas[0].anterior)
+
+        # Volver atrás desde la última página
+        anterior = paginar_keyset(self.consulta, campos, paginas[-1].anterior, 10)
+        self.assertEqual([a.id for a in anterior.elementos], self.esperados[10:20])
+        primera = paginar_keyset(self.consulta, campos, anterior.anterior, 10)
+        self.assertEqual([a.id for a in primera.elementos], self.esperados[:10])
+        self.assertIsNone(primera.anterior)
+        self.assertIsNotNone(primera.siguiente)
+
+
+
+class HistorialRecienteTests(SimpleTestCase):
+    """Anillos de lecturas recientes en memoria"""
+
+    def test_lecturas_atrasadas_se_insertan_en_orden(self):
+        anillo = Anillo(4)
+        for fecha in (10, 20, 30):
+            anillo.agregar(fecha, fecha, True)
+        anillo.agregar(15, 15, False)
+        self.assertEqual([l[0] for l in anillo.lecturas(4)], [10, 15, 20, 30])
+        # Con la ventana llena, se descarta la más antigua
+        anillo.agregar(25, 25, True)
+        self.assertEqual([l[0] for l in anillo.lecturas(4)], [15, 20, 25, 30])
+        # Y una lectura más antigua que toda la ventana no entra
+        anillo.agregar(5, 5, True)
+        self.assertEqual([l[0] for l in anillo.lecturas(4)], [15, 20, 25, 30])
+        anillo.agregar(40, 40, True)
+        self.assertEqual(anillo.lecturas(2), [(30, 30, True), (40, 40, True)])
+
+    def test_reportes_confirmados_durante_la_carga(self):
+        historial = HistorialReciente(ventana=10, ttl=None)
+        cargados = {1: Anillo(10)}
+        cargados[1].agregar(10, 50, True)
+
+        def calentar():
+            # Dos lotes se confirman mientras corre la consulta: uno ya leído por ella y otro no
+            historial._agregar([(1, 10, 50, True)])
+            historial._agregar([(1, 20, 60, False), (2, 5, 70, True)])
+            return cargados
+
+        with mock.patch.object(historial, "_calentar", side_effect=calentar):
+            self.assertEqual(historial.obtener(1), [(10, 50, True), (20, 60, False)])
+            self.assertEqual(historial.obtener(2), [(5, 70, True)])
+
+
+class EventosTests(TestCase):
+    """Avisos en vivo (SSE) solo con un servidor ASGI"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("operador"))
+
+    def test_sin_asgi_las_paginas_consultan_cada_5_segundos(self):
+        self.assertEqual(self.client.get(reverse("dashboard_eventos")).status_code, 204)
+        pagina = self.client.get(reverse("dashboard"))
+        self.assertContains(pagina, 'hx-trigger="every 5s"')
+        self.assertNotContains(pagina, "sse-connect")
+
+    def test_avisos_con_origen(self):
+        self.assertEqual(_decodificar("abc-1:3,1"), ("abc-1", {1, 3}))
+        self.assertEqual(_decodificar("abc-1:"), ("abc-1", None))
+
+
+class BufferIngestaTests(TestCase):
+    """Recuperación de diarios y segmentos del buffer de ingesta diferida"""
+
+    def setUp(self):
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        temporal = tempfile.TemporaryDirectory()
+        self.addCleanup(temporal.cleanup)
+        self.directorio = Path(temporal.name)
+        self.buffer = BufferIngesta(self.directorio, capacidad=100, tamano_lote=10, intervalo=1, max_segmentos=10)
+        # Sin arrancar el hilo: los segmentos se vacían en el hilo del test
+        self.buffer._pid = os.getpid()
+
+    def lecturas(self, *niveles):
+        inicio = timezone.now() - timedelta(hours=1)
+        return [
+            Lectura(self.dispositivo.id, nivel, True, inicio + timedelta(seconds=i))
+            for i, nivel in enumerate(niveles)
+        ]
+
+    def escribir(self, nombre, lecturas):
+        (self.directorio / nombre).write_text("".join(_serializar(lectura) for lectura in lecturas), encoding="utf-8")
+
+    def pid_terminado(self):
+        proceso = subprocess.Popen([sys.executable, "-c", ""])
+        proceso.wait()
+        return proceso.pid
+
+    def test_recupera_archivos_de_procesos_terminados(self):
+        pid = self.pid_terminado()
+        self.escribir(f"actual-{pid}.jsonl", self.lecturas(30))
+        self.escribir(f"lote-{pid}-00000001.jsonl", self.lecturas(10, 20))
+        # El diario se cortó a mitad de una línea
+        with open(self.directorio / f"actual-{pid}.jsonl", "a", encoding="utf-8") as archivo:
+            archivo.write('[1, 2')
+
+        self.buffer._recuperar_huerfanos()
+        segmentos = self.buffer._segmentos_pendientes()
+        self.assertEqual(len(segmentos), 2)
+        self.assertFalse((self.directorio / f"actual-{pid}.jsonl").exists())
+        self.assertFalse((self.directorio / f"lote-{pid}-00000001.jsonl").exists())
+
+        self.buffer._vaciar_segmentos()
+        self.assertEqual(self.buffer._segmentos_pendientes(), [])
+        # El segmento antes que el diario, en el orden en que se recibieron
+        self.assertEqual(
+            list(Reporte.objects.filter(dispositivo=self.dispositivo).order_by("id").values_list("medicion_nivel", flat=True)),
+            [10, 20, 30],
+        )
+
+    def test_no_toca_archivos_de_procesos_activos(self):
+        self.escribir(f"actual-{os.getppid()}.jsonl", self.lecturas(30))
+        self.buffer._recuperar_huerfanos()
+        self.assertEqual(self.buffer._segmentos_pendientes(), [])
+
+    def test_aparta_las_lecturas_que_la_base_rechaza(self):
+        # Un nivel fuera del rango de la columna (escrito antes de validarlo)
+        self.escribir(f"lote-{os.getpid()}-00000001.jsonl", self.lecturas(10, 10 ** 12, 30))
+        self.buffer._vaciar_segmentos()
+        self.assertEqual(self.buffer._segmentos_pendientes(), [])
+        self.assertEqual(
+            sorted(Reporte.objects.filter(dispositivo=self.dispositivo).values_list("medicion_nivel", flat=True)),
+            [10, 30],
+        )
+        rechazadas = (self.directorio / "rechazadas" / f"rechazadas-{os.getpid()}.jsonl").read_text().splitlines()
+        self.assertEqual(len(rechazadas), 1)
+        self.assertEqual(json.loads(rechazadas[0])[:2], [self.dispositivo.id, 10 ** 12])
+
+    def test_conserva_el_segmento_si_la_base_no_responde(self):
+        self.escribir(f"lote-{os.getpid()}-00000001.jsonl", self.lecturas(10, 20))
+        with mock.patch("dashboard.buffer_ingesta.guardar_lecturas", side_effect=OperationalError):
+            self.buffer._vaciar_segmentos()
+        self.assertEqual(len(self.buffer._segmentos_pendientes()), 1)
+        self.assertFalse((self.directorio / "rechazadas").exists())
+        self.assertFalse(Reporte.objects.filter(dispositivo=self.dispositivo).exists())
@@ -9,6 +9,15 @@ urlpatterns = [
     # URL para cargar partes del dashboard mediante peticiones AJAX o parciales
     path('dashboard/partial/', views.dashboard_partial, name="dashboard_partial"),
 
+    # URL del flujo de eventos (SSE) con avisos de lecturas nuevas
+    path('eventos/', views.eventos, name="dashboard_eventos"),
+
+    # URL de la API JSON con el estado de los dispositivos (dashboard en modo cliente)
+    path('api/v1/estado/', views.api_estado, name="api_estado"),
+
+    # URL con el resumen de toda la flota en JSON (wallboards y monitores externos)
+    path('summary/', views.resumen_flota, name="resumen_flota"),
+
     # URL para recibir reportes enviados desde el ESP32
     path('esp32/', views.reporte_ESP32, name="reporte_esp32"),
 
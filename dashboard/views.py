@@ -1,106 +1,273 @@
 from django.shortcuts import render, redirect  # Funciones para renderizar templates y redirigir
-from .models import Dispositivo, Reporte, Alerta  # Importa los modelos del dashboard
-from django.db.models import OuterRef, Subquery  # Para consultas avanzadas tipo subquery
-from django.http import JsonResponse  # Para responder con JSON
+from .models import Dispositivo, EstadoDispositivo  # Importa los modelos del dashboard
+from .ingesta import procesar_lote, validar_lectura, parsear_linea, leer_lineas, LOTE_MAX, LINEA_MAX  # Validación y guardado de lecturas del ESP32
+from .buffer_ingesta import encolar_lote  # Ingesta con escritura diferida
+from .eventos import flujo_eventos, sse_activo  # Avisos en vivo de lecturas nuevas (SSE)
+from .resumen_flota import obtener as obtener_resumen_flota  # Contadores de toda la flota
+from django.utils.crypto import constant_time_compare  # Para comparar el token sin filtrar tiempos
+from django.conf import settings  # Configuración del proyecto
+from django.db.models import F, Max  # Para leer campos de modelos relacionados y agregados
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse  # Para responder con JSON, texto o flujos
 import json  # Para decodificar JSON recibido
-from django.utils import timezone  # Para obtener fecha y hora actual
+from datetime import datetime, timedelta, timezone as dt_timezone  # Para las versiones del dashboard
+import hashlib  # Para resumir los ids de una página en la versión
+from django.core.paginator import Paginator  # Para paginar las tarjetas del dashboard
 from django.views.decorators.csrf import csrf_exempt  # Para eximir CSRF en endpoints externos
 from django.contrib.auth import logout  # Para cerrar sesión
 from django.contrib.auth.decorators import login_required  # Para proteger vistas con login
-from django.views.decorators.cache import never_cache  # Para evitar cache de la vista
+from django.views.decorators.cache import never_cache, cache_control  # Para controlar el cache de la vista
+from django.views.decorators.http import condition  # Para responder 304 si el cliente ya tiene la versión
+
+# Anota cada dispositivo con los valores de su estado actual (último reporte)
+def dispositivos_con_estado():
+    return Dispositivo.objects.annotate(
+        ultimo_nivel=F("estado__ultimo_nivel"),  # Último nivel medido
+        ultima_fecha=F("estado__ultima_fecha"),  # Fecha del último reporte
+        estado_puerta=F("estado__estado_puerta"),  # Estado de puerta del último reporte
+        actualizado=F("estado__actualizado"),  # Versión del estado, clave del cache de tarjetas
+    )
+
+# Cantidad de tarjetas por página del dashboard
+DISPOSITIVOS_POR_PAGINA = getattr(settings, "DASHBOARD_POR_PAGINA", 48)
+
+# Órdenes disponibles para las tarjetas; el id desempata para que la paginación sea
+# estable. Cada orden recorre un índice: la clave primaria, (device_name, id) y
+# estado_nivel_idx sobre (ultimo_nivel, dispositivo).
+ORDENES = {
+    "id": ("id",),
+    "nombre": ("device_name", "id"),
+    "nivel": (F("estado__ultimo_nivel").desc(nulls_last=True), "id"),  # Más llenos primero
+}
+
+# Aplica los filtros del dashboard (GET) sobre los dispositivos. Cada filtro usa
+# un índice: parciales de Estado para alertas y puertas, trigramas para el nombre.
+def filtrar_dispositivos(parametros):
+    dispositivos = dispositivos_con_estado()
+    if parametros.get("alerta"):
+        dispositivos = dispositivos.filter(estado__alerta_activa__isnull=False)  # Solo con alerta activa
+    if parametros.get("puerta_abierta"):
+        dispositivos = dispositivos.filter(estado__estado_puerta=False)  # Solo con la puerta abierta
+    nombre = parametros.get("q", "").strip()
+    if nombre:
+        dispositivos = dispositivos.filter(device_name__icontains=nombre)  # Búsqueda por nombre
+    orden = parametros.get("orden")
+    if orden == "nivel":
+        # Con un INNER JOIN el orden sale de estado_nivel_idx; sobre el lado
+        # opcional de un LEFT JOIN haría falta ordenar en memoria. Los
+        # dispositivos que aún no reportan no tienen nivel y no se listan.
+        dispositivos = dispositivos.filter(estado__isnull=False)
+    return dispositivos.order_by(*ORDENES.get(orden, ORDENES["id"]))
+
+# Página de dispositivos pedida, calculada una sola vez por petición
+def pagina_dashboard(request):
+    if not hasattr(request, "pagina_dashboard"):
+        paginator = Paginator(filtrar_dispositivos(request.GET), DISPOSITIVOS_POR_PAGINA)
+        request.pagina_dashboard = paginator.get_page(request.GET.get("page"))
+    return request.pagina_dashboard
 
 # Vista principal del dashboard, protegida por login y sin cache
 @login_required
 @never_cache
 def dashboard(request):
-    # Anota cada dispositivo con los últimos valores de nivel, fecha y estado de puerta
-    dispositivos = Dispositivo.objects.annotate(
-        ultimo_nivel=Subquery(
-            Reporte.objects.filter(dispositivo=OuterRef("pk"))
-            .order_by("-fecha")
-            .values("medicion_nivel")[:1]  # Último nivel medido
-        ),
-        ultima_fecha=Subquery(
-            Reporte.objects.filter(dispositivo=OuterRef("pk"))
-            .order_by("-fecha")
-            .values("fecha")[:1]  # Fecha del último reporte
-        ),
-        estado_puerta=Subquery(
-            Reporte.objects.filter(dispositivo=OuterRef("pk"))
-            .order_by("-fecha")
-            .values("estado_puerta")[:1]  # Estado de puerta del último reporte
-        ),
-    )
-    # Renderiza el template principal con los dispositivos anotados
-    return render(request, "dashboard/dashboard.html", {"dispositivos": dispositivos})
+    # Con ?modo=cliente las tarjetas se dibujan en el navegador desde la API de estado
+    if request.GET.get("modo") == "cliente":
+        return render(request, "dashboard/dashboard.html", {"modo_cliente": True, "sse": sse_activo(request)})
+
+    # Renderiza el template principal con la página de dispositivos anotados y
+    # la versión que el cliente enviará en cada actualización
+    return render(request, "dashboard/dashboard.html", {
+        "pagina": pagina_dashboard(request),
+        "version": version_dashboard(request),
+        "sse": sse_activo(request),  # Sin servidor ASGI la página consulta cada 5 segundos
+    })
+
+# Origen de las marcas de versión
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
-# Vista parcial del dashboard para actualizaciones parciales (AJAX)
+# Convierte una fecha en microsegundos enteros, para comparar versiones sin redondeos
+def marca_version(fecha):
+    return (fecha - EPOCA) // timedelta(microseconds=1) if fecha else 0
+
+# Margen con que se reenvían las tarjetas recientes, por si una transacción de
+# ingesta confirmó un cambio con una marca anterior a la versión del cliente
+MARGEN_DELTA = timedelta(seconds=5)
+
+# Versión de la página del dashboard "conjunto-microsegundos". El conjunto
+# resume el total filtrado y los ids de la página en orden: cambia si un
+# dispositivo entra, sale o se mueve en la página. La marca es el último cambio
+# de estado de esos dispositivos. Se calcula con consultas acotadas al tamaño
+# de la página y una sola vez por petición.
+def version_dashboard(request):
+    if not hasattr(request, "version_dashboard"):
+        pagina = pagina_dashboard(request)
+        ids = list(pagina.object_list.values_list("id", flat=True))
+        conjunto = hashlib.md5(",".join(map(str, ids)).encode()).hexdigest()[:12]
+        actualizado = EstadoDispositivo.objects.filter(dispositivo_id__in=ids).aggregate(ultimo=Max("actualizado"))["ultimo"]
+        request.version_dashboard = f"{pagina.paginator.count}.{conjunto}-{marca_version(actualizado)}"
+    return request.version_dashboard
+
+# Vista parcial del dashboard para actualizaciones parciales (AJAX), con los
+# mismos filtros y página que el dashboard.
+# Con ?desde=<versión> de la misma página responde solo las tarjetas que
+# cambiaron, como intercambios fuera de banda (hx-swap-oob).
+# Responde 304 si el navegador ya tiene la versión actual.
 @login_required
+@cache_control(private=True, no_cache=True)  # El navegador guarda la respuesta pero la revalida siempre
+@condition(etag_func=version_dashboard)
 def dashboard_partial(request):
-    dispositivos = Dispositivo.objects.annotate(
-        ultimo_nivel=Subquery(
-            Reporte.objects.filter(dispositivo=OuterRef("pk"))
-            .order_by("-fecha")
-            .values("medicion_nivel")[:1]
-        ),
-        ultima_fecha=Subquery(
-            Reporte.objects.filter(dispositivo=OuterRef("pk"))
-            .order_by("-fecha")
-            .values("fecha")[:1]
-        ),
+    version = version_dashboard(request)
+    cambios = cambios_desde(request)
+
+    if cambios is not None:
+        # Misma página: enviar solo las tarjetas que cambiaron desde la versión del cliente
+        respuesta = render(request, "dashboard/dashboard_delta.html", {
+            "dispositivos": cambios,
+            "version": version,
+        })
+        respuesta["HX-Reswap"] = "none"  # No reemplazar la lista, solo los fragmentos fuera de banda
+        return respuesta
+
+    # Primera carga, cambio de filtros o de página, o cambió el conjunto: página completa
+    return render(request, "dashboard/dashboard_partial.html", {
+        "pagina": pagina_dashboard(request),
+        "version": version,
+        "version_oob": True,
+    })
+
+# Dispositivos de la página que cambiaron desde la versión enviada por el
+# cliente (?desde=), o None si el cliente necesita la página completa
+def cambios_desde(request):
+    conjunto = version_dashboard(request).rpartition("-")[0]
+    conjunto_cliente, _, marca_cliente = request.GET.get("desde", "").rpartition("-")
+    if conjunto_cliente != conjunto or not marca_cliente.isdigit():
+        return None
+    desde = EPOCA + timedelta(microseconds=int(marca_cliente)) - MARGEN_DELTA
+    return dispositivos_con_estado().filter(
+        id__in=pagina_dashboard(request).object_list.values("id"), estado__actualizado__gt=desde
+    )
+
+# Columnas de cada fila de la API de estado, en orden
+CAMPOS_API_ESTADO = ("id", "nombre", "nivel", "puerta", "fecha", "alerta")
+
+# API JSON v1 con el estado de los dispositivos de una página, con los mismos
+# filtros, paginación, versión y respuestas 304 que el parcial del dashboard.
+# Cada dispositivo es un arreglo [id, nombre, nivel, puerta (true = cerrada),
+# fecha (segundos Unix) y alerta activa]. Con ?desde=<versión> de la misma
+# página solo incluye los que cambiaron ("parcial": true).
+@login_required
+@cache_control(private=True, no_cache=True)  # El navegador guarda la respuesta pero la revalida siempre
+@condition(etag_func=version_dashboard)
+def api_estado(request):
+    pagina = pagina_dashboard(request)
+    cambios = cambios_desde(request)
+    dispositivos = pagina.object_list if cambios is None else cambios
+    filas = [
+        [id_device, nombre, nivel, puerta, int(fecha.timestamp()) if fecha else None, alerta is not None]
+        for id_device, nombre, nivel, puerta, fecha, alerta in dispositivos.values_list(
+            "id", "device_name", "ultimo_nivel", "estado_puerta", "ultima_fecha", "estado__alerta_activa"
+        )
+    ]
+    return JsonResponse(
+        {
+            "version": version_dashboard(request),
+            "parcial": cambios is not None,
+            "pagina": pagina.number,
+            "paginas": pagina.paginator.num_pages,
+            "total": pagina.paginator.count,
+            "campos": CAMPOS_API_ESTADO,
+            "dispositivos": filas,
+        },
+        json_dumps_params={"separators": (",", ":")},  # Sin espacios, para reducir el tamaño
     )
-    return render(request, "dashboard/dashboard_partial.html", {"dispositivos": dispositivos})
 
-# Endpoint para recibir información enviada desde el ESP32
+# Flujo SSE que avisa de lecturas nuevas. El dashboard y el detalle del
+# contenedor recargan su parcial al recibir el evento "lecturas".
+# Con ?dispositivo=<id> solo se avisan los cambios de ese dispositivo.
+@login_required
+async def eventos(request):
+    # Sin servidor ASGI el flujo no terminaría nunca y ocuparía un hilo: 204 hace
+    # que el navegador deje de reconectar y la página siga con su consulta periódica
+    if not sse_activo(request):
+        return HttpResponse(status=204)
+    dispositivo = request.GET.get("dispositivo", "")
+    respuesta = StreamingHttpResponse(
+        flujo_eventos(int(dispositivo) if dispositivo.isdigit() else None),
+        content_type="text/event-stream",
+    )
+    respuesta["Cache-Control"] = "no-cache"
+    respuesta["X-Accel-Buffering"] = "no"  # Evita que nginx acumule el flujo
+    return respuesta
+
+# Resumen de la flota en JSON, desde los contadores en cache (no recorre los reportes).
+# Acepta una sesión iniciada o el token RESUMEN_FLOTA_TOKEN para monitores externos.
+@cache_control(private=True, no_cache=True)
+def resumen_flota(request):
+    token = getattr(settings, "RESUMEN_FLOTA_TOKEN", None)
+    autorizado = request.user.is_authenticated or (
+        token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    )
+    if not autorizado:
+        return JsonResponse({"status": "error", "message": "No autorizado"}, status=401)
+    return JsonResponse(obtener_resumen_flota())
+
+# Guarda las lecturas, o las encola si la escritura diferida está activa.
+# Devuelve un resultado por lectura, o None si el buffer está lleno.
+def registrar_lecturas(items, validar=validar_lectura):
+    if settings.INGESTA_DIFERIDA:
+        return encolar_lote(items, validar)
+    return procesar_lote(items, validar)
+
+# Respuesta 503 para que el dispositivo reintente cuando el buffer está lleno
+def respuesta_ocupado(respuesta):
+    respuesta.status_code = 503
+    respuesta["Retry-After"] = "5"
+    return respuesta
+
+# Endpoint para recibir información enviada desde el ESP32.
+# Acepta una lectura (objeto JSON), un lote de lecturas (arreglo JSON) o
+# líneas del protocolo compacto (Content-Type: text/plain).
 @csrf_exempt  # Deshabilita CSRF para este endpoint
 def reporte_ESP32(request):
     if request.method == "POST":
+        # Protocolo compacto: una lectura "id,nivel,puerta[,ts]" por línea
+        if request.content_type == "text/plain":
+            return reporte_lineas(request)
+
         data = request.body.decode('utf-8')  # Recibe JSON enviado por ESP32
         try: 
             info = json.loads(data)  # Decodifica JSON
-            id_device = info.get('id_device')  # Obtiene id del dispositivo
-            medida_nivel = info.get('nivel')  # Obtiene nivel medido
-            estado_puerta = info.get('puerta')  # Obtiene estado de puerta
-
-            # Validar que el dispositivo exista
-            try:
-                dispositivo = Dispositivo.objects.get(id=id_device)
-            except Dispositivo.DoesNotExist:
-                raise ValueError(f"El dispositivo con id {id_device} no existe")
-            
-            # Crear un nuevo reporte en la base de datos
-            reporte = Reporte.objects.create(
-                dispositivo=dispositivo,
-                medicion_nivel=medida_nivel,
-                estado_puerta=estado_puerta,
-                fecha=timezone.now()
-            )
-
-            # Revisar si hay alerta activa para el dispositivo
-            alerta_activa = Alerta.objects.filter(
-                reporte__dispositivo=dispositivo,
-                is_activa=True
-            ).order_by("-fecha_alerta").first()
-
-            # Crear alerta si el nivel supera 75 y no hay alerta activa
-            if medida_nivel >= 75:
-                if not alerta_activa:
-                    mensaje_alerta = f"VACIAR CONTENEDOR - Nivel medido: {medida_nivel}%"
-                    Alerta.objects.create(
-                        reporte=reporte,
-                        mensaje=mensaje_alerta,
-                        fecha_alerta=timezone.now(),
-                        is_activa=True
-                    )
-            else:
-                # Si hay alerta activa y el nivel bajó, desactivarla
-                if alerta_activa:
-                    alerta_activa.is_activa = False
-                    alerta_activa.fecha_desactivada = timezone.now()
-                    alerta_activa.save()
-
-            # Respuesta exitosa al ESP32
-            return JsonResponse({"status": "ok", "reporte_id": reporte.id})
+
+            # Modo lote: un gateway envía varias lecturas en un arreglo
+            es_lote = isinstance(info, list)
+            items = info if es_lote else [info]
+            if len(items) > LOTE_MAX:
+                return JsonResponse(
+                    {"status": "error", "message": f"El lote supera el máximo de {LOTE_MAX} lecturas"},
+                    status=413
+                )
+
+            resultados = registrar_lecturas(items)
+            if resultados is None:
+                return respuesta_ocupado(JsonResponse({"status": "error", "message": "Servidor ocupado, reintente"}))
+
+            if es_lote:
+                correctos = sum(1 for r in resultados if r["status"] == "ok")
+                if correctos == len(resultados):
+                    estado = "ok"
+                elif correctos == 0:
+                    estado = "error"
+                else:
+                    estado = "parcial"
+                # Respuesta con el estado de cada lectura, en el orden recibido
+                return JsonResponse({"status": estado, "resultados": resultados})
+
+            # Una sola lectura
+            resultado = resultados[0]
+            if resultado["status"] != "ok":
+                raise ValueError(resultado["message"])
+
+            # Respuesta exitosa al ESP32 (202 si la lectura quedó encolada)
+            return JsonResponse(resultado, status=202 if resultado.get("encolado") else 200)
 
         except json.JSONDecodeError:
             # JSON inválido
@@ -112,6 +279,40 @@ def reporte_ESP32(request):
     else:
         # Método no permitido
         return JsonResponse({"status": "error", "message": "Método no permitido"}, status=405)
+
+# Ingesta con el protocolo compacto de líneas. El cuerpo se lee como flujo,
+# sin decodificar JSON. Responde una línea por lectura: "ok,<reporte_id>",
+# "ok" si quedó encolada o no generó reporte (banda muerta) o "error,<mensaje>".
+# Como no pasa por request.body, aplica aquí DATA_UPLOAD_MAX_MEMORY_SIZE.
+def reporte_lineas(request):
+    maximo = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    try:
+        largo = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        largo = 0
+    if maximo is not None and largo > maximo:
+        return HttpResponse(f"error,El cuerpo supera el máximo de {maximo} bytes\n", content_type="text/plain", status=413)
+
+    try:
+        lineas = leer_lineas(request, LOTE_MAX, LINEA_MAX)
+    except OverflowError:
+        return HttpResponse(f"error,El lote supera el máximo de {LOTE_MAX} lecturas\n", content_type="text/plain", status=413)
+    except ValueError as ve:
+        return HttpResponse(f"error,{ve}\n", content_type="text/plain", status=413)
+
+    resultados = registrar_lecturas(lineas, parsear_linea)
+    if resultados is None:
+        return respuesta_ocupado(HttpResponse("error,Servidor ocupado, reintente\n", content_type="text/plain"))
+
+    salida = []
+    for resultado in resultados:
+        if resultado["status"] != "ok":
+            salida.append(f"error,{resultado['message']}\n")
+        elif resultado.get("reporte_id") is not None:
+            salida.append(f"ok,{resultado['reporte_id']}\n")
+        else:
+            salida.append("ok\n")
+    return HttpResponse("".join(salida), content_type="text/plain")
     
 # Vista para cerrar sesión
 def logout_view(request):
@@ -1,3 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin  # Importa el módulo de administración de Django
 
-# Register your models here.
+# Importa los modelos de Reporte
+from .models import TrabajoInforme
+
+# Admin para revisar los informes PDF en segundo plano
+@admin.register(TrabajoInforme)
+class TrabajoInformeAdmin(admin.ModelAdmin):
+    list_display = ("titulo", "usuario", "estado", "progreso", "creado", "terminado")  # Campos que se muestran en la lista
+    list_filter = ("estado",)  # Filtro por estado
+    readonly_fields = ("parametros", "archivo", "error", "creado", "terminado")  # Los escribe procesar_informes al generar el PDF
@@ -1,5 +1,5 @@
 from django import forms
-from dashboard.models import Dispositivo
+from dashboard.registro import registro
 
 # Formulario para filtrar y generar informes
 class informe(forms.Form):
@@ -75,6 +75,6 @@ class informe(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Se consulta la base de datos aquí, al instanciar el formulario
-        dispositivos_choices = [('all', 'Todos')] + [(d.id, d.device_name) for d in Dispositivo.objects.all()]
+        # Las opciones salen del registro en memoria, no de la base de datos
+        dispositivos_choices = [('all', 'Todos')] + [(d.id, d.device_name) for d in registro.todos()]
         self.fields['dispositivos'].choices = dispositivos_choices
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from reporte.trabajos import cola_informes
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra los informes PDF vencidos (INFORMES_VENCIMIENTO) con sus archivos y "
+        "marca como error los que no terminaron en INFORMES_TIEMPO_MAXIMO."
+    )
+
+    def handle(self, *args, **opciones):
+        borrados = cola_informes.limpiar()
+        self.stdout.write(f"Informes vencidos borrados: {borrados}")
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from reporte.trabajos import cola_informes
+
+# Segundos entre dos limpiezas de la cola
+INTERVALO_LIMPIEZA = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los informes PDF pendientes, fuera de los workers web. Corre de forma "
+        "continua; varios procesos se reparten la cola."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--espera", type=float, default=getattr(settings, "INFORMES_ESPERA", 2),
+            help="Segundos entre consultas de la cola cuando no hay trabajos pendientes.",
+        )
+        parser.add_argument(
+            "--una-vez", action="store_true",
+            help="Genera los informes pendientes y termina (para ejecutarlo con cron).",
+        )
+
+    def handle(self, *args, **opciones):
+        if opciones["espera"] <= 0:
+            raise CommandError("--espera debe ser mayor que 0.")
+
+        limpieza = None
+        while True:
+            # Como en cada petición web: descarta la conexión si se cortó o superó CONN_MAX_AGE
+            close_old_connections()
+            # Marca los interrumpidos, devuelve a la cola los huérfanos y borra los vencidos
+            if limpieza is None or time.monotonic() - limpieza >= INTERVALO_LIMPIEZA:
+                cola_informes.limpiar()
+                limpieza = time.monotonic()
+            generados = cola_informes.procesar_pendientes()
+            if generados:
+                self.stdout.write(f"Informes generados: {generados}")
+            if opciones["una_vez"]:
+                return
+            time.sleep(opciones["espera"])
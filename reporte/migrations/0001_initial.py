@@ -0,0 +1,52 @@
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrabajoInforme",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("parametros", models.JSONField()),
+                ("titulo", models.CharField(blank=True, max_length=200)),
+                ("estado", models.CharField(
+                    choices=[
+                        ("pendiente", "Pendiente"),
+                        ("en_proceso", "En proceso"),
+                        ("terminado", "Terminado"),
+                        ("error", "Error"),
+                    ],
+                    default="pendiente",
+                    max_length=20,
+                )),
+                ("progreso", models.PositiveSmallIntegerField(default=0)),
+                ("archivo", models.CharField(blank=True, max_length=255)),
+                ("error", models.TextField(blank=True)),
+                ("creado", models.DateTimeField(default=django.utils.timezone.now)),
+                ("terminado", models.DateTimeField(blank=True, null=True)),
+                ("usuario", models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name="trabajos_informe",
+                    to=settings.AUTH_USER_MODEL,
+                )),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["usuario", "estado"], name="trabajo_usuario_estado_idx"),
+                    models.Index(fields=["creado"], name="trabajo_creado_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reporte", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trabajoinforme",
+            name="proceso",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
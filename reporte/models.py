@@ -1,3 +1,51 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+# Modelo que representa un informe PDF generado en segundo plano
+class TrabajoInforme(models.Model):
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    TERMINADO = "terminado"
+    ERROR = "error"
+    ESTADO_CHOICES = [
+        (PENDIENTE, "Pendiente"),
+        (EN_PROCESO, "En proceso"),
+        (TERMINADO, "Terminado"),
+        (ERROR, "Error"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # No adivinable en las URLs de descarga
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,  # Usuario que pidió el informe
+        on_delete=models.CASCADE,  # Si se borra el usuario, se borran sus informes
+        related_name="trabajos_informe"
+    )
+    parametros = models.JSONField()  # Datos del formulario informe con los que se genera
+    titulo = models.CharField(max_length=200, blank=True)  # Título del informe, también nombre del PDF
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE)
+    progreso = models.PositiveSmallIntegerField(default=0)  # Porcentaje de filas escritas
+    archivo = models.CharField(max_length=255, blank=True)  # Nombre del PDF dentro de INFORMES_DIRECTORIO
+    error = models.TextField(blank=True)  # Motivo del error, si lo hubo
+    proceso = models.CharField(max_length=200, blank=True)  # Proceso que lo genera: "equipo:pid:token"
+    creado = models.DateTimeField(default=timezone.now)  # Fecha en que se pidió
+    terminado = models.DateTimeField(null=True, blank=True)  # Fecha en que terminó (con o sin error)
+
+    class Meta:
+        indexes = [
+            # Informes en curso de un usuario (límite por usuario)
+            models.Index(fields=["usuario", "estado"], name="trabajo_usuario_estado_idx"),
+            # Informes vencidos
+            models.Index(fields=["creado"], name="trabajo_creado_idx"),
+        ]
+
+    @property
+    def en_curso(self):
+        return self.estado in (self.PENDIENTE, self.EN_PROCESO)
 
-# Create your models here.
+    def __str__(self):
+        # Representación legible del trabajo
+        return f"{self.titulo or 'Informe'} ({self.get_estado_display()})"
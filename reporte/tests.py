@@ -1,3 +1,186 @@
+import io
+import socket
+import tempfile
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard.models import Dispositivo, Reporte
+from dashboard.paginacion import contar, paginar_keyset
+from .models import TrabajoInforme
+from .trabajos import ColaInformes
+from .views import consulta_reportes, escribir_pdf
+
+
+class PaginacionReportesTests(TestCase):
+    """Resultados de reportes paginados por clave sobre (fecha, id)"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("operador"))
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        inicio = timezone.now() - timedelta(days=1)
+        # Fechas repetidas de a pares: el id desempata
+        Reporte.objects.bulk_create([
+            Reporte(dispositivo=self.dispositivo, medicion_nivel=i, estado_puerta=True, fecha=inicio + timedelta(minutes=i // 2))
+            for i in range(25)
+        ])
+        self.esperados = list(
+            Reporte.objects.filter(dispositivo=self.dispositivo).order_by("-fecha", "-id").values_list("id", flat=True)
+        )
+
+    def test_recorre_todas_las_paginas(self):
+        consulta = consulta_reportes(self.dispositivo.id)
+        ids = []
+        cursor = None
+        while True:
+            pagina = paginar_keyset(consulta, ("fecha", "id"), cursor, 10)
+            ids.extend(reporte.id for reporte in pagina.elementos)
+            if pagina.siguiente is None:
+                break
+            cursor = pagina.siguiente
+        self.assertEqual(ids, self.esperados)
+
+        # La página anterior a la última es la segunda
+        anterior = paginar_keyset(consulta, ("fecha", "id"), pagina.anterior, 10)
+        self.assertEqual([reporte.id for reporte in anterior.elementos], self.esperados[10:20])
+
+    def test_vista_conserva_el_total_entre_paginas(self):
+        url = reverse("report_index")
+        filtros = {"dispositivos": self.dispositivo.id, "tipo_informe": "reporte"}
+        primera = self.client.get(url, filtros, HTTP_HX_REQUEST="true")
+        self.assertEqual((primera.context["total"], primera.context["total_exacto"]), (25, True))
+        self.assertEqual([r.id for r in primera.context["reportes"]], self.esperados[:10])
+
+        # Las páginas siguientes reciben el total del cliente y no vuelven a contar
+        segunda = self.client.get(
+            url, {**filtros, "cursor": primera.context["pagina"].siguiente, "total": "25"}, HTTP_HX_REQUEST="true",
+        )
+        self.assertEqual(segunda.context["total"], 25)
+        self.assertEqual([r.id for r in segunda.context["reportes"]], self.esperados[10:20])
+
+        # Un cursor alterado vuelve a la primera página
+        alterada = self.client.get(url, {**filtros, "cursor": "alterado"}, HTTP_HX_REQUEST="true")
+        self.assertEqual([r.id for r in alterada.context["reportes"]], self.esperados[:10])
+
+    def test_contar(self):
+        consulta = Reporte.objects.filter(dispositivo=self.dispositivo)
+        self.assertEqual(contar(consulta, limite_exacto=10 ** 9), (25, True))
+        if connection.vendor == "postgresql":
+            # Por encima del límite se devuelve la estimación del planificador
+            self.assertFalse(contar(consulta, limite_exacto=-1)[1])
+
+
+class FechasLocalesTests(TestCase):
+    """Los filtros por día cortan en la medianoche de la zona horaria del proyecto"""
+
+    def setUp(self):
+        self.dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        self.dia = date(2026, 3, 10)
+        # 23:30 y 00:30 locales; en UTC (America/Bogota, UTC-5) ambas caen el día 11
+        self.noche = Reporte.objects.create(
+            dispositivo=self.dispositivo, medicion_nivel=10, estado_puerta=True,
+            fecha=timezone.make_aware(datetime(2026, 3, 10, 23, 30)),
+        )
+        self.madrugada = Reporte.objects.create(
+            dispositivo=self.dispositivo, medicion_nivel=20, estado_puerta=True,
+            fecha=timezone.make_aware(datetime(2026, 3, 11, 0, 30)),
+        )
+
+    def ids(self, device_id, de_fecha, fecha):
+        return [r.id for r in consulta_reportes(device_id, de_fecha, fecha)]
+
+    def test_en_antes_y_despues(self):
+        self.assertEqual(self.ids(self.dispositivo.id, "en", self.dia), [self.noche.id])
+        self.assertEqual(self.ids(self.dispositivo.id, "despues", self.dia), [self.madrugada.id])
+        # El informe de un dispositivo excluye el día indicado; el general lo incluye
+        self.assertEqual(self.ids(self.dispositivo.id, "antes", self.dia + timedelta(days=1)), [self.noche.id])
+        self.assertEqual(self.ids(None, "antes", self.dia), [self.noche.id])
+
+
+class ColaInformesTests(TestCase):
+    """Cola de informes PDF que genera procesar_informes"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user("operador")
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.cola = ColaInformes(directorio.name, en_curso_por_usuario=2, vencimiento=3600, tiempo_maximo=600)
+
+    def test_limite_por_usuario_con_la_fila_bloqueada(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertIsNotNone(self.cola.crear(self.usuario, {}))
+        # El conteo se hace con la fila del usuario bloqueada
+        self.assertTrue(any("FOR UPDATE" in consulta["sql"] for consulta in consultas.captured_queries))
+        self.assertIsNotNone(self.cola.crear(self.usuario, {}))
+        self.assertIsNone(self.cola.crear(self.usuario, {}))
+
+        # Los terminados no cuentan
+        TrabajoInforme.objects.filter(usuario=self.usuario).update(estado=TrabajoInforme.TERMINADO)
+        self.assertIsNotNone(self.cola.crear(self.usuario, {}))
+
+    def test_tomar_reclama_el_pendiente_mas_antiguo(self):
+        primero = self.cola.crear(self.usuario, {})
+        segundo = self.cola.crear(self.usuario, {})
+        TrabajoInforme.objects.filter(pk=segundo.pk).update(creado=primero.creado + timedelta(seconds=1))
+
+        self.assertEqual(self.cola.tomar(), primero.pk)
+        primero.refresh_from_db()
+        self.assertEqual(primero.estado, TrabajoInforme.EN_PROCESO)
+        self.assertEqual(primero.proceso, self.cola._proceso())
+        self.assertEqual(self.cola.tomar(), segundo.pk)
+        self.assertIsNone(self.cola.tomar())
+
+    def test_huerfanos_vuelven_a_la_cola(self):
+        trabajo = self.cola.crear(self.usuario, {})
+        self.cola.tomar()
+        # Proceso terminado de este equipo, y proceso de otro equipo (no se puede comprobar)
+        TrabajoInforme.objects.filter(pk=trabajo.pk).update(proceso=f"{socket.gethostname()}:999999:x", progreso=40)
+        otro = TrabajoInforme.objects.create(
+            usuario=self.usuario, parametros={}, estado=TrabajoInforme.EN_PROCESO, proceso="otro-equipo:1:x",
+        )
+
+        with mock.patch("reporte.trabajos.proceso_activo", return_value=False):
+            self.assertEqual(self.cola.recuperar(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.proceso, trabajo.progreso), (TrabajoInforme.PENDIENTE, "", 0))
+        otro.refresh_from_db()
+        self.assertEqual(otro.estado, TrabajoInforme.EN_PROCESO)
+        self.assertEqual(self.cola.tomar(), trabajo.pk)
+
+    def test_procesar_pendientes(self):
+        Dispositivo.objects.create(device_name="Contenedor")
+        trabajo = self.cola.crear(self.usuario, {"dispositivos": "all", "tipo_informe": "reporte"})
+        invalido = self.cola.crear(self.usuario, {})
+        TrabajoInforme.objects.filter(pk=invalido.pk).update(creado=trabajo.creado + timedelta(seconds=1))
+
+        self.assertEqual(self.cola.procesar_pendientes(), 2)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoInforme.TERMINADO)
+        self.assertTrue(self.cola.ruta(trabajo).exists())
+        invalido.refresh_from_db()
+        self.assertEqual(invalido.estado, TrabajoInforme.ERROR)
+
+
+class InformePdfTests(TestCase):
+    """Escritura del PDF de un informe"""
 
-# Create your tests here.
+    def test_dibuja_como_maximo_pdf_filas_max(self):
+        dispositivo = Dispositivo.objects.create(device_name="Contenedor")
+        inicio = timezone.now() - timedelta(days=1)
+        Reporte.objects.bulk_create([
+            Reporte(dispositivo=dispositivo, medicion_nivel=10, estado_puerta=True, fecha=inicio + timedelta(minutes=i))
+            for i in range(5)
+        ])
+        datos = {
+            "dispositivos": str(dispositivo.id), "tipo_informe": "reporte", "estado_alerta": "",
+            "de_fecha": "", "fecha": None, "de_hora": "", "hora1": None, "hora2": None,
+        }
+        with mock.patch("reporte.views.PDF_FILAS_MAX", 3), mock.patch("reporte.views.Table.drawOn") as dibujar:
+            escribir_pdf(io.BytesIO(), datos)
+        self.assertEqual(dibujar.call_count, 3)
@@ -0,0 +1,199 @@
+"""
+Cola de informes PDF generados en segundo plano.
+
+Enviar el formulario de PDF crea un TrabajoInforme pendiente y responde de
+inmediato. El comando procesar_informes, que corre como un proceso aparte de
+los workers web, reclama los pendientes de la tabla, escribe cada PDF en
+INFORMES_DIRECTORIO y va guardando el progreso, que la página consulta con
+HTMX hasta que aparece el enlace de descarga. Así reportlab no ocupa la CPU ni
+la memoria de los workers web, y un informe grande no choca con el tiempo
+límite del proxy. Varios procesos procesar_informes se reparten la cola: cada
+trabajo se reclama con SELECT ... FOR UPDATE SKIP LOCKED.
+
+Cada usuario puede tener como máximo INFORMES_EN_CURSO_POR_USUARIO informes
+pendientes o en proceso; el límite se comprueba con la fila del usuario
+bloqueada, para que dos envíos simultáneos no lo superen.
+
+Cada trabajo en proceso guarda el proceso que lo genera. Si ese proceso ya no
+existe en este equipo (reinicio o despliegue), el trabajo vuelve a quedar
+pendiente al limpiar o al consultar su progreso. Los trabajos de otros equipos
+no se pueden comprobar: los que no terminan en INFORMES_TIEMPO_MAXIMO segundos
+se marcan como error. Los informes se borran (registro y archivo) pasadas
+INFORMES_VENCIMIENTO segundos. procesar_informes limpia periódicamente; el
+comando limpiar_informes lo hace una vez.
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.buffer_ingesta import proceso_activo
+from .forms import informe
+from .models import TrabajoInforme
+
+logger = logging.getLogger(__name__)
+
+EN_CURSO = (TrabajoInforme.PENDIENTE, TrabajoInforme.EN_PROCESO)
+
+
+class ColaInformes:
+    """Trabajos de informes PDF: los encolan las vistas y los genera procesar_informes"""
+
+    def __init__(self, directorio, en_curso_por_usuario, vencimiento, tiempo_maximo):
+        self.directorio = Path(directorio)
+        self._en_curso_por_usuario = en_curso_por_usuario
+        self._vencimiento = timedelta(seconds=vencimiento)
+        self._tiempo_maximo = timedelta(seconds=tiempo_maximo)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._token = None
+
+    def _proceso(self):
+        """
+        Identifica al proceso actual. El token distingue un proceso nuevo que
+        reutiliza el pid de otro (por ejemplo el pid 1 en un contenedor).
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid, self._token = os.getpid(), uuid.uuid4().hex
+            return f"{socket.gethostname()}:{self._pid}:{self._token}"
+
+    def _huerfano(self, proceso):
+        """Indica si el proceso que generaba un trabajo ya no existe (solo en este equipo)"""
+        try:
+            equipo, pid, token = proceso.rsplit(":", 2)
+            pid = int(pid)
+        except ValueError:
+            return False
+        if equipo != socket.gethostname():
+            return False
+        if pid == os.getpid():
+            return proceso != self._proceso()
+        return not proceso_activo(pid)
+
+    def crear(self, usuario, parametros):
+        """
+        Registra un informe pendiente con los datos del formulario. Devuelve el
+        trabajo, o None si el usuario ya tiene el máximo de informes en curso.
+        """
+        with transaction.atomic():
+            # Bloquear al usuario: los envíos simultáneos cuentan uno después del otro
+            get_user_model().objects.select_for_update().filter(pk=usuario.pk).exists()
+            if TrabajoInforme.objects.filter(usuario=usuario, estado__in=EN_CURSO).count() >= self._en_curso_por_usuario:
+                return None
+            trabajo = TrabajoInforme.objects.create(usuario=usuario, parametros=parametros)
+        return trabajo
+
+    def tomar(self):
+        """
+        Reclama para este proceso el trabajo pendiente más antiguo y devuelve
+        su id, o None si no hay. SKIP LOCKED evita que dos procesos tomen el
+        mismo trabajo sin que uno espere al otro.
+        """
+        with transaction.atomic():
+            trabajo = (
+                TrabajoInforme.objects.select_for_update(skip_locked=True)
+                .filter(estado=TrabajoInforme.PENDIENTE).order_by("creado").first()
+            )
+            if trabajo is None:
+                return None
+            TrabajoInforme.objects.filter(pk=trabajo.pk).update(
+                estado=TrabajoInforme.EN_PROCESO, proceso=self._proceso(), progreso=0,
+            )
+        return trabajo.pk
+
+    def procesar_pendientes(self):
+        """Genera uno tras otro los trabajos pendientes; devuelve cuántos generó"""
+        generados = 0
+        while (id_trabajo := self.tomar()) is not None:
+            self._ejecutar(id_trabajo)
+            generados += 1
+        return generados
+
+    def recuperar(self, trabajos=None):
+        """
+        Devuelve a la cola los trabajos en proceso (de ``trabajos``, o todos)
+        cuyo proceso ya no existe. Devuelve cuántos se recuperaron.
+        """
+        trabajos = TrabajoInforme.objects.all() if trabajos is None else trabajos
+        recuperados = 0
+        for id_trabajo, proceso in trabajos.filter(estado=TrabajoInforme.EN_PROCESO).values_list("pk", "proceso"):
+            if not self._huerfano(proceso):
+                continue
+            # Solo si nadie lo recuperó antes
+            recuperado = TrabajoInforme.objects.filter(pk=id_trabajo, proceso=proceso).update(
+                proceso="", estado=TrabajoInforme.PENDIENTE, progreso=0,
+            )
+            if recuperado:
+                logger.warning("Informe %s sin proceso (%s); vuelve a la cola", id_trabajo, proceso)
+                recuperados += 1
+        return recuperados
+
+    def ruta(self, trabajo):
+        """Ruta del PDF de un trabajo terminado"""
+        return self.directorio / trabajo.archivo
+
+    def _ejecutar(self, id_trabajo):
+        from .views import escribir_pdf  # Import diferido: las vistas importan este módulo
+
+        trabajos = TrabajoInforme.objects.filter(pk=id_trabajo)
+        parcial = self.directorio / f"{id_trabajo}.pdf.parcial"
+        try:
+            trabajo = trabajos.get()
+            form = informe(trabajo.parametros)
+            if not form.is_valid():
+                raise ValueError("Formulario no válido o faltan datos.")
+
+            def progreso(hechas, total):
+                trabajos.update(progreso=min(99, hechas * 100 // total))
+
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            with open(parcial, "wb") as archivo:
+                titulo = escribir_pdf(archivo, form.cleaned_data, progreso)
+            # El PDF solo aparece con su nombre final cuando está completo
+            nombre = f"{id_trabajo}.pdf"
+            os.replace(parcial, self.directorio / nombre)
+            trabajos.update(
+                estado=TrabajoInforme.TERMINADO, progreso=100, titulo=titulo,
+                archivo=nombre, terminado=timezone.now(),
+            )
+        except Exception as error:
+            logger.exception("No se pudo generar el informe %s", id_trabajo)
+            parcial.unlink(missing_ok=True)
+            trabajos.update(estado=TrabajoInforme.ERROR, error=str(error), terminado=timezone.now())
+
+    def limpiar(self):
+        """
+        Marca como error los trabajos sin terminar que superan el tiempo
+        máximo, devuelve a la cola los huérfanos de este equipo que aún están
+        a tiempo y borra los vencidos con sus archivos. Devuelve los trabajos
+        borrados.
+        """
+        ahora = timezone.now()
+        TrabajoInforme.objects.filter(estado__in=EN_CURSO, creado__lt=ahora - self._tiempo_maximo).update(
+            estado=TrabajoInforme.ERROR, error="El informe se interrumpió antes de terminar.", terminado=ahora,
+        )
+        self.recuperar()
+        vencidos = TrabajoInforme.objects.filter(creado__lt=ahora - self._vencimiento)
+        for id_trabajo in vencidos.values_list("pk", flat=True):
+            # También el PDF parcial de un trabajo interrumpido
+            (self.directorio / f"{id_trabajo}.pdf").unlink(missing_ok=True)
+            (self.directorio / f"{id_trabajo}.pdf.parcial").unlink(missing_ok=True)
+        return vencidos.delete()[0]
+
+
+# Instancia única usada por las vistas de reportes y por procesar_informes
+cola_informes = ColaInformes(
+    directorio=getattr(settings, "INFORMES_DIRECTORIO", settings.BASE_DIR / "informes"),
+    en_curso_por_usuario=getattr(settings, "INFORMES_EN_CURSO_POR_USUARIO", 3),
+    vencimiento=getattr(settings, "INFORMES_VENCIMIENTO", 24 * 3600),
+    tiempo_maximo=getattr(settings, "INFORMES_TIEMPO_MAXIMO", 1800),
+)
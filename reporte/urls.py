@@ -6,6 +6,10 @@ urlpatterns = [
     # Página principal del reporte, muestra formulario e información
     path('', views.reporte, name='report_index'),
 
-    # Generar un reporte en PDF
+    # Encolar un reporte en PDF
     path("reporte/pdf/", views.generar_pdf, name="generar_pdf"),
+
+    # Progreso y descarga de un reporte en PDF encolado
+    path("reporte/pdf/<uuid:id_trabajo>/", views.estado_informe, name="estado_informe"),
+    path("reporte/pdf/<uuid:id_trabajo>/descargar/", views.descargar_informe, name="descargar_informe"),
 ]
@@ -1,17 +1,37 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
 from .forms import informe
 from django.views.decorators.cache import never_cache
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, FileResponse, Http404
 from dashboard.models import Dispositivo, Reporte, Alerta
-from datetime import datetime
+from dashboard.registro import registro
+from dashboard import resumenes
+from datetime import datetime, time, timedelta
 from django.utils import timezone
-from django.core.paginator import Paginator
+from django.conf import settings
+from dashboard.paginacion import contar, paginar_keyset
+from django.db.models import Exists, OuterRef
 from reportlab.lib.pagesizes import A4 
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
-from io import BytesIO
+from django.db.models import Count
+from .models import TrabajoInforme
+from .trabajos import cola_informes
+
+# Reportes por página de resultados
+REPORTES_POR_PAGINA = 10
+
+# Reportes leídos por consulta al generar un PDF
+PDF_LOTE = 2000
+
+# Filas dibujadas como máximo en un PDF. reportlab guarda todas las páginas en
+# memoria hasta save(): el límite acota esa memoria. Las filas siguientes se
+# leen igual para los totales, pero no se dibujan.
+PDF_FILAS_MAX = getattr(settings, "INFORMES_FILAS_MAX", 10000)
+
+# Por encima de este total estimado, la cantidad de resultados se muestra estimada
+CONTEO_EXACTO_MAX = 10000
 
 # =========================================================
 # VISTA PRINCIPAL DE REPORTES
@@ -22,9 +42,9 @@ def reporte(request):
     """
     Renderiza la página de reportes o el partial para HTMX/POST.
     Filtra por dispositivo, tipo de informe, alertas, fecha y hora.
-    Maneja paginación de resultados.
+    Pagina los resultados por clave sobre (fecha, id) con cursores opacos.
     """
-    reportes = []
+    reportes = None
     dispositivos = []
     is_htmx = request.headers.get("HX-Request") == "true" or request.META.get("HTTP_HX_REQUEST") == "true"
 
@@ -54,17 +74,33 @@ def reporte(request):
     else:
         form = informe()
 
-    # Paginación de resultados
-    page_number = request.GET.get("page", 1)
-    paginator = Paginator(reportes, 10)
-    page_obj = paginator.get_page(page_number)
+    # Paginación por clave: cada página cuesta lo mismo, sin importar su profundidad
+    pagina = None
+    total, total_exacto = None, True
+    if reportes is not None:
+        cursor = request.GET.get("cursor")
+        try:
+            pagina = paginar_keyset(reportes, ("fecha", "id"), cursor, REPORTES_POR_PAGINA)
+        except ValueError:
+            # Cursor alterado o de otra versión: volver a la primera página
+            cursor = None
+            pagina = paginar_keyset(reportes, ("fecha", "id"), None, REPORTES_POR_PAGINA)
+
+        # El total se calcula en la primera página y las siguientes lo reciben del cliente
+        if cursor and request.GET.get("total", "").isdigit():
+            total, total_exacto = int(request.GET["total"]), request.GET.get("estimado") != "1"
+        elif pagina.elementos:
+            total, total_exacto = contar(reportes, CONTEO_EXACTO_MAX)
 
     # Elegir template parcial o completo
     template = "report/report_partial.html" if (request.method == "POST" or is_htmx) else "report/report.html"
 
     return render(request, template, {
         "form": form,
-        "reportes": page_obj,
+        "reportes": pagina.elementos if pagina else [],
+        "pagina": pagina,
+        "total": total,
+        "total_exacto": total_exacto,
         "dispositivos": dispositivos,
     })
 
@@ -75,82 +111,124 @@ def reporte(request):
 def obtener_dispositivo(contenedor):
     """Devuelve el id del dispositivo o 'all' si se seleccionan todos"""
     if contenedor != "all":
-        try:
-            device = Dispositivo.objects.get(id=int(contenedor))
-            return device.id
-        except Dispositivo.DoesNotExist:
-            return []
+        device = registro.obtener(int(contenedor))
+        return device.id if device else []
     else:
         return "all"
 
 def obtener_nombre_device(contenedor):
     """Obtiene el nombre del dispositivo por su id"""
-    try:
-        device = Dispositivo.objects.get(id=int(contenedor))
-        return device.device_name
-    except Dispositivo.DoesNotExist:
-        return "Desconocido"
+    device = registro.obtener(int(contenedor))
+    return device.device_name if device else "Desconocido"
 
 def obtener_reporte(device_id, caso):
     """Obtiene todos los reportes de un dispositivo"""
     if caso == "all":
-        return list(Reporte.objects.filter(dispositivo=device_id).order_by('-fecha'))
+        return consulta_reportes(device_id)
 
-def obtener_alerta(lista_reportes, caso, estado_alerta):
-    """Filtra los reportes según el estado de las alertas"""
+def obtener_alerta(reportes, caso, estado_alerta):
+    """
+    Filtra los reportes según el estado de las alertas, con un EXISTS en la
+    misma consulta en lugar de una consulta por reporte.
+    """
     if caso == "all":
-        if estado_alerta == "todas":
-            return [r for r in lista_reportes if r.alertas.exists()]
-        elif estado_alerta == "activas":
-            return [r for r in lista_reportes if r.alertas.filter(is_activa=True).exists()]
+        alertas = Alerta.objects.filter(reporte=OuterRef("pk"))
+        if estado_alerta == "activas":
+            alertas = alertas.filter(is_activa=True)
         elif estado_alerta == "inactivas":
-            return [r for r in lista_reportes if r.alertas.filter(is_activa=False).exists()]
+            alertas = alertas.filter(is_activa=False)
+        elif estado_alerta != "todas":
+            return reportes.none()
+        return reportes.filter(Exists(alertas))
+
+def inicio_dia(fecha, dias=0):
+    """Primer instante del día (desplazado ``dias``) en la zona horaria del proyecto"""
+    return timezone.make_aware(datetime.combine(fecha + timedelta(days=dias), time.min))
+
+def rango_dia(fecha):
+    """
+    Filtro de rango para los reportes de un día. A diferencia de fecha__date,
+    permite usar los índices y descartar las particiones de otros meses.
+    """
+    return {"fecha__gte": inicio_dia(fecha), "fecha__lt": inicio_dia(fecha, 1)}
 
-def filtrar_por_hora(lista_reportes, fecha, de_hora, hora1=None, hora2=None):
+def filtrar_por_hora(reportes, fecha, de_hora, hora1=None, hora2=None):
     """Filtra reportes según hora dentro de una fecha específica"""
     if de_hora == "antes" and hora1:
-        filtro_dt = timezone.make_aware(datetime.combine(fecha, hora1))
-        return [r for r in lista_reportes if r.fecha < filtro_dt]
+        return reportes.filter(fecha__lt=timezone.make_aware(datetime.combine(fecha, hora1)))
     if de_hora == "entre" and hora1 and hora2:
-        filtro_dt1 = timezone.make_aware(datetime.combine(fecha, hora1))
-        filtro_dt2 = timezone.make_aware(datetime.combine(fecha, hora2))
-        return [r for r in lista_reportes if filtro_dt1 < r.fecha < filtro_dt2]
+        return reportes.filter(
+            fecha__gt=timezone.make_aware(datetime.combine(fecha, hora1)),
+            fecha__lt=timezone.make_aware(datetime.combine(fecha, hora2)),
+        )
     if de_hora == "despues" and hora1:
-        filtro_dt = timezone.make_aware(datetime.combine(fecha, hora1))
-        return [r for r in lista_reportes if r.fecha > filtro_dt]
-    return lista_reportes
+        return reportes.filter(fecha__gt=timezone.make_aware(datetime.combine(fecha, hora1)))
+    return reportes
+
+def consulta_reportes(device_id=None, de_fecha=None, fecha=None, de_hora=None, hora1=None, hora2=None):
+    """
+    Consulta (sin evaluar) de los reportes de un dispositivo, o de todos si
+    ``device_id`` es None, con los filtros de fecha y hora como rangos en la
+    base de datos. Se evalúa al paginar, así que cada página lee solo sus filas.
+    """
+    reportes = Reporte.objects.all()
+    if device_id is not None:
+        reportes = reportes.filter(dispositivo=device_id)
+
+    if de_fecha and fecha:
+        if de_fecha == "antes":
+            # El informe general incluye el día indicado; el de un dispositivo no
+            reportes = reportes.filter(fecha__lt=inicio_dia(fecha, 1 if device_id is None else 0))
+        elif de_fecha == "en":
+            reportes = reportes.filter(**rango_dia(fecha))
+            if de_hora:
+                reportes = filtrar_por_hora(reportes, fecha, de_hora, hora1, hora2)
+        elif de_fecha == "despues":
+            reportes = reportes.filter(fecha__gte=inicio_dia(fecha, 1))
+
+    # Dispositivo y alertas de cada fila en dos consultas por página, no una por fila
+    return reportes.select_related("dispositivo").prefetch_related("alertas").order_by("-fecha")
 
 def obtener_informe_id(device_id, tipo_informe, estado_alerta, de_fecha, fecha, de_hora, hora1, hora2):
     """Genera el informe filtrado para un solo dispositivo"""
-    if tipo_informe == "reporte" and not any([de_fecha, fecha, de_hora, hora1, hora2]):
-        return obtener_reporte(device_id, caso="all")
-    if tipo_informe == "alerta" and not any([de_fecha, fecha, de_hora, hora1, hora2]):
-        lista_reportes = obtener_reporte(device_id, caso="all")
-        return obtener_alerta(lista_reportes, caso="all", estado_alerta=estado_alerta)
-
-    # Filtrado por fecha
+    reportes = consulta_reportes(device_id, de_fecha, fecha, de_hora, hora1, hora2)
     if tipo_informe == "reporte":
-        if de_fecha:
-            if de_fecha == "antes":
-                return list(Reporte.objects.filter(dispositivo=device_id, fecha__lte=fecha).order_by("-fecha"))
-            elif de_fecha == "en":
-                lista_reportes = list(Reporte.objects.filter(dispositivo=device_id, fecha__date=fecha).order_by("-fecha"))
-                if de_hora:
-                    return filtrar_por_hora(lista_reportes, fecha, de_hora, hora1, hora2)
-                return lista_reportes
-            elif de_fecha == "despues":
-                return list(Reporte.objects.filter(dispositivo=device_id, fecha__date__gt=fecha).order_by("-fecha"))
-    elif tipo_informe == "alerta":
-        lista_reportes = []
+        return reportes
+    if tipo_informe == "alerta":
+        return obtener_alerta(reportes, caso="all", estado_alerta=estado_alerta)
+
+def totales_desde_resumenes(dispositivo, de_fecha, fecha):
+    """
+    Totales de un informe de reportes a partir de los resúmenes diarios, con
+    los mismos días que incluye cada filtro de fecha.
+    """
+    desde = hasta = None
+    if de_fecha and fecha:
         if de_fecha == "antes":
-            lista_reportes = list(Reporte.objects.filter(dispositivo=device_id, fecha__lte=fecha).order_by("-fecha"))
+            # El informe general incluye el día indicado; el de un dispositivo no
+            hasta = inicio_dia(fecha, 1 if dispositivo == "all" else 0)
         elif de_fecha == "en":
-            lista_reportes = list(Reporte.objects.filter(dispositivo=device_id, fecha__date=fecha).order_by("-fecha"))
-            if de_hora:
-                lista_reportes = filtrar_por_hora(lista_reportes, fecha, de_hora, hora1, hora2)
+            desde, hasta = inicio_dia(fecha), inicio_dia(fecha, 1)
         elif de_fecha == "despues":
-            lista_reportes = list(Reporte.objects.filter(dispositivo=device_id, fecha__date__gt=fecha).order_by("-fecha"))
-        return obtener_alerta(lista_reportes, caso="all", estado_alerta=estado_alerta)
+            desde = inicio_dia(fecha, 1)
+    dispositivos = None if dispositivo == "all" else [dispositivo]
+    return resumenes.totales(dispositivos, desde, hasta)
+
+def fin_del_rango(dispositivo, de_fecha, fecha, de_hora, hora1, hora2):
+    """
+    Último instante que cubren los filtros de fecha y hora (como mucho, ahora):
+    hasta ahí vale el último reporte de cada dispositivo al ponderar por tiempo.
+    """
+    fin = None
+    if de_fecha and fecha:
+        if de_fecha == "antes":
+            fin = inicio_dia(fecha, 1 if dispositivo == "all" else 0)
+        elif de_fecha == "en":
+            fin = inicio_dia(fecha, 1)
+            if de_hora in ("antes", "entre") and hora1:
+                fin = timezone.make_aware(datetime.combine(fecha, hora2 if de_hora == "entre" and hora2 else hora1))
+    ahora = timezone.now()
+    return ahora if fin is None else min(fin, ahora)
 
 def all_devices():
     """Devuelve todos los dispositivos"""
@@ -158,17 +236,7 @@ def all_devices():
 
 def get_all_reports(de_fecha=None, fecha=None, de_hora=None, hora1=None, hora2=None):
     """Obtiene todos los reportes, opcionalmente filtrados por fecha y hora"""
-    lista_reportes = list(Reporte.objects.all().order_by("-fecha"))
-    if de_fecha:
-        if de_fecha == "antes" and fecha:
-            lista_reportes = [r for r in lista_reportes if r.fecha.date() <= fecha]
-        elif de_fecha == "en" and fecha:
-            lista_reportes = [r for r in lista_reportes if r.fecha.date() == fecha]
-            if de_hora:
-                lista_reportes = filtrar_por_hora(lista_reportes, fecha, de_hora, hora1, hora2)
-        elif de_fecha == "despues" and fecha:
-            lista_reportes = [r for r in lista_reportes if r.fecha.date() > fecha]
-    return lista_reportes
+    return consulta_reportes(None, de_fecha, fecha, de_hora, hora1, hora2)
 
 def get_all_alerts(estado_alerta="todas", de_fecha=None, fecha=None, de_hora=None, hora1=None, hora2=None):
     """Obtiene todos los reportes con alertas filtradas"""
@@ -181,20 +249,97 @@ def get_all_alerts(estado_alerta="todas", de_fecha=None, fecha=None, de_hora=Non
 # =========================================================
 @login_required
 def generar_pdf(request):
-    """Genera un PDF con los reportes o alertas según filtros"""
-    reportes = []
+    """
+    Encola un PDF con los reportes o alertas según filtros y devuelve el
+    partial con su progreso, que HTMX consulta hasta que se puede descargar.
+    """
     form = informe(request.POST or None)
     if not form.is_valid():
         return HttpResponse("Formulario no válido o faltan datos.", status=400)
 
-    contenedor = form.cleaned_data["dispositivos"]
-    tipo_informe = form.cleaned_data["tipo_informe"]
-    estado_alerta = form.cleaned_data["estado_alerta"]
-    de_fecha = form.cleaned_data["de_fecha"]
-    fecha = form.cleaned_data["fecha"]
-    de_hora = form.cleaned_data["de_hora"]
-    hora1 = form.cleaned_data["hora1"]
-    hora2 = form.cleaned_data["hora2"]
+    # Se guardan los datos enviados; procesar_informes vuelve a validarlos al generar el PDF
+    parametros = {campo: form.data.get(campo, "") for campo in form.fields}
+    trabajo = cola_informes.crear(request.user, parametros)
+    return render(request, "report/trabajo_informe.html", {
+        "trabajo": trabajo,
+        "limite": trabajo is None,
+    })
+
+@login_required
+@never_cache
+def estado_informe(request, id_trabajo):
+    """Partial con el progreso de un informe del usuario"""
+    trabajo = get_object_or_404(TrabajoInforme, pk=id_trabajo, usuario=request.user)
+    # Si el proceso que lo generaba se reinició, devolverlo a la cola
+    if trabajo.en_curso and cola_informes.recuperar(TrabajoInforme.objects.filter(pk=trabajo.pk)):
+        trabajo.refresh_from_db()
+    return render(request, "report/trabajo_informe.html", {"trabajo": trabajo})
+
+@login_required
+def descargar_informe(request, id_trabajo):
+    """Envía el PDF de un informe terminado del usuario"""
+    trabajo = get_object_or_404(TrabajoInforme, pk=id_trabajo, usuario=request.user, estado=TrabajoInforme.TERMINADO)
+    try:
+        archivo = open(cola_informes.ruta(trabajo), "rb")
+    except FileNotFoundError:
+        raise Http404("El informe ya no está disponible")
+    return FileResponse(archivo, as_attachment=True, filename=f"{trabajo.titulo}.pdf")
+
+def filas_informe(dispositivo, tipo_informe, estado_alerta, de_fecha, fecha, de_hora, hora1, hora2):
+    """
+    Devuelve (total, filas): la cantidad de filas del informe y un iterador que
+    las lee por lotes de PDF_LOTE, sin cargarlas todas en memoria. En el informe
+    general, los dispositivos sin resultados aparecen con una fila vacía.
+    """
+    if dispositivo == "all":
+        reportes = (
+            get_all_reports(de_fecha, fecha, de_hora, hora1, hora2)
+            if tipo_informe == "reporte"
+            else get_all_alerts(estado_alerta, de_fecha, fecha, de_hora, hora1, hora2)
+        )
+        dispositivos = all_devices()
+        # Cantidad de filas de cada dispositivo en una sola consulta agrupada
+        por_dispositivo = dict(
+            reportes.select_related(None).prefetch_related(None).order_by()
+            .values_list("dispositivo").annotate(cantidad=Count("id"))
+        )
+        total = sum(por_dispositivo.values()) + sum(1 for d in dispositivos if d.id not in por_dispositivo)
+
+        def filas():
+            for d in dispositivos:
+                if d.id in por_dispositivo:
+                    yield from reportes.filter(dispositivo=d).iterator(chunk_size=PDF_LOTE)
+                else:
+                    class TempR:
+                        dispositivo = d
+                        medicion_nivel = 0
+                        estado_puerta = False
+                        fecha = "N/A"
+                        alertas = []
+                    yield TempR()
+        return total, filas()
+
+    reportes = obtener_informe_id(dispositivo, tipo_informe, estado_alerta, de_fecha, fecha, de_hora, hora1, hora2)
+    if reportes is None:
+        reportes = Reporte.objects.none()
+    # iterator() con chunk_size también precarga las alertas de cada lote
+    return reportes.count(), reportes.iterator(chunk_size=PDF_LOTE)
+
+def escribir_pdf(archivo, datos, progreso=None):
+    """
+    Escribe en ``archivo`` el PDF del informe descrito por ``datos`` (los
+    cleaned_data del formulario informe) y devuelve su título. Las filas se
+    dibujan a medida que se leen y los totales se acumulan en la misma pasada.
+    ``progreso(hechas, total)`` se llama cada PDF_LOTE filas.
+    """
+    contenedor = datos["dispositivos"]
+    tipo_informe = datos["tipo_informe"]
+    estado_alerta = datos["estado_alerta"]
+    de_fecha = datos["de_fecha"]
+    fecha = datos["fecha"]
+    de_hora = datos["de_hora"]
+    hora1 = datos["hora1"]
+    hora2 = datos["hora2"]
 
     dispositivo = obtener_dispositivo(contenedor)
 
@@ -209,42 +354,32 @@ def generar_pdf(request):
         tipo_titulo = "Información"
 
     if dispositivo == "all":
-        reportes_existentes = (
-            get_all_reports(de_fecha, fecha, de_hora, hora1, hora2)
-            if tipo_informe == "reporte"
-            else get_all_alerts(estado_alerta, de_fecha, fecha, de_hora, hora1, hora2)
-        ) or []  # <-- corrección mínima
-        dispositivos = all_devices()
-        todos_reportes = []
-        for d in dispositivos:
-            r_dispositivo = [r for r in reportes_existentes if r.dispositivo == d]
-            if r_dispositivo:
-                todos_reportes.extend(r_dispositivo)
-            else:
-                class TempR:
-                    dispositivo = d
-                    medicion_nivel = 0
-                    estado_puerta = False
-                    fecha = "N/A"
-                    alertas = []
-                todos_reportes.append(TempR())
-        reportes = todos_reportes
         nombre_titulo = f"Informe-{tipo_titulo}-General"
     else:
         nombre_device = obtener_nombre_device(contenedor)
-        reportes = obtener_informe_id(dispositivo, tipo_informe, estado_alerta, de_fecha, fecha, de_hora, hora1, hora2)
         nombre_titulo = f"Informe-{tipo_titulo}-{nombre_device}"
+    total_resultados, reportes = filas_informe(dispositivo, tipo_informe, estado_alerta, de_fecha, fecha, de_hora, hora1, hora2)
 
     # Variables para totales
     suma_nivel = 0
     count_nivel = 0
     apertura_puerta = 0
-    duracion_alertas = []
+    suma_duracion_alertas = 0
+    count_duracion_alertas = 0
     alertas_activas = False
-
-    # Crear PDF
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
+    total_alertas = 0
+
+    # Con filtro de horas no se usan los resúmenes: el promedio se pondera por
+    # tiempo, porque con banda muerta cada reporte vale hasta el siguiente
+    ponderar = tipo_informe == "reporte" and bool(de_hora)
+    fin_rango = fin_del_rango(dispositivo, de_fecha, fecha, de_hora, hora1, hora2) if ponderar else None
+    suma_ponderada = 0
+    segundos_nivel = 0
+    posterior = None  # (dispositivo, fecha) de la fila anterior, más nueva
+
+    # Crear PDF (con las páginas comprimidas, que reportlab guarda hasta save();
+    # PDF_FILAS_MAX acota cuántas hay)
+    pdf = canvas.Canvas(archivo, pagesize=A4, pageCompression=1)
     width, height = A4
     y = height - 50
 
@@ -255,7 +390,6 @@ def generar_pdf(request):
     y -= 30
 
     # Descripción
-    total_resultados = len(reportes)
     pdf.setFont("Helvetica", 11)
     pdf.setFillColor(colors.black)
     lineas_descripcion = [
@@ -263,21 +397,32 @@ def generar_pdf(request):
         f"Total de resultados: {total_resultados}.",
         f"Informe generado el {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}."
     ]
+    if total_resultados > PDF_FILAS_MAX:
+        lineas_descripcion.insert(2, f"Se muestran los primeros {PDF_FILAS_MAX}; los totales incluyen todos.")
     for linea in lineas_descripcion:
         pdf.drawCentredString(width / 2, y, linea)
         y -= 15
     y -= 20
 
-    if not reportes:
+    if not total_resultados:
         pdf.setFont("Helvetica", 12)
         pdf.drawString(50, y, "No se encontraron registros para los filtros seleccionados.")
     else:
         for idx, r in enumerate(reportes, start=1):
+            if progreso and idx % PDF_LOTE == 0:
+                progreso(idx, total_resultados)
             device_name = getattr(r.dispositivo, 'device_name', str(r.dispositivo))
             nivel = getattr(r, 'medicion_nivel', 0)
             if isinstance(nivel, (int, float)):
                 suma_nivel += nivel
                 count_nivel += 1
+            if ponderar and isinstance(r.fecha, datetime):
+                # Las filas de cada dispositivo llegan de la más nueva a la más antigua
+                hasta = posterior[1] if posterior and posterior[0] == r.dispositivo_id else fin_rango
+                duracion = max((hasta - r.fecha).total_seconds(), 0)
+                suma_ponderada += nivel * duracion
+                segundos_nivel += duracion
+                posterior = (r.dispositivo_id, r.fecha)
             if not getattr(r, 'estado_puerta', False):
                 apertura_puerta += 1
 
@@ -289,17 +434,24 @@ def generar_pdf(request):
                 ["Fecha", getattr(r, 'fecha', 'N/A')]
             ]
 
-            if hasattr(r, 'alertas') and getattr(r.alertas, 'exists', lambda: False)():
-                for a in r.alertas.all():
-                    estado = "Activa" if getattr(a, 'is_activa', False) else "Desactivada"
-                    mensaje = f"{getattr(a, 'mensaje', '')} - {getattr(a, 'fecha_alerta', '')}"
-                    data.append([f"Alerta ({estado})", mensaje])
-                    if estado == "Activa":
-                        alertas_activas = True
-                    fecha_inicio = getattr(a, 'fecha_alerta', None)
-                    fecha_fin = getattr(a, 'fecha_desactivada', None)
-                    if fecha_inicio and fecha_fin:
-                        duracion_alertas.append((fecha_fin - fecha_inicio).total_seconds())
+            # Alertas precargadas con el reporte (TempR las trae como lista vacía)
+            alertas = r.alertas if isinstance(r.alertas, list) else r.alertas.all()
+            total_alertas += len(alertas)
+            for a in alertas:
+                estado = "Activa" if getattr(a, 'is_activa', False) else "Desactivada"
+                mensaje = f"{getattr(a, 'mensaje', '')} - {getattr(a, 'fecha_alerta', '')}"
+                data.append([f"Alerta ({estado})", mensaje])
+                if estado == "Activa":
+                    alertas_activas = True
+                fecha_inicio = getattr(a, 'fecha_alerta', None)
+                fecha_fin = getattr(a, 'fecha_desactivada', None)
+                if fecha_inicio and fecha_fin:
+                    suma_duracion_alertas += (fecha_fin - fecha_inicio).total_seconds()
+                    count_duracion_alertas += 1
+
+            # Pasado el límite solo se acumulan los totales
+            if idx > PDF_FILAS_MAX:
+                continue
 
             col_widths = [100, width - 200]
             table = Table(data, colWidths=col_widths)
@@ -337,6 +489,19 @@ def generar_pdf(request):
             pdf.drawString(50, y, "No hay alertas activas en este momento.")
             y -= 20
 
+        promedio_nivel = suma_nivel / count_nivel if count_nivel > 0 else 0
+        if ponderar and segundos_nivel:
+            promedio_nivel = suma_ponderada / segundos_nivel
+        promedio_alertas_min = (suma_duracion_alertas / count_duracion_alertas / 60) if count_duracion_alertas else 0
+
+        # Con filtros de días completos, los totales salen de los resúmenes diarios
+        resumen = None
+        if tipo_informe == "reporte" and not de_hora:
+            resumen = totales_desde_resumenes(dispositivo, de_fecha, fecha)
+            promedio_nivel = resumen["suma_nivel"] / resumen["lecturas"] if resumen["lecturas"] else 0
+            apertura_puerta = resumen["lecturas_puerta_abierta"]
+            promedio_alertas_min = (resumen["segundos_alerta"] / resumen["alertas_cerradas"] / 60) if resumen["alertas_cerradas"] else 0
+
         # Totales generales
         pdf.setFont("Helvetica-Bold", 12)
         pdf.setFillColor(colors.darkblue)
@@ -344,12 +509,19 @@ def generar_pdf(request):
         pdf.drawString(50, y, "Totales Generales:")
         y -= 15
 
-        promedio_nivel = suma_nivel / count_nivel if count_nivel > 0 else 0
-        promedio_alertas_min = (sum(duracion_alertas)/len(duracion_alertas)/60) if duracion_alertas else 0
+        if resumen is not None:
+            # Los resúmenes cuentan todas las lecturas recibidas; con banda muerta
+            # el listado de arriba solo tiene los reportes guardados
+            pdf.setFont("Helvetica-Oblique", 10)
+            pdf.setFillColor(colors.black)
+            pdf.drawString(60, y, f"Calculados sobre todas las lecturas recibidas ({resumen['lecturas']}), "
+                                  f"incluidas las no guardadas como reporte.")
+            y -= 15
 
         pdf.setFont("Helvetica", 11)
         pdf.setFillColor(colors.black)
-        pdf.drawString(60, y, f"Promedio de nivel medido: {promedio_nivel:.2f}%")
+        etiqueta_promedio = "Promedio de nivel medido (ponderado por tiempo)" if ponderar and segundos_nivel else "Promedio de nivel medido"
+        pdf.drawString(60, y, f"{etiqueta_promedio}: {promedio_nivel:.2f}%")
         y -= 15
         pdf.drawString(60, y, f"Cantidad de veces que se abrió la puerta: {apertura_puerta}")
         y -= 15
@@ -357,10 +529,10 @@ def generar_pdf(request):
         y -= 15
 
         if tipo_informe == "reporte":
-            total_alertas = sum([len(r.alertas.all()) if hasattr(r, 'alertas') and getattr(r.alertas, 'exists', lambda: False)() else 0 for r in reportes])
+            if resumen is not None:
+                total_alertas = resumen["alertas_iniciadas"]
             pdf.drawString(60, y, f"Cantidad total de alertas registradas: {total_alertas}")
             y -= 15
 
     pdf.save()
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=f"{nombre_titulo}.pdf")
+    return nombre_titulo